@@ -0,0 +1,320 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Benchmarks de generación, resolución y parseo de sopas de letras.
+#
+# Mide generate_word_placements, create_soup (lo que hace generate_soup sin
+# mostrar la sopa), find_word_placement, find_every_word_placement,
+# find_word_placements (lo que hace solve_soup sin mostrar la sopa) y
+# parse_soups para distintas
+# cantidades de palabras de dictionary.txt y distintos tamaños de sopa, con
+# semillas fijas. Cada benchmark se corre primero --warmup veces sin medir y
+# después se mide --repeat veces, repartidas entre --processes procesos
+# nuevos (algunos tiempos cambian de un proceso a otro aunque el código sea
+# el mismo, por ejemplo según dónde quedaron los datos en memoria). De todas
+# esas mediciones se guarda la mediana y la desviación absoluta mediana
+# (MAD), que estima el ruido de la máquina.
+# Guarda los resultados en un archivo JSON y los compara con un baseline: si
+# la mediana de algún benchmark supera a la del baseline por más de
+# --threshold (por ejemplo 0.25 = 25%) y también por más de --noise veces la
+# suma de las MAD de ambos, lo informa y termina con código 1. Así una
+# diferencia que está dentro del ruido medido no cuenta como regresión.
+# El baseline solo se compara bien con resultados de la misma máquina.
+#
+# Uso:
+#   python bench.py                      corre y compara con el baseline
+#   python bench.py --update-baseline    corre y guarda el nuevo baseline
+#   python bench.py --word-counts 10 50  corre solo algunas cantidades
+
+import argparse
+import gc
+import io
+import json
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from random import Random, seed as seed_random
+from statistics import median
+from time import perf_counter
+
+from main import (Grid, calculate_soup_size, create_soup,
+                  find_every_word_placement, find_word_placement,
+                  find_word_placements, format_soup, generate_word_placements,
+                  is_wordlist_valid, parse_soups)
+from dictionary import Dictionary
+
+
+WORD_COUNTS = [10, 50, 200, 500, 1000, 2000]
+SIZE_FACTORS = [1.0, 1.5]  # Multiplican el tamaño de calculate_soup_size
+SEED = 0
+REPEAT = 15
+WARMUP = 1
+PROCESSES = 5
+THRESHOLD = 0.25
+NOISE = 3  # Cuántas MAD tiene que superar una diferencia para ser regresión
+# Cada medición junta llamadas hasta durar al menos esto, para que los
+# benchmarks muy rápidos no queden dominados por la resolución del reloj
+MIN_SAMPLE_SECONDS = 0.005
+
+DICTIONARY_PATH = "dictionary.txt"
+BASELINE_PATH = "bench_baseline.json"
+OUTPUT_PATH = "bench_results.json"
+
+# Representamos los resultados de los benchmarks como:
+# bench_results: dict<str>(int / dict<str>(bench_result))
+# Por ejemplo:
+# {
+#   "seed": int, ---------------> semilla usada
+#   "repeat": int, -------------> cantidad de mediciones de cada benchmark
+#   "warmup": int, -------------> cantidad de corridas previas sin medir, en
+#                                 cada proceso
+#   "processes": int, ----------> cantidad de procesos que midieron
+#   "results": {
+#     "name": bench_result,
+#     ...
+#   }
+# }
+#
+# bench_result: dict<str>(float)
+# {
+#   "median": float, -----------> mediana de los tiempos de una llamada, en
+#                                 segundos
+#   "mad": float ---------------> desviación absoluta mediana de los tiempos
+# }
+
+
+# load_words: str -> list(str)
+# Recibe la ruta de un diccionario con una palabra por línea y devuelve sus
+# palabras válidas, sin duplicados y en el orden del archivo.
+def load_words(path=DICTIONARY_PATH):
+    with open(path, "r") as f:
+        words = f.read().split("\n")
+    return [word for word in dict.fromkeys(words)
+            if is_wordlist_valid([word])]
+
+
+# sample_wordlist: list(str) int int -> list(str)
+# Recibe una lista de palabras, una cantidad y una semilla, y devuelve esa
+# cantidad de palabras elegidas al azar con Dictionary.sample (así pueden
+# estar juntas en una sopa), siempre las mismas para la misma semilla.
+def sample_wordlist(words, count, seed):
+    dictionary = Dictionary(words)
+    return dictionary.sample(min(count, len(dictionary)), rng=Random(seed))
+
+
+# time_function: function int (int) (int) -> list(float)
+# Recibe una función sin argumentos, una cantidad de mediciones y,
+# opcionalmente, una semilla y una cantidad de corridas previas. Corre la
+# función warmup veces sin medir (la primera vez suele ser más lenta por las
+# caches), y después mide repeat veces cuánto tarda en ejecutarse. Devuelve
+# los tiempos, en segundos. Antes de cada llamada inicializa el generador de
+# números aleatorios con la misma semilla, así todas hacen el mismo trabajo.
+# Si la última corrida previa tardó menos que MIN_SAMPLE_SECONDS, cada
+# medición junta varias llamadas y divide el tiempo por la cantidad.
+# Como timeit, apaga el recolector de basura mientras mide: cuándo se
+# dispara depende de lo que dejaron en memoria los benchmarks anteriores, y
+# eso cambiaba los tiempos de una corrida a otra.
+def time_function(function, repeat, seed=SEED, warmup=WARMUP):
+    def run(number):
+        gc.collect()
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            start = perf_counter()
+            for _ in range(number):
+                seed_random(seed)
+                function()
+            return (perf_counter() - start) / number
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+    elapsed = None
+    for _ in range(warmup):
+        elapsed = run(1)
+
+    number = 1
+    if elapsed is not None and 0 < elapsed < MIN_SAMPLE_SECONDS:
+        number = int(MIN_SAMPLE_SECONDS / elapsed) + 1
+
+    return [run(number) for _ in range(repeat)]
+
+
+# summarize_times: list(float) -> bench_result
+# Recibe los tiempos medidos de un benchmark y devuelve su mediana y su
+# desviación absoluta mediana, que no cambian mucho si alguna medición sale
+# mal por algo ajeno al benchmark.
+def summarize_times(times):
+    middle = median(times)
+    return {
+        "median": middle,
+        "mad": median(abs(seconds - middle) for seconds in times)
+    }
+
+
+# find_each_word: sopa_de_letras list(str) (function) -> list
+# Recibe una sopa de letras, una lista de palabras y una función de búsqueda,
+# y busca cada palabra por separado con esa función (por defecto
+# find_word_placement).
+def find_each_word(soup, wordlist, find=find_word_placement):
+    return [find(word, soup) for word in wordlist]
+
+
+# run_benchmarks: list(int) list(float) int int (list(str)) (int) (int)
+#                 -> bench_results
+# Recibe las cantidades de palabras, los factores de tamaño de la sopa, una
+# semilla, la cantidad de mediciones y, opcionalmente, las palabras, la
+# cantidad de corridas previas y la cantidad de procesos. Corre todos los
+# benchmarks y devuelve sus resultados.
+# Con más de un proceso, cada uno corre todos los benchmarks con su parte de
+# las mediciones, uno después del otro, y los resultados salen de todas las
+# mediciones juntas.
+def run_benchmarks(word_counts=WORD_COUNTS, size_factors=SIZE_FACTORS,
+                   seed=SEED, repeat=REPEAT, words=None, warmup=WARMUP,
+                   processes=PROCESSES):
+    words = words or load_words()
+    processes = max(1, min(processes, repeat))
+    repeats = [repeat // processes + (i < repeat % processes)
+               for i in range(processes)]
+    arguments = [(word_counts, size_factors, seed, process_repeat, words,
+                  warmup) for process_repeat in repeats]
+
+    if processes == 1:
+        all_times = [collect_times(arguments[0])]
+    else:
+        # De a un proceso nuevo ("spawn", que no hereda la memoria de este)
+        # por vez, para que no compitan entre ellos por la CPU
+        all_times = []
+        for process_arguments in arguments:
+            with ProcessPoolExecutor(
+                    1, mp_context=multiprocessing.get_context("spawn")
+                    ) as executor:
+                all_times.append(executor.submit(
+                    collect_times, process_arguments).result())
+
+    return {
+        "seed": seed,
+        "repeat": repeat,
+        "warmup": warmup,
+        "processes": processes,
+        "results": {name: summarize_times([seconds for times in all_times
+                                           for seconds in times[name]])
+                    for name in all_times[0]}
+    }
+
+
+# collect_times: tuple(list(int), list(float), int, int, list(str), int)
+#                -> dict<str>(list(float))
+# Recibe una tupla con las cantidades de palabras, los factores de tamaño de
+# la sopa, una semilla, la cantidad de mediciones, las palabras y la
+# cantidad de corridas previas. Corre todos los benchmarks y devuelve los
+# tiempos medidos de cada uno.
+def collect_times(arguments):
+    word_counts, size_factors, seed, repeat, words, warmup = arguments
+    results = {}
+
+    for count in word_counts:
+        wordlist = sample_wordlist(words, count, seed)
+        words_name = f"words={len(wordlist)}"
+
+        for factor in size_factors:
+            size = int(calculate_soup_size(wordlist) * factor)
+            name = f"generate_word_placements/{words_name}/size={size}"
+            results[name] = time_function(
+                lambda: generate_word_placements(wordlist, size),
+                repeat, seed, warmup)
+
+        results[f"create_soup/{words_name}"] = time_function(
+            lambda: create_soup(wordlist), repeat, seed, warmup)
+
+        seed_random(seed)
+        soup, _ = create_soup(wordlist)
+        # Copiamos la sopa en cada repetición para no reusar su cache
+        results[f"find_word_placement/{words_name}"] = time_function(
+            lambda: find_each_word(Grid(soup.size, soup.data), wordlist),
+            repeat, seed, warmup)
+        results[f"find_every_word_placement/{words_name}"] = time_function(
+            lambda: find_each_word(Grid(soup.size, soup.data), wordlist,
+                                   find_every_word_placement),
+            repeat, seed, warmup)
+        results[f"find_word_placements/{words_name}"] = time_function(
+            lambda: find_word_placements(soup, wordlist), repeat, seed, warmup)
+
+        text = format_soup(soup, wordlist) * 10
+        results[f"parse_soups/{words_name}/soups=10"] = time_function(
+            lambda: parse_soups(io.StringIO(text)), repeat, seed, warmup)
+
+    return results
+
+
+# compare_results: bench_results bench_results (float) (float)
+#                  -> list(tuple(str, float, float))
+# Recibe los resultados actuales, los del baseline, el umbral de regresión y
+# cuántas MAD tiene que superar una diferencia para no ser ruido. Devuelve
+# una lista con el nombre, la mediana del baseline y la mediana actual de
+# cada benchmark cuya mediana supera a la del baseline por más del umbral y
+# por más de noise veces la suma de las MAD de ambos.
+# Los benchmarks que no están en ambos resultados no se comparan.
+def compare_results(current, baseline, threshold=THRESHOLD, noise=NOISE):
+    regressions = []
+    for name, result in current["results"].items():
+        baseline_result = baseline["results"].get(name)
+        if baseline_result is None:
+            continue
+        difference = result["median"] - baseline_result["median"]
+        if (difference > baseline_result["median"] * threshold and
+                difference > noise * (baseline_result["mad"] +
+                                      result["mad"])):
+            regressions.append((name, baseline_result["median"],
+                                result["median"]))
+    return regressions
+
+
+# main: list(str) -> int
+# Recibe los argumentos de la línea de comandos, corre los benchmarks y
+# devuelve el código de salida: 1 si hubo regresiones, 0 si no.
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--word-counts", type=int, nargs="+",
+                        default=WORD_COUNTS)
+    parser.add_argument("--size-factors", type=float, nargs="+",
+                        default=SIZE_FACTORS)
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--warmup", type=int, default=WARMUP)
+    parser.add_argument("--processes", type=int, default=PROCESSES)
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    parser.add_argument("--noise", type=float, default=NOISE)
+    parser.add_argument("--output", default=OUTPUT_PATH)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    current = run_benchmarks(args.word_counts, args.size_factors, args.seed,
+                             args.repeat, warmup=args.warmup,
+                             processes=args.processes)
+    for name, result in current["results"].items():
+        print(f"{name}: {result['median']:.6f}s ± {result['mad']:.6f}s")
+
+    output = args.baseline if args.update_baseline else args.output
+    with open(output, "w") as f:
+        json.dump(current, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+    if args.update_baseline or not os.path.exists(args.baseline):
+        return 0
+
+    with open(args.baseline, "r") as f:
+        baseline = json.load(f)
+
+    regressions = compare_results(current, baseline, args.threshold,
+                                  args.noise)
+    for name, baseline_seconds, seconds in regressions:
+        print(f"Regresión en {name}: {baseline_seconds:.6f}s -> "
+              f"{seconds:.6f}s")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
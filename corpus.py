@@ -0,0 +1,245 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Formato binario para guardar muchas sopas de letras en un solo archivo.
+#
+# A diferencia del formato de texto de main.py (# INICIO ... # FIN), que solo
+# se puede leer de principio a fin, un corpus tiene un índice con la posición
+# de cada sopa, así que se puede abrir con mmap y leer la sopa número i sin
+# recorrer las anteriores.
+#
+# Uso:
+#   python corpus.py pack sopas.txt sopas.corpus     texto -> corpus
+#   python corpus.py unpack sopas.corpus sopas.txt   corpus -> texto
+
+import argparse
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from main import (Grid, Orientation, Placement, as_grid, format_soup,
+                  iter_soups)
+
+
+# Representamos un archivo de corpus como:
+#   header: magic (4 bytes), versión (uint16), reservado (uint16), cantidad
+#           de sopas (uint64) y posición del índice en el archivo (uint64)
+#   records: una sopa detrás de la otra, cada una con:
+#     - tamaño de la sopa (uint32), cantidad de palabras (uint32) y si tiene
+#       placements (uint8)
+#     - las letras de la sopa, fila por fila, tal como se guardan en un Grid
+#       (size * size bytes)
+#     - cada palabra: largo en bytes (uint16) y la palabra en UTF-8
+#     - si tiene placements, el de cada palabra en el mismo orden: fila y
+#       columna (uint32) y orientación (uint8, 0 si no tiene placement)
+#   índice: la posición en el archivo de cada sopa (uint64)
+# Todos los números están en little-endian.
+
+MAGIC = b"SOPA"
+VERSION = 1
+
+HEADER = struct.Struct("<4sHHQQ")
+RECORD_HEADER = struct.Struct("<IIB")
+WORD_LENGTH = struct.Struct("<H")
+PLACEMENT = struct.Struct("<IIB")
+OFFSET = struct.Struct("<Q")
+
+
+# CorpusFormatError: el archivo no es un corpus válido.
+class CorpusFormatError(ValueError):
+    pass
+
+
+# write_corpus: file iter(tuple) -> int
+# Recibe un archivo binario abierto para escribir y un iterador de tuplas
+# (sopa_de_letras, lista de palabras) o (sopa_de_letras, lista de palabras,
+# word_placements), y escribe un corpus con todas las sopas. Escribe cada
+# sopa apenas la recibe, así que solo guarda en memoria el índice (8 bytes
+# por sopa). Devuelve la cantidad de sopas escritas.
+def write_corpus(f, soups):
+    start = f.tell()
+    f.write(HEADER.pack(MAGIC, VERSION, 0, 0, 0))
+
+    offsets = array("Q")
+    for soup in soups:
+        offsets.append(f.tell() - start)
+        f.write(pack_record(*soup))
+
+    index_offset = f.tell() - start
+    if sys.byteorder != "little":
+        offsets.byteswap()
+    f.write(offsets.tobytes())
+
+    end = f.tell()
+    f.seek(start)
+    f.write(HEADER.pack(MAGIC, VERSION, 0, len(offsets), index_offset))
+    f.seek(end)
+    return len(offsets)
+
+
+# pack_record: sopa_de_letras list(str) (word_placements) -> bytes
+# Recibe una sopa de letras, su lista de palabras y opcionalmente sus
+# word_placements, y devuelve los bytes de su record en el corpus.
+def pack_record(soup, wordlist, word_placements=None):
+    grid = as_grid(soup)
+    parts = [RECORD_HEADER.pack(grid.size, len(wordlist),
+                                word_placements is not None),
+             bytes(grid.data)]
+
+    for word in wordlist:
+        code = word.encode("utf-8")
+        parts.append(WORD_LENGTH.pack(len(code)))
+        parts.append(code)
+
+    if word_placements is not None:
+        for word in wordlist:
+            placement = word_placements.get(word)
+            if placement is None:
+                parts.append(PLACEMENT.pack(0, 0, 0))
+            else:
+                parts.append(PLACEMENT.pack(*placement))
+
+    return b"".join(parts)
+
+
+# Corpus: un corpus abierto para leer.
+# len(corpus) es la cantidad de sopas, corpus[i] devuelve la sopa número i
+# como una tupla (Grid, lista de palabras, word_placements / None) en tiempo
+# constante, e iterar un Corpus devuelve todas las sopas en orden.
+# Lee el archivo a través de un mmap, así que abrirlo no carga las sopas en
+# memoria. Se usa como context manager:
+#   with open("sopas.corpus", "rb") as f, Corpus(f) as corpus:
+#       soup, wordlist, word_placements = corpus[1000000]
+class Corpus:
+    # __init__: file -> None
+    # Recibe un archivo de corpus abierto en modo binario.
+    def __init__(self, f):
+        if os.fstat(f.fileno()).st_size < HEADER.size:
+            raise CorpusFormatError("El archivo es demasiado corto")
+
+        self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, count, index_offset = \
+            HEADER.unpack_from(self.data)
+        if magic != MAGIC:
+            self.close()
+            raise CorpusFormatError("El archivo no es un corpus")
+        if version != VERSION:
+            self.close()
+            raise CorpusFormatError(f"Versión de corpus no soportada: "
+                                    f"{version}")
+        if index_offset + count * OFFSET.size > len(self.data):
+            self.close()
+            raise CorpusFormatError("El índice está incompleto")
+
+        self.count = count
+        self.index_offset = index_offset
+
+    def __len__(self):
+        return self.count
+
+    # __getitem__: int -> tuple(Grid, list(str), word_placements / None)
+    # Recibe un número de sopa (se permiten números negativos, como en una
+    # lista) y devuelve la sopa, su lista de palabras y sus word_placements,
+    # o None si el corpus no los tiene.
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("Número de sopa fuera de rango")
+
+        offset, = OFFSET.unpack_from(self.data,
+                                     self.index_offset + index * OFFSET.size)
+        return unpack_record(self.data, offset)
+
+    def __iter__(self):
+        for index in range(self.count):
+            yield self[index]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # close: -> None
+    # Cierra el mmap del corpus.
+    def close(self):
+        self.data.close()
+
+
+# unpack_record: bytes int -> tuple(Grid, list(str), word_placements / None)
+# Recibe los bytes de un corpus y la posición de un record, y devuelve la
+# sopa, su lista de palabras y sus word_placements (o None).
+def unpack_record(data, offset):
+    size, word_count, has_placements = RECORD_HEADER.unpack_from(data, offset)
+    offset += RECORD_HEADER.size
+
+    grid = Grid(size, data[offset:offset + size * size])
+    offset += size * size
+
+    wordlist = []
+    for _ in range(word_count):
+        length, = WORD_LENGTH.unpack_from(data, offset)
+        offset += WORD_LENGTH.size
+        wordlist.append(bytes(data[offset:offset + length]).decode("utf-8"))
+        offset += length
+
+    word_placements = None
+    if has_placements:
+        word_placements = {}
+        for word in wordlist:
+            row, col, orientation = PLACEMENT.unpack_from(data, offset)
+            offset += PLACEMENT.size
+            if orientation:
+                word_placements[word] = Placement(row, col,
+                                                  Orientation(orientation))
+
+    return grid, wordlist, word_placements
+
+
+# text_to_corpus: file file -> int
+# Recibe un archivo de texto con sopas de letras en el formato de main.py y
+# un archivo binario abierto para escribir, y guarda las sopas como corpus.
+# Devuelve la cantidad de sopas.
+def text_to_corpus(text_file, corpus_file):
+    return write_corpus(corpus_file, iter_soups(text_file))
+
+
+# corpus_to_text: file file -> int
+# Recibe un archivo de corpus abierto en modo binario y un archivo de texto
+# abierto para escribir, y guarda las sopas en el formato de main.py.
+# Devuelve la cantidad de sopas.
+def corpus_to_text(corpus_file, text_file):
+    with Corpus(corpus_file) as corpus:
+        for soup, wordlist, _ in corpus:
+            text_file.write(format_soup(soup, wordlist))
+        return len(corpus)
+
+
+# main: list(str) -> int
+# Recibe los argumentos de la línea de comandos, convierte el archivo y
+# devuelve el código de salida.
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["pack", "unpack"])
+    parser.add_argument("input")
+    parser.add_argument("output")
+    args = parser.parse_args(argv)
+
+    if args.command == "pack":
+        with open(args.input, "r") as text_file, \
+                open(args.output, "wb") as corpus_file:
+            count = text_to_corpus(text_file, corpus_file)
+    else:
+        with open(args.input, "rb") as corpus_file, \
+                open(args.output, "w") as text_file:
+            count = corpus_to_text(corpus_file, text_file)
+
+    print(f"{count} sopas")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
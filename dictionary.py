@@ -0,0 +1,374 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Diccionario de palabras indexado en memoria, para sacar muchas listas de
+# palabras al azar.
+#
+# Mezclar todo el diccionario para tomar las primeras N palabras cuesta
+# tiempo proporcional al tamaño del diccionario. Un Dictionary ordena las
+# palabras por largo una sola vez, así las palabras con un rango de largos
+# son un tramo contiguo de la lista y sacar N palabras al azar cuesta tiempo
+# proporcional a N.
+# Las listas no tienen palabras que es imposible que aparezcan una sola vez
+# en una sopa (como ANA junto a BANANA, ver remove_conflicting_words), así
+# create_soup puede generar la sopa de cada una.
+#
+# Uso:
+#   python dictionary.py dictionary.txt --lists 1000 --count 10 --seed 1 |
+#       python main.py generate
+
+import argparse
+import sys
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from random import Random
+
+from main import (calculate_soup_size, is_wordlist_valid,
+                  remove_conflicting_words)
+
+
+# Representamos un diccionario indexado con:
+#   words: list(str), las palabras sin repetir, ordenadas por largo y
+#          alfabéticamente dentro de cada largo
+#   length_offsets: list(int), donde las palabras de largo n son
+#                   words[length_offsets[n]:length_offsets[n + 1]]
+#   letter_indexes: dict<str>(array), para cada letra, las posiciones en
+#                   words de las palabras que empiezan con ella (en orden, así
+#                   las de un rango de largos también son un tramo contiguo)
+#   anagrams: dict<str>(list(str)), para cada multiconjunto de letras (como
+#             un string con las letras ordenadas), las palabras que lo forman.
+#             Se arma la primera vez que se usa.
+class Dictionary:
+    # __init__: iter(str) -> None
+    # Recibe las palabras del diccionario. Las pasa a mayúsculas, elimina las
+    # repetidas e ignora las que no son válidas para una sopa de letras.
+    def __init__(self, words):
+        words = {word.upper() for word in words}
+        self.words = sorted((word for word in words
+                             if is_wordlist_valid([word])),
+                            key=lambda word: (len(word), word))
+
+        max_length = len(self.words[-1]) if self.words else 0
+        self.length_offsets = [0] * (max_length + 2)
+        for word in self.words:
+            self.length_offsets[len(word) + 1] += 1
+        for length in range(1, max_length + 2):
+            self.length_offsets[length] += self.length_offsets[length - 1]
+
+        self.letter_indexes = {}
+        for index, word in enumerate(self.words):
+            self.letter_indexes.setdefault(word[0], array("I")).append(index)
+
+        self.anagrams = None
+
+    # from_file: file -> Dictionary
+    # Recibe un archivo con una palabra por línea y devuelve su diccionario.
+    @classmethod
+    def from_file(cls, f):
+        return cls(line.strip() for line in f if line.strip())
+
+    def __len__(self):
+        return len(self.words)
+
+    def __iter__(self):
+        return iter(self.words)
+
+    def __contains__(self, word):
+        start, end = self.get_range(len(word), len(word))
+        index = bisect_left(self.words, word, start, end)
+        return index < end and self.words[index] == word
+
+    # get_range: int (int) -> tuple(int, int)
+    # Recibe un largo mínimo y uno máximo (por defecto, sin máximo), y
+    # devuelve el tramo [start, end) de words con las palabras de esos
+    # largos.
+    def get_range(self, min_length, max_length=None):
+        last = len(self.length_offsets) - 1
+        min_length = min(max(min_length, 0), last)
+        if max_length is None:
+            max_length = last
+        max_length = min(max(max_length + 1, min_length), last)
+        return (self.length_offsets[min_length],
+                self.length_offsets[max_length])
+
+    # get_candidates: int (int) (str) -> Sequence(str)
+    # Recibe un largo mínimo, uno máximo y opcionalmente una primera letra, y
+    # devuelve las palabras que cumplen esas condiciones, ordenadas por largo,
+    # sin copiarlas: una secuencia que se puede indexar en tiempo constante.
+    def get_candidates(self, min_length, max_length=None, first_letter=None):
+        start, end = self.get_range(min_length, max_length)
+        if first_letter is None:
+            return WordRange(self.words, range(start, end))
+
+        index = self.letter_indexes.get(first_letter.upper(), array("I"))
+        return WordRange(self.words, index[bisect_left(index, start):
+                                           bisect_left(index, end)])
+
+    # get_anagrams: str -> list(str)
+    # Recibe una palabra y devuelve las palabras del diccionario que tienen
+    # exactamente las mismas letras (incluida ella, si está).
+    def get_anagrams(self, word):
+        if self.anagrams is None:
+            self.anagrams = {}
+            for other in self.words:
+                self.anagrams.setdefault("".join(sorted(other)),
+                                         []).append(other)
+        return list(self.anagrams.get("".join(sorted(word.upper())), []))
+
+    # sample: int (int) (int) (str) (Random) -> list(str)
+    # Recibe una cantidad de palabras, un largo mínimo, uno máximo, una
+    # primera letra y un generador de números al azar, y devuelve esa
+    # cantidad de palabras distintas al azar que cumplen las condiciones y
+    # pueden estar juntas en una sopa (ver replace_conflicting_words). Si no
+    # hay suficientes palabras lanza ValueError.
+    def sample(self, count, min_length=2, max_length=None, first_letter=None,
+               rng=None):
+        rng = rng or Random()
+        candidates = self.get_candidates(min_length, max_length,
+                                         first_letter)
+        if count > len(candidates):
+            raise ValueError("No hay suficientes palabras")
+        wordlist = [candidates[index]
+                    for index in rng.sample(range(len(candidates)), count)]
+        return self.replace_conflicting_words(wordlist, rng, candidates)
+
+    # replace_conflicting_words: list(str) Random (Sequence(str)) -> list(str)
+    # Recibe una lista de palabras distintas del diccionario, un generador de
+    # números al azar y opcionalmente las palabras candidatas (como las
+    # devuelve get_candidates). Cambia cada palabra que es imposible que
+    # aparezca una sola vez en una sopa junto a las demás (ver
+    # remove_conflicting_words) por otra al azar de las candidatas, o si no
+    # se indican, del mismo largo, así la lista sigue teniendo la misma
+    # cantidad de letras. Devuelve la lista nueva, o lanza ValueError si no
+    # quedan palabras para reemplazarlas.
+    def replace_conflicting_words(self, wordlist, rng, candidates=None):
+        used = set(wordlist)
+        while True:
+            kept = remove_conflicting_words(wordlist)
+            if len(kept) == len(wordlist):
+                return kept
+
+            kept_words = set(kept)
+            removed = [word for word in wordlist if word not in kept_words]
+            wordlist = kept
+            for word in removed:
+                word_candidates = candidates
+                if word_candidates is None:
+                    word_candidates = self.get_candidates(len(word),
+                                                          len(word))
+                # Casi siempre alcanzan unos pocos intentos al azar; si no,
+                # se elige entre todas las que quedan libres
+                for _ in range(10):
+                    replacement = word_candidates[
+                        rng.randrange(len(word_candidates))]
+                    if replacement not in used:
+                        break
+                else:
+                    free = [other for other in word_candidates
+                            if other not in used]
+                    if not free:
+                        raise ValueError("No hay suficientes palabras que "
+                                         "puedan estar en la misma sopa")
+                    replacement = rng.choice(free)
+                used.add(replacement)
+                wordlist.append(replacement)
+
+    # sample_total_letters: int int (int) (int) (Random) -> list(str)
+    # Recibe una cantidad de palabras, una cantidad total de letras, un largo
+    # mínimo, uno máximo y un generador de números al azar, y devuelve esa
+    # cantidad de palabras distintas al azar con exactamente ese total de
+    # letras, que pueden estar juntas en una sopa (ver
+    # replace_conflicting_words). Si no es posible lanza ValueError.
+    # Primero saca palabras al azar, y mientras el total no coincida cambia el
+    # largo de cada una por el largo disponible más cercano al que necesita;
+    # recién al final elige las palabras de cada largo.
+    def sample_total_letters(self, count, total, min_length=2,
+                             max_length=None, rng=None):
+        rng = rng or Random()
+        start, end = self.get_range(min_length, max_length)
+        min_total, max_total = self.get_total_letters_range(count, min_length,
+                                                            max_length)
+        if not min_total <= total <= max_total:
+            raise ValueError("No hay palabras con ese total de letras")
+
+        available = {length: self.length_offsets[length + 1]
+                     - self.length_offsets[length]
+                     for length in range(len(self.length_offsets) - 1)
+                     if self.length_offsets[length] < end
+                     and self.length_offsets[length + 1] > start}
+        lengths = [len(self.words[index])
+                   for index in rng.sample(range(start, end), count)]
+        used = Counter(lengths)
+        difference = total - sum(lengths)
+
+        shortest, longest = min(available), max(available)
+        positions = list(range(count))
+        while difference:
+            moved = False
+            rng.shuffle(positions)
+            for position in positions:
+                length = lengths[position]
+                target = min(max(length + difference, shortest), longest)
+                new_length = find_closest_length(length, target, available,
+                                                 used)
+                if new_length is None:
+                    continue
+
+                used[length] -= 1
+                used[new_length] += 1
+                lengths[position] = new_length
+                difference -= new_length - length
+                moved = True
+                if not difference:
+                    break
+
+            if not moved:
+                raise ValueError("No hay palabras con ese total de letras")
+
+        wordlist = []
+        for length, length_count in used.items():
+            offset = self.length_offsets[length]
+            wordlist.extend(self.words[offset + index] for index
+                            in rng.sample(range(available[length]),
+                                          length_count))
+        wordlist = self.replace_conflicting_words(wordlist, rng)
+        rng.shuffle(wordlist)
+        return wordlist
+
+    # get_total_letters_range: int (int) (int) -> tuple(int, int)
+    # Recibe una cantidad de palabras, un largo mínimo y uno máximo, y
+    # devuelve el menor y el mayor total de letras que pueden sumar esa
+    # cantidad de palabras distintas con esos largos. Si no hay suficientes
+    # palabras lanza ValueError.
+    def get_total_letters_range(self, count, min_length=2, max_length=None):
+        start, end = self.get_range(min_length, max_length)
+        if count > end - start:
+            raise ValueError("No hay suficientes palabras")
+        # Las palabras están ordenadas por largo: las más cortas son las
+        # primeras count y las más largas las últimas count
+        return (sum(map(len, self.words[start:start + count])),
+                sum(map(len, self.words[end - count:end])))
+
+    # sample_for_size: int int (Random) -> list(str)
+    # Recibe una cantidad de palabras, un tamaño de sopa de letras y un
+    # generador de números al azar, y devuelve esa cantidad de palabras
+    # distintas al azar para las que calculate_soup_size da ese tamaño, que
+    # pueden estar juntas en una sopa (ver replace_conflicting_words). Si no
+    # es posible lanza ValueError.
+    def sample_for_size(self, count, size, rng=None):
+        rng = rng or Random()
+        if count <= 20:
+            # El tamaño es el máximo entre la palabra más larga y la cantidad
+            # de palabras, más 3
+            longest = size - 3
+            if count > longest:
+                raise ValueError("No hay palabras para ese tamaño")
+            if count == longest:
+                return self.sample(count, max_length=longest, rng=rng)
+
+            first = self.sample(1, longest, longest, rng=rng)[0]
+            wordlist = [first] + [word for word in
+                                  self.sample(count, max_length=longest,
+                                              rng=rng)
+                                  if word != first][:count - 1]
+            wordlist = self.replace_conflicting_words(wordlist, rng)
+            rng.shuffle(wordlist)
+            return wordlist
+
+        # El tamaño es ceil(sqrt(total) * 2), así que el total de letras está
+        # entre (size - 1)² / 4 (sin incluir) y size² / 4
+        min_total, max_total = self.get_total_letters_range(count)
+        totals = [total for total in range(max((size - 1) ** 2 // 4,
+                                               min_total),
+                                           min(size ** 2 // 4, max_total) + 1)
+                  if calculate_soup_size([" " * total] + [""] * (count - 1))
+                  == size]
+        if not totals:
+            raise ValueError("No hay palabras para ese tamaño")
+        return self.sample_total_letters(count, rng.choice(totals), rng=rng)
+
+
+# WordRange: las palabras de una lista en ciertas posiciones, sin copiarlas.
+# Se puede indexar y medir como una lista.
+class WordRange:
+    __slots__ = "words", "indexes"
+
+    # __init__: list(str) Sequence(int) -> None
+    # Recibe la lista de palabras y las posiciones que forman parte del
+    # tramo (un range o un array).
+    def __init__(self, words, indexes):
+        self.words = words
+        self.indexes = indexes
+
+    def __len__(self):
+        return len(self.indexes)
+
+    def __getitem__(self, index):
+        return self.words[self.indexes[index]]
+
+    def __iter__(self):
+        return (self.words[index] for index in self.indexes)
+
+
+# find_closest_length: int int dict<int>(int) Counter -> int / None
+# Recibe el largo actual de una palabra, el largo que se quiere, la cantidad
+# de palabras de cada largo disponible y cuántas ya se usaron de cada largo,
+# y devuelve el largo con palabras libres más cercano al que se quiere que
+# esté entre el actual (sin incluirlo) y el que se quiere, o None si no hay.
+def find_closest_length(length, target, available, used):
+    step = 1 if target > length else -1
+    for new_length in range(target, length, -step):
+        if used[new_length] < available.get(new_length, 0):
+            return new_length
+    return None
+
+
+# sample_wordlists: Dictionary int int (int) (int) (int) -> iter(list(str))
+# Recibe un diccionario, una cantidad de listas, la cantidad de palabras de
+# cada lista, opcionalmente el tamaño de sopa de letras que deben dar, y una
+# semilla, y devuelve un iterador con las listas de palabras al azar. Cada
+# lista se puede usar para generar una sopa con create_soup.
+# Con la misma semilla se obtienen las mismas listas.
+def sample_wordlists(dictionary, n, count, size=None, min_length=2,
+                     max_length=None, seed=None):
+    rng = Random(seed)
+    for _ in range(n):
+        if size is None:
+            yield dictionary.sample(count, min_length, max_length, rng=rng)
+        else:
+            yield dictionary.sample_for_size(count, size, rng=rng)
+
+
+# main: list(str) (file) -> int
+# Recibe los argumentos de la línea de comandos y el archivo de salida (por
+# defecto, la salida estándar), escribe las listas de palabras, una por
+# línea, y devuelve el código de salida.
+def main(argv=None, out=None):
+    out = out or sys.stdout
+    parser = argparse.ArgumentParser()
+    parser.add_argument("dictionary", type=argparse.FileType("r"))
+    parser.add_argument("--lists", type=int, default=1)
+    parser.add_argument("--count", type=int, default=10)
+    parser.add_argument("--size", type=int, default=None)
+    parser.add_argument("--min-length", type=int, default=2)
+    parser.add_argument("--max-length", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    with args.dictionary as f:
+        dictionary = Dictionary.from_file(f)
+
+    try:
+        for wordlist in sample_wordlists(dictionary, args.lists, args.count,
+                                         args.size, args.min_length,
+                                         args.max_length, args.seed):
+            out.write(" ".join(wordlist) + "\n")
+    except ValueError as error:
+        print(error, file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,23 +1,72 @@
 #!/usr/bin/python3
 # -*- coding: utf-8 -*-
 
+import argparse
+import json
+import mmap
+import os
 import re
-from enum import Enum
-from random import choice, randint, random, shuffle
+import shelve
+import sys
+from bisect import bisect_right
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from enum import IntEnum
+from hashlib import sha256
+from itertools import islice
+from typing import NamedTuple
+from random import Random, choice, choices, randrange
+from random import seed as seed_random
 from math import sqrt, ceil
+from time import monotonic, perf_counter
 from termcolor import colored
 
+try:
+    import numpy as np
+except ImportError:  # NumPy es opcional: sin él se usa el solver de Python
+    np = None
+
 
 DEBUG = True  # Activa o desactiva los colores en la terminal
 
+ALPHABET = "ABCDEFGHIJKLMNÑOPQRSTUVWXYZ"  # Abecedario español
+
+# Límites por defecto de la búsqueda de generate_word_placements_growing antes
+# de agrandar la sopa de letras: cantidad de placements probados y segundos.
+SEARCH_MAX_NODES = 100000
+SEARCH_TIMEOUT = 5.0
+
+# Cantidad de veces que create_soup vuelve a ubicar las palabras si no logra
+# que cada una aparezca una sola vez en la sopa.
+UNIQUE_MAX_ATTEMPTS = 20
+
+# En el forward checking, un dominio es chico si DOMAIN_SMALL_CELLS celdas
+# ocupadas podrían vaciarlo: los chicos se mantienen siempre al día y los
+# grandes solo cuando hace falta, después de probar WITNESS_TRIES placements
+# al azar (ver check_domains).
+DOMAIN_SMALL_CELLS = 16
+WITNESS_TRIES = 8
+
+# solve_soup usa el backend de NumPy (si está instalado) para sopas de al
+# menos NUMPY_MIN_SIZE x NUMPY_MIN_SIZE con a lo sumo NUMPY_MAX_WORDS
+# palabras. Con más palabras es más rápido el autómata de
+# find_word_placements, que recorre la sopa una sola vez para todas.
+NUMPY_MIN_SIZE = 100
+NUMPY_MAX_WORDS = 150
+
 # Representamos una sopa de letras como:
-# sopa_de_letras: list(list(str))
-# Por ejemplo:
-# [["a", "b", "x", "s", "w"],
-# [["s", "a", "o", "s", "u"],
-# [["t", "r", "v", "c", "t"],
-# [["e", "c", "n", "s", "a"],
-# [["p", "o", "e", "i", "r"]]
+# sopa_de_letras: Grid
+# Un Grid guarda las letras de la sopa fila por fila en un bytearray, con un
+# byte por letra (ver la clase Grid más abajo). Las funciones que reciben una
+# sopa de letras también aceptan el formato anterior, list(list(str)), y
+# Grid.to_rows / Grid.from_rows convierten entre ambos.
+# Por ejemplo, el Grid
+# Grid.from_rows([["A", "B", "X", "S", "W"],
+#                 ["S", "A", "O", "S", "U"],
+#                 ["T", "R", "V", "C", "T"],
+#                 ["E", "C", "N", "S", "A"],
+#                 ["P", "O", "E", "I", "R"]])
+# guarda b"ABXSWSAOSUTRVCTECNSAPOEIR".
 
 # Representamos un diccionario de word_placements como:
 # word_placements: dict<str>(placement)
@@ -30,16 +79,53 @@ DEBUG = True  # Activa o desactiva los colores en la terminal
 # }
 
 # Representamos un placement de una palabra como:
-# placement: dict<str>(int / Orientation)
+# placement: Placement
+# Por ejemplo:
+# placement = Placement(
+#   row, ---------> fila donde comienza la palabra
+#   col, ---------> columna donde comienza la palabra
+#   orientation --> tipo de orientación de la palabra
+# )
+# Placement es un NamedTuple, así que es inmutable, se puede usar en
+# conjuntos y como key de diccionarios, y placement.to_dict() devuelve el
+# formato anterior: {"row": int, "col": int, "orientation": Orientation}.
+
+# Representamos la ocupación de las celdas de una sopa de letras como:
+# occupancy: dict<tuple(int, int)>(list(str, int))
 # Por ejemplo:
-# placement =  {
-#   "row": int, -----------------> fila donde comienza la palabra
-#   "col": int, -----------------> columna donde comienza la palabra
-#   "orientation": Orientation --> tipo de orientación de la palabra
+# {
+#   (row, col): [letter, count], --> letra de la celda y cantidad de palabras
+#   ...                              que la usan
 # }
 
-# Si elige la opción 3 (resolver sopas de letras), deberá ingresar el nombre
-# de un archivo de texto que contenga las sopas de letras.
+# Representamos el presupuesto de una búsqueda de placements como:
+# search_budget: dict<str>(int / float / None)
+# Por ejemplo:
+# search_budget = {
+#   "nodes": int, ------------> cantidad de placements probados
+#   "max_nodes": int / None, -> cantidad máxima de placements a probar
+#   "deadline": float / None -> momento (según monotonic) en que se termina
+# }
+
+# Representamos el dominio de una palabra en el forward checking como:
+# domain: dict<str>(int / set(placement) / placement / None / list)
+# Por ejemplo:
+# domain = {
+#   "size": int, ----------------> cantidad de placements en los que la
+#                                  palabra entra en la sopa
+#   "removed": set(placement), --> placements quitados por chocar con alguna
+#                                  de las celdas ocupadas ya revisadas
+#   "checked": int, -------------> cuántas celdas ocupadas ya se revisaron
+#   "witness": placement / None -> último placement válido que se encontró
+#   "steps": list ---------------> para cada orientación, su paso, las filas
+#                                  y columnas donde puede empezar la palabra
+#                                  y sus letras en el orden en que se escriben
+# }
+# Los placements del dominio son los que entran en la sopa y no están en
+# "removed".
+
+# Si elige la opción 3 o 6 (resolver sopas de letras), deberá ingresar el
+# nombre de un archivo de texto que contenga las sopas de letras.
 # La estructura que debe llevar es la siguiente:
 #   - Donde empieza la sopa de letra tiene que tener: # INICIO
 #   - Luego en la siguientes lineas tiene que tener la sopa de letras, con
@@ -68,18 +154,226 @@ DEBUG = True  # Activa o desactiva los colores en la terminal
 # Para ver otro ejemplo, vea sopas.txt
 
 
-# Representamos las 5 orientaciones con números:
-# Orientation.HORIZONTAL = 1
-# Orientation.HORIZONTAL_REVERSED = 2
-# Orientation.VERTICAL = 3
-# Orientation.VERTICAL_REVERSED = 4
-# Orientation.DIAGONAL = 5
-class Orientation(Enum):
+# Representamos las 8 orientaciones con números:
+# Orientation.HORIZONTAL = 1 ------------> de izquierda a derecha
+# Orientation.HORIZONTAL_REVERSED = 2 ---> de derecha a izquierda
+# Orientation.VERTICAL = 3 --------------> de arriba hacia abajo
+# Orientation.VERTICAL_REVERSED = 4 -----> de abajo hacia arriba
+# Orientation.DIAGONAL = 5 --------------> hacia abajo a la derecha
+# Orientation.DIAGONAL_REVERSED = 6 -----> hacia arriba a la izquierda
+# Orientation.ANTIDIAGONAL = 7 ----------> hacia abajo a la izquierda
+# Orientation.ANTIDIAGONAL_REVERSED = 8 -> hacia arriba a la derecha
+# Es un IntEnum para que hashear placements (por ejemplo en los dominios de
+# generate_word_placements_forward_checking) sea tan barato como hashear ints.
+class Orientation(IntEnum):
     HORIZONTAL = 1
     HORIZONTAL_REVERSED = 2
     VERTICAL = 3
     VERTICAL_REVERSED = 4
     DIAGONAL = 5
+    DIAGONAL_REVERSED = 6
+    ANTIDIAGONAL = 7
+    ANTIDIAGONAL_REVERSED = 8
+
+
+# Tabla de direcciones: para cada orientación, cuánto avanzan la fila y la
+# columna de una letra a la siguiente al escribir la palabra en la sopa, y si
+# la palabra se escribe al revés. El placement de una palabra es la celda
+# donde se escribe su primera letra (la última de la palabra si está al
+# revés), así que las orientaciones al revés usan el mismo paso que la
+# orientación normal.
+ORIENTATION_STEPS = {
+    Orientation.HORIZONTAL: (0, 1, False),
+    Orientation.HORIZONTAL_REVERSED: (0, 1, True),
+    Orientation.VERTICAL: (1, 0, False),
+    Orientation.VERTICAL_REVERSED: (1, 0, True),
+    Orientation.DIAGONAL: (1, 1, False),
+    Orientation.DIAGONAL_REVERSED: (1, 1, True),
+    Orientation.ANTIDIAGONAL: (1, -1, False),
+    Orientation.ANTIDIAGONAL_REVERSED: (1, -1, True)
+}
+
+ORIENTATIONS_BY_STEP = {step: orientation
+                        for orientation, step in ORIENTATION_STEPS.items()}
+
+
+# Grid: representa una sopa de letras cuadrada de size x size.
+# Cada letra se guarda como su código latin-1 (la Ñ es siempre 0xD1) en un
+# bytearray de size * size bytes, fila por fila, así una sopa ocupa un byte
+# por letra y copiarla es copiar un solo bloque de memoria.
+# grid[row, col] devuelve la letra de una celda, grid[row] devuelve una fila
+# como str, e iterar un Grid devuelve sus filas como list(str), igual que en
+# el formato anterior.
+# Un Grid guarda en cache datos calculados a partir de sus letras (por
+# ejemplo, sus líneas como strings); la cache se vacía al modificar una celda
+# con grid[row, col] = letra.
+class Grid:
+    __slots__ = ("size", "data", "cache")
+
+    # __init__: int (bytes) -> None
+    # Recibe el tamaño de la sopa y, opcionalmente, sus letras codificadas
+    # fila por fila.
+    def __init__(self, size, data=None):
+        self.size = size
+        self.cache = {}
+        if data is None:
+            self.data = bytearray(size * size)
+        elif len(data) == size * size:
+            self.data = bytearray(data)
+        else:
+            raise ValueError(f"Se esperaban {size * size} letras")
+
+    # from_rows: list(list(str)) -> Grid
+    # Recibe una sopa de letras en el formato list(list(str)) y devuelve el
+    # Grid equivalente.
+    @classmethod
+    def from_rows(cls, rows):
+        size = len(rows)
+        if any(len(row) != size for row in rows):
+            raise ValueError("La sopa de letras no es cuadrada")
+        return cls(size, encode_letters("".join("".join(row) for row in rows)))
+
+    # to_rows: -> list(list(str))
+    # Devuelve la sopa de letras en el formato list(list(str)).
+    def to_rows(self):
+        return [list(row) for row in self.rows()]
+
+    # rows: -> list(str)
+    # Devuelve las filas de la sopa de letras como strings.
+    def rows(self):
+        text = decode_letters(self.data)
+        return [text[i:i+self.size] for i in range(0, len(text), self.size)]
+
+    # row: int -> memoryview
+    # Devuelve una vista, sin copiar, de los códigos de una fila.
+    def row(self, row):
+        start = row * self.size
+        return memoryview(self.data)[start:start+self.size]
+
+    # column: int -> memoryview
+    # Devuelve una vista, sin copiar, de los códigos de una columna.
+    def column(self, col):
+        return memoryview(self.data)[col::self.size]
+
+    # diagonal: int -> memoryview
+    # Recibe un número k y devuelve una vista, sin copiar, de los códigos de
+    # la diagonal que comienza en (0, k) si k >= 0, o en (-k, 0) si k < 0.
+    def diagonal(self, k):
+        return self.line(max(-k, 0), max(k, 0), 1, 1)
+
+    # line: int int int int -> memoryview
+    # Recibe una celda y cuánto avanzan la fila y la columna de una letra a la
+    # siguiente, y devuelve una vista, sin copiar, de los códigos de la línea
+    # que va desde esa celda hasta el borde de la sopa.
+    def line(self, row, col, drow, dcol):
+        length = self.size
+        for position, step in [(row, drow), (col, dcol)]:
+            if step > 0:
+                length = min(length, self.size - position)
+            elif step < 0:
+                length = min(length, position + 1)
+
+        view = memoryview(self.data)
+        if length <= 0 or not 0 <= row < self.size or not 0 <= col < self.size:
+            return view[0:0]
+
+        start = row * self.size + col
+        step = drow * self.size + dcol
+        # Con una sola letra el paso puede ser 0 (diagonal inversa de 1x1)
+        if length == 1:
+            return view[start:start+1]
+        end = start + (length - 1) * step + (1 if step > 0 else -1)
+        return view[start:end if end >= 0 else None:step]
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            row, col = key
+            return chr(self.data[row * self.size + col])
+        return decode_letters(self.row(key))
+
+    def __setitem__(self, key, letter):
+        row, col = key
+        self.data[row * self.size + col] = encode_letters(letter)[0]
+        self.cache.clear()
+
+    def __iter__(self):
+        return iter(self.to_rows())
+
+    def __eq__(self, other):
+        if isinstance(other, Grid):
+            return self.size == other.size and self.data == other.data
+        if isinstance(other, list):
+            return self.to_rows() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Grid.from_rows({self.to_rows()!r})"
+
+
+# as_grid: sopa_de_letras / list(list(str)) -> Grid
+# Recibe una sopa de letras en cualquiera de los dos formatos y la devuelve
+# como Grid. Si ya es un Grid, devuelve el mismo objeto.
+def as_grid(soup):
+    if isinstance(soup, Grid):
+        return soup
+    return Grid.from_rows(soup)
+
+
+# encode_letters: str -> bytes
+# Recibe un texto y devuelve los códigos de sus letras, tal como se guardan
+# en un Grid. Si alguna letra no se puede codificar, lanza ValueError.
+def encode_letters(text):
+    return text.encode("latin-1")
+
+
+# decode_letters: bytes -> str
+# Recibe códigos de letras de un Grid y devuelve el texto correspondiente.
+def decode_letters(data):
+    return bytes(data).decode("latin-1")
+
+
+# Placement: representa la ubicación de una palabra en la sopa de letras.
+class Placement(NamedTuple):
+    row: int
+    col: int
+    orientation: Orientation
+
+    # from_dict: dict<str>(int / Orientation) -> Placement
+    # Recibe un placement en el formato anterior y devuelve el Placement
+    # equivalente.
+    @classmethod
+    def from_dict(cls, placement):
+        return cls(placement["row"], placement["col"],
+                   placement["orientation"])
+
+    # to_dict: -> dict<str>(int / Orientation)
+    # Devuelve el placement en el formato anterior.
+    def to_dict(self):
+        return {
+            "row": self.row,
+            "col": self.col,
+            "orientation": self.orientation
+        }
+
+    # step: tuple(int, int, bool)
+    # Cuánto avanzan la fila y la columna de una letra a la siguiente, y si
+    # la palabra se escribe al revés.
+    @property
+    def step(self):
+        return get_orientation_step(self.orientation)
+
+    # positions: int -> tuple(tuple(int, int))
+    # Recibe el largo de la palabra y devuelve las celdas que ocupa, en el
+    # orden en que se escriben sus letras.
+    def positions(self, length):
+        drow, dcol, _ = get_orientation_step(self.orientation)
+        return tuple((self.row + i*drow, self.col + i*dcol)
+                     for i in range(length))
 
 
 # get_wordlist_input: -> list(str)
@@ -114,9 +408,7 @@ def is_wordlist_valid(wordlist):
 # generate_soup: list(str) -> sopa_de_letras
 # Recibe una lista de palabras y devuelve una sopa de letras con ellas.
 def generate_soup(wordlist):
-    size = calculate_soup_size(wordlist)
-    word_placements = generate_word_placements(wordlist, size)
-    soup_matrix = create_soup_matrix(size, word_placements)
+    soup_matrix, word_placements = create_soup(wordlist)
 
     if DEBUG:
         display_soup(soup_matrix, word_placements)
@@ -125,6 +417,369 @@ def generate_soup(wordlist):
     return soup_matrix
 
 
+# SoupGenerationError: no se puede generar una sopa de letras donde cada
+# palabra aparezca una sola vez.
+class SoupGenerationError(ValueError):
+    pass
+
+
+# create_soup: list(str) (int) (float)
+#              -> tuple(sopa_de_letras, word_placements)
+# Recibe una lista de palabras y devuelve una sopa de letras con ellas junto
+# con el diccionario de word_placements usado, sin mostrarla. Cada palabra
+# aparece en la sopa una sola vez, en su placement.
+# Las palabras que están dentro de otra (como SOL en GIRASOL, o al revés) no
+# se ubican por separado: aparecen sí o sí dentro de la otra, así que su
+# placement es ese. Las palabras que se cruzan pueden formar otra aparición
+# de alguna palabra sin usar letras de relleno; remove_fixed_duplicates las
+# mueve hasta que no quede ninguna. Si no lo logra vuelve a ubicar todas las
+# palabras, hasta max_attempts veces, y si se agotan los intentos o es
+# imposible lanza SoupGenerationError.
+# Si recibe timeout, deja de buscar después de esa cantidad de segundos y
+# lanza TimeoutError.
+def create_soup(wordlist, max_attempts=UNIQUE_MAX_ATTEMPTS, timeout=None):
+    deadline = None if timeout is None else monotonic() + timeout
+    wordlist = list(dict.fromkeys(wordlist))  # elimina duplicados
+    # Un solo autómata con todas las palabras sirve para cada paso
+    automaton = build_automaton(wordlist)
+    contained_words = get_contained_words(wordlist, automaton)
+    free_words = [word for word in wordlist if word not in contained_words]
+    size = calculate_soup_size(wordlist)
+
+    for _ in range(max_attempts):
+        word_placements, size, _ = generate_word_placements_growing(
+            free_words, size, deadline=deadline)
+        if word_placements is None:
+            raise TimeoutError("Se superó el tiempo máximo para generar la "
+                               "sopa")
+        if not remove_fixed_duplicates(word_placements, contained_words,
+                                       size, automaton=automaton,
+                                       deadline=deadline):
+            continue
+        word_placements.update(get_contained_placements(contained_words,
+                                                        word_placements))
+        try:
+            soup_matrix = create_soup_matrix(size, word_placements,
+                                             automaton=automaton,
+                                             deadline=deadline)
+        except SoupGenerationError:
+            continue
+        return soup_matrix, {word: word_placements[word] for word in wordlist}
+
+    raise SoupGenerationError("No se pudo generar una sopa donde cada "
+                              "palabra aparezca una sola vez")
+
+
+# check_deadline: float / None -> None
+# Recibe un momento según time.monotonic (o None, sin límite) y, si ya pasó,
+# lanza TimeoutError.
+def check_deadline(deadline):
+    if deadline is not None and monotonic() > deadline:
+        raise TimeoutError("Se superó el tiempo máximo para generar la sopa")
+
+
+# get_contained_words: list(str) (automaton)
+#                      -> dict<str>(tuple(str, int, bool))
+# Recibe una lista de palabras sin repetir y, opcionalmente, su autómata (ver
+# build_automaton), y devuelve, para cada palabra que está dentro de otra de
+# la lista (al derecho o al revés), una tupla con la palabra que la contiene
+# y que no está dentro de ninguna otra, la posición de su primera letra
+# dentro de ella y si está al revés.
+# Si es imposible que alguna palabra aparezca una sola vez en la sopa (ver
+# get_word_conflicts) lanza SoupGenerationError.
+def get_contained_words(wordlist, automaton=None):
+    containers = get_word_containers(wordlist, automaton)
+    for word, message in get_word_conflicts(containers).items():
+        raise SoupGenerationError(message)
+
+    return {word: next(container for container in word_containers
+                       if container[0] not in containers)
+            for word, word_containers in containers.items()}
+
+
+# remove_conflicting_words: list(str) -> list(str)
+# Recibe una lista de palabras y devuelve las mismas palabras, sin repetir,
+# salvo las que es imposible que aparezcan una sola vez en la sopa (ver
+# get_word_conflicts).
+def remove_conflicting_words(wordlist):
+    wordlist = list(dict.fromkeys(wordlist))
+    conflicts = get_word_conflicts(get_word_containers(wordlist))
+    return [word for word in wordlist if word not in conflicts]
+
+
+# get_word_containers: list(str) (automaton)
+#                      -> dict<str>(list(tuple(str, int, bool)))
+# Recibe una lista de palabras sin repetir y, opcionalmente, su autómata (ver
+# build_automaton), y devuelve, para cada palabra que está dentro de otras de
+# la lista (al derecho o al revés), una lista de tuplas con cada palabra que
+# la contiene, la posición de su primera letra dentro de ella (None si
+# aparece más de una vez) y si está al revés.
+# Si dos palabras son una la otra al revés, se considera que la segunda está
+# dentro de la primera.
+def get_word_containers(wordlist, automaton=None):
+    if automaton is None:
+        automaton = build_automaton(wordlist)
+    order = {word: index for index, word in enumerate(wordlist)}
+
+    containers = {}
+    for word in wordlist:
+        starts = {}
+        for other, placement in iter_line_matches(automaton,
+                                                  encode_letters(word),
+                                                  0, 0, 0, 1):
+            if (len(other), -order[other]) >= (len(word), -order[word]):
+                continue
+            is_reversed = placement.orientation != Orientation.HORIZONTAL
+            # Un palíndromo aparece al derecho y al revés en las mismas
+            # letras: es una sola aparición, al derecho
+            other_starts = starts.setdefault(other, {})
+            other_starts[placement.col] = (is_reversed and
+                                           other_starts.get(placement.col,
+                                                            True))
+
+        for other, other_starts in starts.items():
+            start, is_reversed = other_starts.popitem()
+            if other_starts:
+                start = None
+            containers.setdefault(other, []).append((word, start,
+                                                     is_reversed))
+    return containers
+
+
+# get_word_conflicts: dict<str>(list(tuple(str, int, bool)))
+#                     -> dict<str>(str)
+# Recibe las palabras contenidas en otras, como las devuelve
+# get_word_containers, y devuelve para cada palabra que es imposible que
+# aparezca una sola vez en la sopa un mensaje que explica por qué:
+#   - aparece más de una vez dentro de otra palabra (como ANA en BANANA)
+#   - aparece dentro de dos palabras que no están dentro de ninguna otra
+#     (como ONE en STONE y en PHONE). A veces esas dos palabras se podrían
+#     superponer, pero create_soup no lo intenta.
+def get_word_conflicts(containers):
+    conflicts = {}
+    for word, word_containers in containers.items():
+        repeated = [container for container, start, _ in word_containers
+                    if start is None]
+        outer = [container for container, _, _ in word_containers
+                 if container not in containers]
+        if repeated:
+            conflicts[word] = (f"{word} aparece más de una vez dentro de "
+                               f"{repeated[0]}")
+        elif len(outer) > 1:
+            conflicts[word] = (f"{word} aparece dentro de {outer[0]} y de "
+                               f"{outer[1]}")
+    return conflicts
+
+
+# get_contained_placements: dict<str>(tuple(str, int, bool)) word_placements
+#                           -> word_placements
+# Recibe las palabras que están dentro de otras, como las devuelve
+# get_contained_words, y los word_placements de las demás palabras, y
+# devuelve el placement de cada palabra contenida: las celdas que ocupa
+# dentro de la palabra que la contiene.
+def get_contained_placements(contained_words, word_placements):
+    contained_placements = {}
+    for word, (container, start, is_reversed) in contained_words.items():
+        placement = word_placements[container]
+        # Celdas de cada letra del contenedor, en el orden de la palabra
+        cells = placement.positions(len(container))
+        if placement.step[2]:
+            cells = cells[::-1]
+
+        cells = cells[start:start + len(word)]
+        if is_reversed:
+            cells = cells[::-1]
+        contained_placements[word] = get_placement_from_cells(cells)
+    return contained_placements
+
+
+# get_placement_from_cells: tuple(tuple(int, int)) -> placement
+# Recibe las celdas de las letras de una palabra (al menos dos), en el orden
+# de la palabra, y devuelve su placement.
+def get_placement_from_cells(cells):
+    (row, col), (next_row, next_col) = cells[0], cells[1]
+    drow, dcol = next_row - row, next_col - col
+
+    orientation = get_orientation(drow, dcol, False)
+    if orientation is not None:
+        return Placement(row, col, orientation)
+    # Se escribe al revés: el placement empieza en la última letra
+    row, col = cells[-1]
+    return Placement(row, col, get_orientation(-drow, -dcol, True))
+
+
+# generate_soups: list(str) int (int) (int) (bool) (int)
+#                 -> iter(tuple(int, sopa_de_letras, word_placements))
+# Recibe una lista de palabras y una cantidad N de sopas de letras a generar.
+# Genera las N sopas en paralelo con processes procesos (por defecto, uno por
+# CPU) y las devuelve a medida que terminan como tuplas (número de sopa, sopa,
+# word_placements).
+# Cada sopa usa su propia semilla, derivada de seed, por lo que con la misma
+# seed se obtienen las mismas sopas sin importar la cantidad de procesos.
+# Si ordered es True las sopas se devuelven en orden, si no, en el orden en
+# que terminan. Nunca hay más de max_in_flight sopas generándose o esperando
+# ser devueltas, así la memoria usada no depende de N.
+def generate_soups(wordlist, n, seed=None, processes=None, ordered=True,
+                   max_in_flight=None):
+    rng = Random(seed)
+    arguments = ((index, wordlist, rng.getrandbits(64))
+                 for index in range(n))
+    return map_in_pool(create_soup_with_seed, arguments, processes, ordered,
+                       max_in_flight)
+
+
+# Representamos el resultado de resolver una sopa de letras de un lote como:
+# solve_result: dict<str>(int / float / word_placements / list(str))
+# Por ejemplo:
+# solve_result = {
+#   "index": int, ------------------> número de sopa en el lote, desde 0
+#   "size": int, -------------------> tamaño de la sopa
+#   "seconds": float, --------------> segundos que tardó en resolverse
+#   "word_placements": word_placements, --> placements de las palabras
+#                                           encontradas
+#   "not_found": list(str) ---------> palabras que no se encontraron
+# }
+
+
+# solve_soups: iter(tuple(sopa_de_letras, list(str))) (int) (int) (int)
+#              -> iter(solve_result)
+# Recibe un iterador de tuplas de sopa_de_letras y lista de palabras (por
+# ejemplo, iter_soups) y resuelve las sopas en paralelo con processes
+# procesos (por defecto, uno por CPU), sin mostrarlas. Devuelve un iterador
+# con el solve_result de cada sopa, en el mismo orden que las sopas.
+# Las sopas se mandan a los procesos en grupos de chunk_size, para que el
+# costo de pasarlas entre procesos no dependa de la cantidad de sopas, y como
+# en generate_soups nunca hay más de max_in_flight grupos pendientes.
+def solve_soups(soups, processes=None, chunk_size=16, max_in_flight=None):
+    chunks = iter_chunks(enumerate(soups), chunk_size)
+    for results in map_in_pool(solve_soup_chunk, chunks, processes,
+                               max_in_flight=max_in_flight):
+        yield from results
+
+
+# iter_chunks: iter int -> iter(list)
+# Recibe un iterador y un tamaño, y devuelve un iterador con listas de a
+# size elementos consecutivos (la última puede tener menos).
+def iter_chunks(iterable, size):
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
+
+
+# solve_soup_chunk: list(tuple(int, tuple(sopa_de_letras, list(str))))
+#                   -> list(solve_result)
+# Recibe una lista de sopas numeradas con sus listas de palabras, y devuelve
+# el solve_result de cada una.
+def solve_soup_chunk(chunk):
+    results = []
+    for index, (soup, wordlist) in chunk:
+        start = perf_counter()
+        found_placements = find_solution(soup, wordlist)
+        seconds = perf_counter() - start
+
+        results.append({
+            "index": index,
+            "size": len(soup),
+            "seconds": seconds,
+            "word_placements": {word: placement
+                                for word, placement in found_placements.items()
+                                if placement is not None},
+            "not_found": [word for word in wordlist
+                          if found_placements.get(word) is None]
+        })
+    return results
+
+
+# format_solve_result: solve_result -> str
+# Recibe un solve_result y devuelve una línea de JSON que lo representa, con
+# cada placement como {"row": int, "col": int, "orientation": str}.
+def format_solve_result(result):
+    return json.dumps({
+        **result,
+        "word_placements": {
+            word: {**placement.to_dict(),
+                   "orientation": placement.orientation.name}
+            for word, placement in result["word_placements"].items()
+        }
+    }, ensure_ascii=False)
+
+
+# create_soup_with_seed: tuple(int, list(str), int) (float)
+#                        -> tuple(int, sopa_de_letras, word_placements)
+# Recibe una tupla con el número de sopa, la lista de palabras y una semilla,
+# y opcionalmente un tiempo máximo en segundos (ver create_soup).
+# Inicializa el generador de números aleatorios con la semilla y devuelve el
+# número de sopa junto con el resultado de create_soup.
+def create_soup_with_seed(arguments, timeout=None):
+    index, wordlist, soup_seed = arguments
+    seed_random(soup_seed)
+    return (index, *create_soup(wordlist, timeout=timeout))
+
+
+# try_create_soup_with_seed: tuple(int, list(str), int)
+#                            -> tuple(int, sopa_de_letras, word_placements)
+# Igual que create_soup_with_seed, pero si la lista de palabras no permite
+# generar una sopa devuelve el número de sopa, None y el mensaje de error en
+# lugar de lanzar SoupGenerationError, así una lista inválida no corta las
+# demás.
+def try_create_soup_with_seed(arguments):
+    try:
+        return create_soup_with_seed(arguments)
+    except SoupGenerationError as error:
+        return arguments[0], None, str(error)
+
+
+# map_in_pool: function iter (int) (bool) (int) -> iter
+# Recibe una función y un iterador de argumentos, y devuelve un iterador con
+# el resultado de aplicar la función a cada argumento en un pool de processes
+# procesos. Los argumentos se consumen a medida que se necesitan: nunca hay
+# más de max_in_flight (por defecto, 4 por proceso) resultados pendientes.
+# Si ordered es True devuelve los resultados en el orden de los argumentos,
+# si no, a medida que terminan. Con un solo proceso no crea un pool.
+def map_in_pool(function, arguments, processes=None, ordered=True,
+                max_in_flight=None):
+    processes = processes or os.cpu_count() or 1
+    max_in_flight = max_in_flight or processes * 4
+
+    if processes == 1:
+        yield from map(function, arguments)
+        return
+
+    executor = ProcessPoolExecutor(processes)
+    pending = deque() if ordered else set()
+    try:
+        for argument in arguments:
+            if len(pending) >= max_in_flight:
+                yield from collect_finished(pending, ordered)
+
+            future = executor.submit(function, argument)
+            if ordered:
+                pending.append(future)
+            else:
+                pending.add(future)
+
+        while pending:
+            yield from collect_finished(pending, ordered)
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+# collect_finished: deque(Future) / set(Future) bool -> iter
+# Recibe los futures pendientes de map_in_pool. Si ordered es True espera al
+# primero y devuelve su resultado, si no, espera a que termine alguno y
+# devuelve los resultados de todos los que ya terminaron.
+def collect_finished(pending, ordered):
+    if ordered:
+        yield pending.popleft().result()
+    else:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            pending.remove(future)
+            yield future.result()
+
+
 # calculate_soup_size: list(str) -> int
 # Recibe una lista de palabras y devuelve el tamaño que se debe usar para
 # generar la sopa de letras. Lo calcula de la siguiente manera:
@@ -143,116 +798,502 @@ def calculate_soup_size(wordlist):
         return ceil(sqrt(character_count)*2)
 
 
-# generate_word_placements: list(str) int -> word_placements
+# generate_word_placements: list(str) int -> word_placements / None
 # Recibe una lista de palabras y el tamaño de la sopa de letras, genera para
 # cada palabra un placement al azar y los devuelve en un diccionario de
-# word_placements.
-def generate_word_placements(wordlist, size):
+# word_placements. Si las palabras no entran en la sopa, devuelve None.
+# Hace una búsqueda en profundidad: para cada palabra ubicada guardamos un
+# iterador con los placements que todavía no probamos, así al volver atrás
+# seguimos desde donde quedamos sin repetir placements.
+# Mantiene una occupancy que se actualiza al ubicar y quitar cada palabra, de
+# manera que validar un placement no dependa de cuántas palabras ya ubicamos.
+# Si forward_checking es True, usa generate_word_placements_forward_checking.
+# Si se prueban más de max_nodes placements o pasan más de timeout segundos,
+# abandona la búsqueda y devuelve None.
+def generate_word_placements(wordlist, size, forward_checking=False,
+                             max_nodes=None, timeout=None):
+    search_budget = create_search_budget(max_nodes, timeout)
+    if forward_checking:
+        return generate_word_placements_forward_checking(wordlist, size,
+                                                         search_budget)
+
+    wordlist = list(dict.fromkeys(wordlist))  # elimina duplicados
     word_placements = {}
-    failed_word_placements = []
-    current_word_index = 0
-
-    while current_word_index != len(wordlist):
-        word = wordlist[current_word_index]
-        placement = try_to_place(
-            word,
-            word_placements,
-            size,
-            failed_word_placements
-        )
-
-        if placement:
-            current_word_index += 1
-            word_placements[word] = placement
-        else:
-            failed_word_placements.append(word_placements.copy())
-            current_word_index = max(0, current_word_index - 1)
-            if wordlist[current_word_index] in word_placements:
-                del word_placements[wordlist[current_word_index]]
+    occupancy = {}
 
-    return word_placements
+    if not wordlist:
+        return word_placements
 
+    candidates = [iter_valid_placements(wordlist[0], size, occupancy)]
+    while candidates:
+        word = wordlist[len(candidates) - 1]
+        if word in word_placements:
+            # Volvimos a esta palabra, quitamos su placement anterior
+            unplace_word(word, word_placements.pop(word), occupancy)
 
-# try_to_place: string word_placements int list(word_placements) -> placement /
-#                                                                   bool
-# Recibe una palabra, un diccionario de word_placements, el tamaño de la sopa
-# de letras y una lista de word_placements ya probados. Devuelve un placement
-# para la palabra si existe uno posible, y False en caso contrario.
-def try_to_place(word, word_placements, size, failed_word_placements=[]):
-    possible_orientations = list(Orientation)
-    possible_positions = [(row, col)
-                          for col in range(size) for row in range(size)]
-
-    shuffle(possible_orientations)
-    shuffle(possible_positions)
-    for row, col in possible_positions:
-        for orientation in possible_orientations:
-            placement = {
-                "row": row,
-                "col": col,
-                "orientation": orientation
-            }
-
-            if (should_skip_placement(word,
-                                      placement,
-                                      word_placements,
-                                      failed_word_placements)):
-                continue
+        placement = next(candidates[-1], None)
+        if placement is None:
+            candidates.pop()
+            continue
+        if not spend_search_budget(search_budget):
+            return None
+
+        word_placements[word] = placement
+        place_word(word, placement, occupancy)
+        if len(candidates) == len(wordlist):
+            return word_placements
+
+        next_word = wordlist[len(candidates)]
+        candidates.append(iter_valid_placements(next_word, size, occupancy))
+
+    return None
+
+
+# generate_word_placements_growing: list(str) (int) (bool) (int) (float)
+#                                   (function) (int) (float)
+#                                   -> tuple(word_placements / None, int, int)
+# Recibe una lista de palabras y, opcionalmente, el tamaño inicial de la sopa
+# de letras (por defecto, el de calculate_soup_size). Intenta generar los
+# word_placements con generate_word_placements limitando la búsqueda a
+# max_nodes placements y timeout segundos; si no lo logra, agranda la sopa
+# con grow y vuelve a intentar, hasta max_attempts intentos (sin límite si es
+# None) o hasta el momento deadline (un valor de time.monotonic; sin límite
+# si es None): ningún intento sigue buscando después de deadline. Devuelve
+# una tupla con los word_placements (None si se agotaron los intentos o el
+# tiempo), el tamaño final de la sopa y la cantidad de intentos usados.
+def generate_word_placements_growing(wordlist, size=None,
+                                     forward_checking=False,
+                                     max_nodes=SEARCH_MAX_NODES,
+                                     timeout=SEARCH_TIMEOUT,
+                                     grow=None, max_attempts=None,
+                                     deadline=None):
+    size = size or calculate_soup_size(wordlist)
+    grow = grow or grow_soup_size
+
+    attempts = 0
+    while True:
+        attempt_timeout = timeout
+        if deadline is not None:
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                return None, size, attempts
+            attempt_timeout = (remaining if timeout is None
+                               else min(timeout, remaining))
+
+        attempts += 1
+        word_placements = generate_word_placements(wordlist, size,
+                                                   forward_checking,
+                                                   max_nodes, attempt_timeout)
+        if word_placements is not None:
+            return word_placements, size, attempts
+        if max_attempts is not None and attempts >= max_attempts:
+            return None, size, attempts
+        size = grow(size)
+
+
+# grow_soup_size: int -> int
+# Recibe el tamaño de una sopa de letras y devuelve el tamaño con el que se
+# vuelve a intentar generarla: una fila y una columna más.
+def grow_soup_size(size):
+    return size + 1
+
+
+# create_search_budget: (int) (float) -> search_budget
+# Recibe la cantidad máxima de placements a probar y la cantidad máxima de
+# segundos de una búsqueda (None si no hay límite), y devuelve su
+# search_budget.
+def create_search_budget(max_nodes=None, timeout=None):
+    return {
+        "nodes": 0,
+        "max_nodes": max_nodes,
+        "deadline": None if timeout is None else monotonic() + timeout
+    }
 
-            if is_placement_valid(word, placement, word_placements, size):
-                return placement
 
-    return False
+# spend_search_budget: search_budget -> bool
+# Recibe un search_budget y cuenta un placement más. Devuelve False si se
+# agotó el presupuesto, y True en caso contrario.
+def spend_search_budget(search_budget):
+    search_budget["nodes"] += 1
+    if (search_budget["max_nodes"] is not None and
+            search_budget["nodes"] > search_budget["max_nodes"]):
+        return False
+    if (search_budget["deadline"] is not None and
+            monotonic() > search_budget["deadline"]):
+        return False
+    return True
 
 
-# should_skip_placement:
-#   str placement word_placements list(word_placements) -> bool
-# Recibe una palabra, un placement, un diccionario word_placements y una lista
-# de word_placements ya probados. Devuelve True si deberíamos saltear el nuevo
-# placement (ya probamos el nuevo placement), y False en caso contrario (no
-# ha sido probado todavía).
-def should_skip_placement(word, placement, word_placements, failed):
-    new_word_placements = {
-        **word_placements,
-        word: placement
-    }
+# generate_word_placements_forward_checking:
+#   list(str) int (search_budget) -> word_placements / None
+# Recibe una lista de palabras y el tamaño de la sopa de letras, y hace lo
+# mismo que generate_word_placements pero con forward checking: guarda para
+# cada palabra sin ubicar el conjunto de placements que todavía son
+# compatibles con las palabras ya ubicadas (su dominio), ubica siempre la
+# palabra con el dominio más chico y vuelve atrás apenas algún dominio queda
+# vacío. Si se agota el search_budget, devuelve None.
+# Solo vale la pena con listas densas (palabras que casi llenan la sopa),
+# donde evita mucho backtracking. Con listas comunes los dominios son enormes
+# y nunca se vacían, así que solo se ponen al día cuando podrían haberse
+# vaciado (ver check_domains); aun así es varias veces más lento que
+# generate_word_placements.
+def generate_word_placements_forward_checking(wordlist, size,
+                                              search_budget=None):
+    search_budget = search_budget or create_search_budget()
+    wordlist = list(dict.fromkeys(wordlist))  # elimina duplicados
+    word_placements = {}
+    occupancy = {}
+
+    if not wordlist:
+        return word_placements
+
+    domains = {word: create_domain(word, size) for word in wordlist}
+    if not all(domain["size"] for domain in domains.values()):
+        return None
+
+    # Las celdas ocupadas con su letra, en el orden en que se ocuparon: al
+    # quitar la última palabra ubicada se liberan las últimas.
+    cells = []
+
+    # Cada elemento guarda la palabra, un iterador con los placements que
+    # todavía no probamos y los cambios que hicimos en los dominios al
+    # ubicarla.
+    word = select_most_constrained_word(domains, word_placements)
+    stack = [(word, iter_domain(word, domains[word], cells, size, occupancy),
+              [])]
+    while stack:
+        word, candidates, changes = stack[-1]
+        if word in word_placements:
+            # Volvimos a esta palabra, deshacemos su placement anterior
+            unplace_word(word, word_placements.pop(word), occupancy)
+            del cells[len(occupancy):]
+            undo_domain_changes(changes)
+
+        placement = next(candidates, None)
+        if placement is None:
+            stack.pop()
+            continue
+        if not spend_search_budget(search_budget):
+            return None
+
+        cells.extend((position, letter) for position, letter
+                     in get_letter_positions(word, placement).items()
+                     if position not in occupancy)
+        word_placements[word] = placement
+        place_word(word, placement, occupancy)
+        if len(word_placements) == len(wordlist):
+            return word_placements
+        if not check_domains(domains, word_placements, cells, occupancy,
+                             size, changes):
+            continue
+
+        next_word = select_most_constrained_word(domains, word_placements)
+        stack.append((next_word, iter_domain(next_word, domains[next_word],
+                                             cells, size, occupancy), []))
+
+    return None
+
+
+# create_domain: str int -> domain
+# Recibe una palabra y el tamaño de la sopa de letras, y devuelve su dominio
+# con todos los placements en los que la palabra entra en la sopa.
+def create_domain(word, size):
+    steps = []
+    domain_size = 0
+    for orientation, (drow, dcol, is_reversed) in ORIENTATION_STEPS.items():
+        rows, cols = get_placement_ranges(len(word), size, orientation)
+        letters = word[::-1] if is_reversed else word
+        steps.append((orientation, drow, dcol, rows, cols, letters))
+        domain_size += len(rows) * len(cols)
+
+    return {"size": domain_size, "removed": set(), "checked": 0,
+            "witness": None, "steps": steps}
+
+
+# iter_domain: str domain list(tuple(tuple(int, int), str)) int occupancy
+#              -> iter(placement)
+# Recibe una palabra, su dominio, las celdas ocupadas con su letra, el tamaño
+# de la sopa de letras y su occupancy, y devuelve un iterador que recorre en
+# orden aleatorio los placements del dominio. Si el dominio es grande (ver
+# is_domain_small) recorre los placements válidos como
+# generate_word_placements, sin armar la lista ni ponerlo al día.
+def iter_domain(word, domain, cells, size, occupancy):
+    if domain["checked"] < len(cells) or not is_domain_small(word, domain):
+        return iter_valid_placements(word, size, occupancy)
+
+    removed = domain["removed"]
+    placements = [(row, col, orientation)
+                  for orientation, _, _, rows, cols, _ in domain["steps"]
+                  for row in rows for col in cols
+                  if (row, col, orientation) not in removed]
+    return (Placement(*placements[index])
+            for index in random_indices(len(placements)))
+
+
+# get_domain_size: domain -> int
+# Recibe un dominio y devuelve cuántos placements tiene todavía.
+def get_domain_size(domain):
+    return domain["size"] - len(domain["removed"])
+
+
+# is_domain_small: str domain -> bool
+# Recibe una palabra y su dominio, y devuelve si DOMAIN_SMALL_CELLS celdas
+# ocupadas podrían vaciarlo: cada una quita a lo sumo 8 placements por letra
+# de la palabra.
+def is_domain_small(word, domain):
+    return get_domain_size(domain) <= 8 * len(word) * DOMAIN_SMALL_CELLS
+
+
+# select_most_constrained_word: dict<str>(domain) word_placements -> str
+# Recibe los dominios de las palabras y los word_placements, y devuelve la
+# palabra sin ubicar con menos placements posibles (según lo que se revisó
+# de cada dominio).
+def select_most_constrained_word(domains, word_placements):
+    return min((word for word in domains if word not in word_placements),
+               key=lambda word: get_domain_size(domains[word]))
+
+
+# check_domains: dict<str>(domain) word_placements list(tuple(tuple(int, int),
+#                str)) occupancy int list -> bool
+# Recibe los dominios de las palabras, los word_placements, las celdas
+# ocupadas con su letra (en el orden en que se ocuparon), su occupancy, el
+# tamaño de la sopa de letras y una lista donde anotar los cambios. Devuelve
+# False si el dominio de alguna palabra sin ubicar quedó vacío, y True en
+# caso contrario.
+# Los dominios chicos (ver is_domain_small) se ponen al día en cada paso
+# (ver update_domain). Para no recorrer los grandes en cada paso, una palabra
+# con un dominio grande se saltea si las celdas que todavía no revisó no
+# alcanzan para vaciarlo, o si tiene un placement válido a mano: el último
+# que encontró o uno de WITNESS_TRIES al azar. Solo si nada de eso alcanza se
+# pone al día su dominio.
+def check_domains(domains, word_placements, cells, occupancy, size,
+                  changes):
+    for word, domain in domains.items():
+        if word in word_placements:
+            continue
+
+        pending = len(cells) - domain["checked"]
+        if not is_domain_small(word, domain):
+            if get_domain_size(domain) > 8 * len(word) * pending:
+                continue
+            witness = domain["witness"]
+            if witness is not None and is_placement_valid(word, witness, None,
+                                                          size, occupancy):
+                continue
+            domain["witness"] = find_witness(word, size, occupancy)
+            if domain["witness"] is not None:
+                continue
 
-    return any(all(item in to_skip.items()
-                   for item in new_word_placements.items())
-               for to_skip in failed)
+        update_domain(domain, cells, changes)
+        if not get_domain_size(domain):
+            return False
+    return True
 
 
-# is_placement_valid: str placement word_placements int -> bool
+# find_witness: str int occupancy -> placement / None
+# Recibe una palabra, el tamaño de la sopa de letras y una occupancy, y
+# prueba WITNESS_TRIES placements al azar. Devuelve el primero válido, o None
+# si ninguno lo es.
+def find_witness(word, size, occupancy):
+    for placement in islice(random_placements(len(word), size),
+                            WITNESS_TRIES):
+        if is_placement_valid(word, placement, None, size, occupancy):
+            return placement
+    return None
+
+
+# update_domain: domain list(tuple(tuple(int, int), str)) list -> None
+# Recibe un dominio, las celdas ocupadas con su letra (en el orden en que se
+# ocuparon) y una lista donde anotar los cambios. Quita del dominio los
+# placements que pasan con otra letra por alguna de las celdas que todavía
+# no revisó.
+def update_domain(domain, cells, changes):
+    removed = domain["removed"]
+    new_removed = []
+    for (row, col), letter in cells[domain["checked"]:]:
+        for orientation, drow, dcol, rows, cols, letters in domain["steps"]:
+            for i, other_letter in enumerate(letters):
+                if other_letter == letter:
+                    continue
+
+                # Una tupla común vale lo mismo que el Placement como key
+                start_row, start_col = row - i*drow, col - i*dcol
+                placement = (start_row, start_col, orientation)
+                if (start_row in rows and start_col in cols and
+                        placement not in removed):
+                    removed.add(placement)
+                    new_removed.append(placement)
+
+    changes.append((domain, domain["checked"], new_removed))
+    domain["checked"] = len(cells)
+
+
+# undo_domain_changes: list -> None
+# Recibe los cambios que anotó update_domain y los deshace, del último al
+# primero, dejando cada dominio como estaba antes.
+def undo_domain_changes(changes):
+    while changes:
+        domain, checked, removed = changes.pop()
+        domain["removed"].difference_update(removed)
+        domain["checked"] = checked
+
+
+# get_orientation_step: Orientation -> tuple(int, int, bool)
+# Recibe una orientación y devuelve cuánto avanzan la fila y la columna de una
+# letra a la siguiente, y si la palabra se escribe al revés.
+def get_orientation_step(orientation):
+    return ORIENTATION_STEPS[orientation]
+
+
+# get_orientation: int int bool -> Orientation / None
+# Recibe cuánto avanzan la fila y la columna de una letra a la siguiente, y si
+# la palabra se escribe al revés, y devuelve la orientación correspondiente,
+# o None si no existe.
+def get_orientation(drow, dcol, is_reversed):
+    return ORIENTATIONS_BY_STEP.get((drow, dcol, is_reversed))
+
+
+# try_to_place: string word_placements int (occupancy) -> placement / bool
+# Recibe una palabra, un diccionario de word_placements, el tamaño de la sopa
+# de letras y, opcionalmente, la occupancy de los word_placements. Devuelve un
+# placement para la palabra si existe uno posible, y False en caso contrario.
+def try_to_place(word, word_placements, size, occupancy=None):
+    if occupancy is None:
+        occupancy = create_occupancy(word_placements)
+
+    return next(iter_valid_placements(word, size, occupancy), False)
+
+
+# iter_valid_placements: str int occupancy -> iter(placement)
+# Recibe una palabra, el tamaño de la sopa de letras y una occupancy, y
+# devuelve un iterador que recorre en orden aleatorio los placements válidos
+# para la palabra. Cada placement se valida contra la occupancy en el momento
+# en que se pide, por lo que la occupancy puede cambiar entre un placement y
+# el siguiente.
+def iter_valid_placements(word, size, occupancy):
+    for placement in random_placements(len(word), size):
+        if is_placement_valid(word, placement, None, size, occupancy):
+            yield placement
+
+
+# random_placements: int int -> iter(placement)
+# Recibe el largo de una palabra y el tamaño de la sopa de letras, y devuelve
+# un iterador que recorre en orden aleatorio todos los placements en los que
+# la palabra entra en la sopa, sin repetirlos.
+# Numeramos los placements de cada orientación uno detrás del otro y los
+# mezclamos con un Fisher-Yates perezoso: solo guardamos los índices que
+# fueron intercambiados, así la memoria usada depende de cuántos placements
+# pedimos y no del tamaño de la sopa.
+def random_placements(word_length, size):
+    spaces = []
+    total = 0
+    for orientation in Orientation:
+        rows, cols = get_placement_ranges(word_length, size, orientation)
+        spaces.append((total, orientation, rows, cols))
+        total += len(rows) * len(cols)
+
+    for index in random_indices(total):
+        for start, orientation, rows, cols in reversed(spaces):
+            if index >= start:
+                row, col = divmod(index - start, len(cols))
+                yield Placement(rows[row], cols[col], orientation)
+                break
+
+
+# random_indices: int -> iter(int)
+# Recibe un número n y devuelve un iterador que recorre los números de 0 a n-1
+# en orden aleatorio, usando un Fisher-Yates perezoso.
+def random_indices(n):
+    swapped = {}
+    for i in range(n):
+        j = randrange(i, n)
+        index = swapped.get(j, j)
+        swapped[j] = swapped.pop(i, i)
+        yield index
+
+
+# get_placement_ranges: int int Orientation -> tuple(range, range)
+# Recibe el largo de una palabra, el tamaño de la sopa de letras y una
+# orientación. Devuelve las filas y las columnas en las que puede comenzar la
+# palabra sin salirse de la sopa.
+def get_placement_ranges(word_length, size, orientation):
+    drow, dcol, _ = ORIENTATION_STEPS[orientation]
+    extra = max(word_length - 1, 0)
+    return (get_start_range(size, drow * extra),
+            get_start_range(size, dcol * extra))
+
+
+# get_start_range: int int -> range
+# Recibe el tamaño de la sopa de letras y cuánto se mueve una palabra en una
+# coordenada entre su primera y su última letra, y devuelve los valores de
+# esa coordenada en los que puede comenzar.
+def get_start_range(size, distance):
+    if distance >= 0:
+        return range(0, max(size - distance, 0))
+    return range(-distance, size)
+
+
+# is_placement_valid: str placement word_placements int (occupancy) -> bool
 # Recibe una palabra, un posible placement para la misma, un diccionario de
-# word_placements con las palabras ya ubicadas, y el tamaño de la sopa de
-# letras.
+# word_placements con las palabras ya ubicadas, el tamaño de la sopa de
+# letras y, opcionalmente, la occupancy de esos word_placements. Si no la
+# recibe, la construye a partir de los word_placements.
 # Devuelve True si el placement es válido, False en caso contrario.
-def is_placement_valid(word, placement, word_placements, size):
-    row = placement["row"]
-    col = placement["col"]
-    orientation = placement["orientation"]
-
-    if (orientation in [Orientation.HORIZONTAL,
-                        Orientation.HORIZONTAL_REVERSED,
-                        Orientation.DIAGONAL]):
-        if col + len(word) > size:
+def is_placement_valid(word, placement, word_placements, size,
+                       occupancy=None):
+    row, col, orientation = placement
+    drow, dcol, _ = ORIENTATION_STEPS[orientation]
+    extra = max(len(word) - 1, 0)
+
+    # La primera y la última letra tienen que estar dentro de la sopa
+    if not (0 <= row < size and 0 <= row + drow*extra < size and
+            0 <= col < size and 0 <= col + dcol*extra < size):
+        return False
+
+    if occupancy is None:
+        occupancy = create_occupancy(word_placements)
+
+    # Solo miramos las celdas que ocuparía la palabra, sin importar cuántas
+    # palabras haya ubicadas.
+    for position, letter in get_letter_positions(word, placement).items():
+        cell = occupancy.get(position)
+        if cell is not None and cell[0] != letter:
             return False
+    return True
 
-    if (orientation in [Orientation.VERTICAL,
-                        Orientation.VERTICAL_REVERSED,
-                        Orientation.DIAGONAL]):
-        if row + len(word) > size:
-            return False
 
-    letter_positions = get_letter_positions(word, placement)
-    for _word, _placement in word_placements.items():
-        other_positions = get_letter_positions(_word, _placement)
+# create_occupancy: word_placements -> occupancy
+# Recibe un diccionario de word_placements y devuelve la occupancy de las
+# celdas que ocupan sus palabras.
+def create_occupancy(word_placements):
+    occupancy = {}
+    for word, placement in word_placements.items():
+        place_word(word, placement, occupancy)
+    return occupancy
+
+
+# place_word: str placement occupancy -> None
+# Recibe una palabra, su placement y una occupancy, y registra en la occupancy
+# las celdas que ocupa la palabra.
+def place_word(word, placement, occupancy):
+    for position, letter in get_letter_positions(word, placement).items():
+        cell = occupancy.get(position)
+        if cell is None:
+            occupancy[position] = [letter, 1]
+        else:
+            cell[1] += 1
 
-        for position, letter in letter_positions.items():
-            if (position in other_positions and
-                    other_positions[position] != letter):
-                return False
-    return True
+
+# unplace_word: str placement occupancy -> None
+# Recibe una palabra, su placement y una occupancy, y quita de la occupancy
+# las celdas que ocupa la palabra. Las celdas que comparte con otras palabras
+# siguen ocupadas.
+def unplace_word(word, placement, occupancy):
+    for position in get_letter_positions(word, placement):
+        cell = occupancy[position]
+        cell[1] -= 1
+        if cell[1] == 0:
+            del occupancy[position]
 
 
 # get_letter_positions: str placement -> letter_positions
@@ -260,234 +1301,1018 @@ def is_placement_valid(word, placement, word_placements, size):
 # las keys son las ubicaciones de cada letra de la palabra, y los values son
 # cada letra.
 def get_letter_positions(word, placement):
-        row = placement["row"]
-        col = placement["col"]
-        orientation = placement["orientation"]
+    row, col, orientation = placement
+    drow, dcol, is_reversed = ORIENTATION_STEPS[orientation]
+
+    if is_reversed:
+        word = word[::-1]
+
+    return {(row + i*drow, col + i*dcol): letter
+            for i, letter in enumerate(word)}
+
+
+# remove_fixed_duplicates: word_placements dict<str>(tuple(str, int, bool))
+#                          int (int) (automaton) (float) -> bool
+# Recibe los word_placements de las palabras que no están dentro de otras,
+# las palabras contenidas (como las devuelve get_contained_words) y el tamaño
+# de la sopa de letras, y opcionalmente una cantidad máxima de rondas y el
+# autómata de todas las palabras (ver build_automaton). Busca las apariciones
+# de alguna palabra formadas solo por letras de las palabras ubicadas que no
+# son su placement, y para cada una vacía una de sus celdas moviendo a un
+# lugar al azar todas las palabras que pasan por ella. Modifica los
+# word_placements y devuelve True si no queda ninguna de esas apariciones, o
+# False si alguna palabra no entra en la sopa o se agotaron las rondas.
+# Como make_word_occurrences_unique, solo la primera ronda recorre toda la
+# sopa: las siguientes miran los tramos de línea alrededor de las celdas de
+# las palabras que se movieron. Si recibe deadline (ver check_deadline) y se
+# pasa de ese momento lanza TimeoutError.
+def remove_fixed_duplicates(word_placements, contained_words, size,
+                            max_rounds=100, automaton=None, deadline=None):
+    if automaton is None:
+        automaton = build_automaton([*word_placements, *contained_words])
+    max_length = max(map(len, [*word_placements, *contained_words]),
+                     default=0)
+
+    # Un Grid con solo las letras de las palabras ubicadas (las demás celdas
+    # quedan en 0, que no es ninguna letra) y qué palabras pasan por cada
+    # celda
+    grid = Grid(size)
+    occupancy = create_occupancy(word_placements)
+    cell_words = {}
+    for word, placement in word_placements.items():
+        for position in placement.positions(len(word)):
+            cell_words.setdefault(position, set()).add(word)
+    for position, (letter, _) in occupancy.items():
+        grid[position] = letter
+
+    lines = list(iter_grid_lines(grid))
+    for _ in range(max_rounds):
+        placements = {**word_placements,
+                      **get_contained_placements(contained_words,
+                                                 word_placements)}
+        words_to_move = set()
+        for line, row, col, drow, dcol in lines:
+            check_deadline(deadline)
+            for word, placement in iter_line_matches(automaton, line, row,
+                                                     col, drow, dcol):
+                positions = placement.positions(len(word))
+                if (set(positions) ==
+                        set(placements[word].positions(len(word))) or
+                        any(cell_words[position] <= words_to_move
+                            for position in positions)):
+                    continue
+                words_to_move |= cell_words[choice(positions)]
+
+        if not words_to_move:
+            return True
+
+        # En orden, para que con la misma semilla se obtenga la misma sopa
+        words_to_move = sorted(words_to_move)
+        for word in words_to_move:
+            placement = word_placements.pop(word)
+            unplace_word(word, placement, occupancy)
+            for position in placement.positions(len(word)):
+                cell_words[position].discard(word)
+                if position not in occupancy:
+                    grid[position] = "\0"
+
+        moved_positions = set()
+        for word in words_to_move:
+            placement = next(iter_valid_placements(word, size, occupancy),
+                             None)
+            if placement is None:
+                return False
+            word_placements[word] = placement
+            place_word(word, placement, occupancy)
+            for position, letter in get_letter_positions(word,
+                                                         placement).items():
+                grid[position] = letter
+                cell_words.setdefault(position, set()).add(word)
+                moved_positions.add(position)
 
-        if (orientation in [Orientation.HORIZONTAL_REVERSED,
-                            Orientation.VERTICAL_REVERSED]):
-            word = reversed(word)
+        lines = [get_line_window(grid, row, col, drow, dcol, max_length)
+                 for row, col in moved_positions
+                 for drow, dcol in get_line_directions()]
 
-        letter_positions = {}
-        for i, letter in enumerate(word):
-            if (orientation in [Orientation.HORIZONTAL,
-                                Orientation.HORIZONTAL_REVERSED]):
-                letter_positions[(row, col+i)] = letter
+    return False
 
-            elif (orientation in [Orientation.VERTICAL,
-                                  Orientation.VERTICAL_REVERSED]):
-                letter_positions[(row+i, col)] = letter
 
-            elif orientation == Orientation.DIAGONAL:
-                letter_positions[(row+i, col+i)] = letter
+# create_soup_matrix: int word_placements (dict<str>(float)) (bool)
+#                     (automaton) (float) -> sopa_de_letras
+# Recibe el tamaño de la sopa de letras, un diccionario de word_placements y,
+# opcionalmente, la frecuencia relativa de cada letra para el relleno, y
+# devuelve una sopa de letras usando el diccionario de word_placements.
+# Genera todas las letras de relleno de una vez y después escribe encima las
+# letras de las palabras. Si unique es True, cambia las letras de relleno
+# necesarias para que cada palabra aparezca una sola vez (ver
+# make_word_occurrences_unique, que recibe el autómata y el deadline si se
+# pasan), y si no lo logra lanza SoupGenerationError.
+def create_soup_matrix(size, word_placements, letter_weights=None,
+                       unique=True, automaton=None, deadline=None):
+    letters = random_letters(size * size, letter_weights)
+    soup_matrix = Grid(size, encode_letters("".join(letters)))
 
-            else:
-                raise NotImplementedError
+    for word, placement in word_placements.items():
+        for position, letter in get_letter_positions(word, placement).items():
+            soup_matrix[position] = letter
+
+    if unique and not make_word_occurrences_unique(soup_matrix,
+                                                   word_placements,
+                                                   letter_weights,
+                                                   automaton=automaton,
+                                                   deadline=deadline):
+        raise SoupGenerationError("Alguna palabra aparece más de una vez")
+    return soup_matrix
 
-        return letter_positions
 
+# make_word_occurrences_unique: Grid word_placements (dict<str>(float)) (int)
+#                               (automaton) (float) -> bool
+# Recibe un Grid con las palabras de los word_placements ya escritas, y
+# opcionalmente la frecuencia relativa de cada letra para el relleno, una
+# cantidad máxima de rondas y el autómata de las palabras (ver
+# build_automaton). Cambia al azar letras de relleno hasta que cada
+# palabra aparezca solo en su placement. Devuelve True si lo logra, y False
+# si se agotaron las rondas o si alguna palabra aparece otra vez usando solo
+# letras de otras palabras, ya que eso no se arregla cambiando el relleno.
+# No cuenta como otra aparición leer la misma palabra al revés en las mismas
+# celdas (palíndromos).
+# Solo la primera ronda recorre toda la sopa: las siguientes vuelven a mirar
+# únicamente los tramos de línea alrededor de las celdas que se cambiaron
+# (hasta el largo de la palabra más larga hacia cada lado), ya que cualquier
+# aparición que quede tiene que usar alguna de ellas.
+# Si recibe deadline (ver check_deadline) y se pasa de ese momento lanza
+# TimeoutError.
+def make_word_occurrences_unique(grid, word_placements, letter_weights=None,
+                                 max_rounds=100, automaton=None,
+                                 deadline=None):
+    if automaton is None:
+        automaton = build_automaton(list(word_placements))
+    word_positions = {word: set(placement.positions(len(word)))
+                      for word, placement in word_placements.items()}
+    fixed_positions = set().union(*word_positions.values())
+    max_length = max(map(len, word_placements), default=0)
+
+    lines = [(line, row, col, drow, dcol)
+             for line, row, col, drow, dcol in iter_grid_lines(grid)]
+    for _ in range(max_rounds):
+        positions_to_change = set()
+        for line, row, col, drow, dcol in lines:
+            check_deadline(deadline)
+            for word, placement in iter_line_matches(automaton, line, row,
+                                                     col, drow, dcol):
+                positions = set(placement.positions(len(word)))
+                if positions == word_positions[word]:
+                    continue
+                filler_positions = positions - fixed_positions
+                if not filler_positions:
+                    return False
+                if not filler_positions & positions_to_change:
+                    positions_to_change.add(choice(sorted(filler_positions)))
+
+        if not positions_to_change:
+            return True
+
+        letters = random_letters(len(positions_to_change), letter_weights)
+        for (row, col), letter in zip(positions_to_change, letters):
+            grid[row, col] = letter
+        lines = [get_line_window(grid, row, col, drow, dcol, max_length)
+                 for row, col in positions_to_change
+                 for drow, dcol in get_line_directions()]
 
-# create_soup_matrix: int word_placements -> sopa_de_letras
-# Recibe el tamaño de la sopa de letras y un diccionario de word_placements,
-# y devuelve una sopa de letras usando el diccionario de word_placements.
-def create_soup_matrix(size, word_placements):
-    soup_matrix = [[random_letter() for j in range(size)] for i in range(size)]
+    return False
 
-    for word, placement in word_placements.items():
-        row = placement["row"]
-        col = placement["col"]
-        orientation = placement["orientation"]
-
-        if (orientation in [Orientation.HORIZONTAL_REVERSED,
-                            Orientation.VERTICAL_REVERSED]):
-            word = reversed(word)
-
-        for i, letter in enumerate(word):
-            if (orientation in [Orientation.HORIZONTAL,
-                                Orientation.HORIZONTAL_REVERSED]):
-                soup_matrix[row][col+i] = letter
-            elif (orientation in [Orientation.VERTICAL,
-                                  Orientation.VERTICAL_REVERSED]):
-                soup_matrix[row+i][col] = letter
-            elif orientation == Orientation.DIAGONAL:
-                soup_matrix[row+i][col+i] = letter
-            else:
-                raise NotImplementedError
 
-    return soup_matrix
+# get_line_window: Grid int int int int int
+#                  -> tuple(memoryview, int, int, int, int)
+# Recibe un Grid, una celda, una dirección y un largo, y devuelve el tramo de
+# la línea en esa dirección que pasa por la celda con todas las palabras de
+# hasta ese largo que la pueden usar: hasta length - 1 celdas antes y después
+# de ella. Lo devuelve como iter_grid_lines.
+def get_line_window(grid, row, col, drow, dcol, length):
+    start_row, start_col = get_line_start(grid.size, row, col, drow, dcol)
+    steps = min(length - 1, max(abs(row - start_row), abs(col - start_col)))
+    row, col = row - steps*drow, col - steps*dcol
+    return (grid.line(row, col, drow, dcol)[:steps + length], row, col, drow,
+            dcol)
 
 
 # random_letter -> str
 # Devuelve una letra mayúscula al azar del abecedario español.
 def random_letter():
-    return choice(list("ABCDEFGHIJKLMNÑOPQRSTUVWXYZ"))
+    return choice(ALPHABET)
+
 
+# random_letters: int (dict<str>(float)) -> list(str)
+# Recibe una cantidad k y, opcionalmente, la frecuencia relativa de cada letra
+# (las letras que no aparecen no se usan). Devuelve una lista de k letras
+# mayúsculas al azar del abecedario español, elegidas en una sola llamada.
+def random_letters(k, letter_weights=None):
+    if letter_weights is None:
+        return choices(ALPHABET, k=k)
 
-# display_soup: sopa_de_letras (word_placements) -> None
+    weights = [letter_weights.get(letter, 0) for letter in ALPHABET]
+    return choices(ALPHABET, weights=weights, k=k)
+
+
+# display_soup: sopa_de_letras (word_placements) (file) -> None
 # Recibe una sopa de letras y un diccionario de word_placements opcional,
 # y la muestra. Si recibe el diccionario de word_placements, colorea las
 # palabras para que sea más fácil visualizar la sopa.
-def display_soup(soup_matrix, word_placements=None):
+# Escribe la sopa entera de una sola vez en file (por defecto, la terminal),
+# que puede ser cualquier archivo abierto para escribir texto.
+def display_soup(soup_matrix, word_placements=None, file=None):
+    (file or sys.stdout).write(render_soup(soup_matrix, word_placements))
+
+
+# render_soup: sopa_de_letras (word_placements) -> str
+# Recibe una sopa de letras y un diccionario de word_placements opcional, y
+# devuelve el texto que muestra display_soup, con las letras de cada palabra
+# en verde. No modifica la sopa.
+def render_soup(soup_matrix, word_placements=None):
+    rows = soup_matrix.rows() if isinstance(soup_matrix, Grid) else soup_matrix
     if word_placements:
-        soup_matrix = color_soup(soup_matrix, word_placements)
-    print("")
-    print("\n".join([" ".join(row) for row in soup_matrix]))
-    print("")
+        rows = color_soup(soup_matrix, word_placements)
+    return "\n" + "\n".join([" ".join(row) for row in rows]) + "\n\n"
 
 
-# color_soup: sopa_de_letra word_placementes -> sopa_de_letras
+# color_soup: sopa_de_letra word_placementes -> list(list(str))
 # Recibe una sopa_de_letras y un diccionario de word_placements, devuelve
-# una sopa_de_letras en la que las letras de cada palabra son verdes.
+# una sopa_de_letras nueva en el formato list(list(str)) en la que las letras
+# de cada palabra son verdes. No modifica la sopa que recibe.
+# Colorea cada celda una sola vez aunque la usen varias palabras, y cada
+# letra distinta se colorea una sola vez y se reusa.
 def color_soup(soup_matrix, word_placements):
-    for word, placement in word_placements.items():
-        row = placement["row"]
-        col = placement["col"]
-        orientation = placement["orientation"]
-
-        if orientation == Orientation.HORIZONTAL:
-            for i in range(len(word)):
-                soup_matrix[row][col+i] = colored(word[i], color="green")
+    if isinstance(soup_matrix, Grid):
+        soup_matrix = soup_matrix.rows()
+    colored_soup = [list(row) for row in soup_matrix]
 
-        if orientation == Orientation.HORIZONTAL_REVERSED:
-            word = word[::-1]
-            for i in range(len(word)):
-                soup_matrix[row][col+i] = colored(word[i], color="green")
+    colored_letters = {}
+    for row, col in get_highlighted_cells(word_placements):
+        letter = colored_soup[row][col]
+        if letter not in colored_letters:
+            colored_letters[letter] = colored(letter, color="green")
+        colored_soup[row][col] = colored_letters[letter]
 
-        if orientation == Orientation.VERTICAL:
-            for i in range(len(word)):
-                soup_matrix[row+i][col] = colored(word[i], color="green")
+    return colored_soup
 
-        if orientation == Orientation.VERTICAL_REVERSED:
-            word = word[::-1]
-            for i in range(len(word)):
-                soup_matrix[row+i][col] = colored(word[i], color="green")
 
-        if orientation == Orientation.DIAGONAL:
-            for i in range(len(word)):
-                soup_matrix[row+i][col+i] = colored(word[i], color="green")
-
-    return soup_matrix
+# get_highlighted_cells: word_placements -> set(tuple(int, int))
+# Recibe un diccionario de word_placements y devuelve el conjunto de celdas
+# que ocupan las palabras.
+def get_highlighted_cells(word_placements):
+    cells = set()
+    for word, placement in word_placements.items():
+        cells.update(get_letter_positions(word, placement))
+    return cells
 
 
-# solve_soup: sopa_de_letras list(str) -> word_placements
+# solve_soup: sopa_de_letras list(str) (solve_cache) (file) -> word_placements
 # Recibe una sopa_de_letras y una lista de palabras. La resuelve, la muestra
 # y devuelve un diccionario de word_placements con los placements de las
 # palabras de la wordlist. Si alguna de las palabras no fue encontrada, avisa
-# al usuario.
-def solve_soup(soup, wordlist):
-    word_placements = {word: find_word_placement(word, soup)
-                       for word in wordlist}
+# al usuario. Si recibe una solve_cache, no vuelve a resolver las sopas que
+# ya están en ella. Como display_soup, escribe todo de una sola vez en file
+# (por defecto, la terminal).
+def solve_soup(soup, wordlist, cache=None, file=None):
+    soup = as_grid(soup)
+    found_placements = find_solution(soup, wordlist, cache)
 
-    for word, placement in word_placements.items():
+    word_placements = {}
+    messages = []
+    for word in wordlist:
+        placement = found_placements.get(word)
         if placement is None:
-            del word_placements[word]
-            print(colored(f"No se encontró la palabra: {word}"))
+            messages.append(colored(f"No se encontró la palabra: {word}")
+                            + "\n")
+        else:
+            word_placements[word] = placement
+
+    messages.append(render_soup(soup, word_placements))
+    (file or sys.stdout).write("".join(messages))
+    return word_placements
+
+
+# find_solution: sopa_de_letras list(str) (solve_cache)
+#                -> dict<str>(placement / None)
+# Recibe una sopa_de_letras y una lista de palabras, y devuelve un diccionario
+# con un placement de cada palabra en la sopa, o None si no aparece. Usa el
+# backend de NumPy si conviene (ver use_numpy_backend) y si no, el autómata de
+# find_word_placements.
+# Si recibe una solve_cache, primero busca la solución ahí, y si no está, la
+# calcula y la guarda.
+def find_solution(soup, wordlist, cache=None):
+    soup = as_grid(soup)
+    if cache is not None:
+        return find_solution_cached(soup, wordlist, cache)
+    if use_numpy_backend(soup.size, len(wordlist)):
+        return find_word_placements_numpy(soup, wordlist)
+    return find_word_placements(soup, wordlist)
+
+
+# Representamos una cache de soluciones de sopas de letras como:
+# solve_cache: dict<str>(OrderedDict / Shelf / int / None)
+# Por ejemplo:
+# solve_cache = {
+#   "entries": OrderedDict, ---> soluciones en memoria por key, de la menos a
+#                                la más recientemente usada
+#   "max_entries": int, -------> cantidad máxima de soluciones en memoria
+#   "store": Shelf / None, ----> soluciones guardadas en disco, si hay
+#   "hits": int, --------------> soluciones encontradas en memoria
+#   "disk_hits": int, ---------> soluciones encontradas en disco
+#   "misses": int -------------> soluciones que hubo que calcular
+# }
+# Cada solución es un dict<str>(placement / None) con todas las palabras de
+# la lista de palabras normalizada (ver get_solve_key).
+
+
+# create_solve_cache: (int) (str) -> solve_cache
+# Devuelve una solve_cache vacía que guarda en memoria hasta max_entries
+# soluciones, descartando las usadas hace más tiempo. Si recibe un path,
+# además guarda todas las soluciones en disco en ese archivo (con shelve),
+# así se conservan entre ejecuciones; en ese caso hay que cerrarla con
+# close_solve_cache.
+def create_solve_cache(max_entries=1024, path=None):
+    return {
+        "entries": OrderedDict(),
+        "max_entries": max_entries,
+        "store": shelve.open(path) if path is not None else None,
+        "hits": 0,
+        "disk_hits": 0,
+        "misses": 0
+    }
+
+
+# close_solve_cache: solve_cache -> None
+# Recibe una solve_cache y cierra su archivo en disco, si tiene.
+def close_solve_cache(cache):
+    if cache["store"] is not None:
+        cache["store"].close()
+        cache["store"] = None
+
+
+# get_solve_key: sopa_de_letras list(str) -> str
+# Recibe una sopa_de_letras y una lista de palabras, y devuelve un hash de
+# las letras de la sopa y de las palabras sin repetir y ordenadas, así la
+# misma sopa con las mismas palabras en otro orden tiene la misma key.
+def get_solve_key(soup, wordlist):
+    grid = as_grid(soup)
+    key = sha256(grid.size.to_bytes(4, "little"))
+    key.update(grid.data)
+    for word in sorted(set(wordlist)):
+        key.update(b"\0" + word.encode("utf-8"))
+    return key.hexdigest()
+
+
+# find_solution_cached: Grid list(str) solve_cache
+#                       -> dict<str>(placement / None)
+# Igual que find_solution, pero busca primero la solución en la cache: en
+# memoria y después en disco. Si no está, la calcula y la guarda en ambas.
+def find_solution_cached(grid, wordlist, cache):
+    key = get_solve_key(grid, wordlist)
+    entries = cache["entries"]
+    store = cache["store"]
+
+    if key in entries:
+        cache["hits"] += 1
+        entries.move_to_end(key)
+        solution = entries[key]
+    else:
+        if store is not None and key in store:
+            cache["disk_hits"] += 1
+            solution = store[key]
+        else:
+            cache["misses"] += 1
+            solution = find_solution(grid, sorted(set(wordlist)))
+            if store is not None:
+                store[key] = solution
+
+        entries[key] = solution
+        if len(entries) > cache["max_entries"]:
+            entries.popitem(last=False)
+
+    return {word: solution[word] for word in wordlist}
+
+
+# use_numpy_backend: int int -> bool
+# Recibe el tamaño de una sopa de letras y la cantidad de palabras a buscar,
+# y devuelve si conviene buscarlas con el backend de NumPy.
+def use_numpy_backend(size, word_count):
+    return (np is not None and size >= NUMPY_MIN_SIZE and
+            word_count <= NUMPY_MAX_WORDS)
+
+
+# Representamos un autómata de Aho-Corasick como:
+# automaton: dict<str>(list)
+# Por ejemplo:
+# automaton = {
+#   "goto": list(dict<int>(int)), ---> transiciones de cada estado según el
+#                                      código de la letra leída
+#   "fail": list(int), --------------> estado al que se vuelve si no hay
+#                                      transición
+#   "output": list(list(tuple(str, bool))) --> palabras que terminan en cada
+#                                              estado, y si están al revés
+# }
+# El estado 0 es el estado inicial.
+
+
+# build_automaton: list(str) -> automaton
+# Recibe una lista de palabras y devuelve un autómata de Aho-Corasick que
+# reconoce cada palabra y también cada palabra al revés. Las palabras que no
+# se pueden guardar en un Grid se ignoran.
+def build_automaton(wordlist):
+    automaton = {
+        "goto": [{}],
+        "fail": [0],
+        "output": [[]]
+    }
+
+    for word in dict.fromkeys(wordlist):
+        try:
+            code = encode_letters(word)
+        except ValueError:
+            continue
+        if not code:
+            continue
+
+        for pattern, is_reversed in [(code, False), (code[::-1], True)]:
+            state = 0
+            for letter in pattern:
+                if letter not in automaton["goto"][state]:
+                    automaton["goto"].append({})
+                    automaton["fail"].append(0)
+                    automaton["output"].append([])
+                    automaton["goto"][state][letter] = \
+                        len(automaton["goto"]) - 1
+                state = automaton["goto"][state][letter]
+            automaton["output"][state].append((word, is_reversed))
+
+    # Calculamos los estados de falla recorriendo el autómata a lo ancho
+    queue = deque(automaton["goto"][0].values())
+    while queue:
+        state = queue.popleft()
+        for letter, next_state in automaton["goto"][state].items():
+            queue.append(next_state)
+
+            fail = automaton["fail"][state]
+            while fail and letter not in automaton["goto"][fail]:
+                fail = automaton["fail"][fail]
+            fail = automaton["goto"][fail].get(letter, 0)
+
+            automaton["fail"][next_state] = fail
+            automaton["output"][next_state] += automaton["output"][fail]
+
+    return automaton
+
+
+# iter_grid_lines: Grid -> iter(tuple(memoryview, int, int, int, int))
+# Recibe un Grid y devuelve un iterador con todas sus líneas en cada una de
+# las direcciones de get_line_directions. Cada línea es una tupla con sus
+# códigos de letras, la fila y la columna donde comienza, y cuánto avanzan la
+# fila y la columna de una letra a la siguiente.
+def iter_grid_lines(grid):
+    for drow, dcol in get_line_directions():
+        for row, col in get_line_starts(grid.size, drow, dcol):
+            yield grid.line(row, col, drow, dcol), row, col, drow, dcol
+
+
+# get_line_directions: -> list(tuple(int, int))
+# Devuelve cuánto avanzan la fila y la columna de una letra a la siguiente en
+# cada dirección en la que se puede escribir una palabra, sin repetir las que
+# solo difieren en si la palabra está al revés.
+def get_line_directions():
+    return list(dict.fromkeys(step[:2] for step in ORIENTATION_STEPS.values()))
+
+
+# get_line_starts: int int int -> list(tuple(int, int))
+# Recibe el tamaño de la sopa de letras y una dirección, y devuelve las
+# celdas donde comienzan las líneas en esa dirección: las celdas cuya celda
+# anterior en esa dirección está fuera de la sopa.
+def get_line_starts(size, drow, dcol):
+    # Si la fila anterior está dentro de la sopa, solo puede estar fuera la
+    # columna anterior: la primera o la última columna, según dcol
+    edge_cols = [col for col in [0, size - 1] if not 0 <= col - dcol < size]
+    return [(row, col) for row in range(size)
+            for col in (range(size) if not 0 <= row - drow < size
+                        else dict.fromkeys(edge_cols))]
+
+
+# get_line_start: int int int int int -> tuple(int, int)
+# Recibe el tamaño de la sopa de letras, una celda y una dirección, y devuelve
+# la celda donde comienza la línea en esa dirección que pasa por la celda.
+def get_line_start(size, row, col, drow, dcol):
+    steps = size
+    for position, step in [(row, drow), (col, dcol)]:
+        if step > 0:
+            steps = min(steps, position)
+        elif step < 0:
+            steps = min(steps, size - 1 - position)
+    return row - steps*drow, col - steps*dcol
+
+
+# Representamos las líneas de una sopa de letras en una dirección como:
+# soup_lines: tuple(str, list(int), list(tuple(int, int)))
+# Por ejemplo:
+# soup_lines = (
+#   text, ----> todas las líneas en esa dirección, separadas por "\n"
+#   offsets, -> posición en text donde comienza cada línea
+#   starts ---> celda donde comienza cada línea
+# )
+
+
+# get_soup_lines: sopa_de_letras int int -> soup_lines
+# Recibe una sopa_de_letras y una dirección, y devuelve sus soup_lines en esa
+# dirección. Si la sopa es un Grid, las calcula la primera vez que se piden
+# y las guarda en su cache.
+def get_soup_lines(soup, drow, dcol):
+    grid = as_grid(soup)
+    key = ("lines", drow, dcol)
+    if key not in grid.cache:
+        lines = []
+        offsets = []
+        starts = []
+        offset = 0
+        for row, col in get_line_starts(grid.size, drow, dcol):
+            line = decode_letters(grid.line(row, col, drow, dcol))
+            lines.append(line)
+            offsets.append(offset)
+            starts.append((row, col))
+            offset += len(line) + 1
+
+        grid.cache[key] = ("\n".join(lines), offsets, starts)
+    return grid.cache[key]
+
+
+# get_line_placement: soup_lines int int int Orientation -> placement
+# Recibe las soup_lines de una dirección, una posición en su texto, la
+# dirección y una orientación, y devuelve el placement de una palabra con esa
+# orientación que comienza en esa posición del texto.
+def get_line_placement(soup_lines, index, drow, dcol, orientation):
+    _, offsets, starts = soup_lines
+    line = bisect_right(offsets, index) - 1
+    row, col = starts[line]
+    position = index - offsets[line]
+    return Placement(row + position*drow, col + position*dcol, orientation)
+
+
+# find_all_word_placements: sopa_de_letras list(str)
+#                           -> dict<str>(list(placement))
+# Recibe una sopa_de_letras y una lista de palabras, y devuelve un diccionario
+# con todos los placements de cada palabra en la sopa (una lista vacía si no
+# aparece).
+# Construye un solo autómata de Aho-Corasick con las palabras y las palabras
+# al revés, y pasa cada fila, columna y diagonal una sola vez por él: una
+# palabra al revés encontrada leyendo la línea hacia adelante es la palabra
+# leída hacia atrás, por lo que no hace falta recorrer las líneas al revés.
+def find_all_word_placements(soup, wordlist):
+    grid = as_grid(soup)
+    automaton = build_automaton(wordlist)
+
+    word_placements = {word: [] for word in wordlist}
+    for line in iter_grid_lines(grid):
+        for word, placement in iter_line_matches(automaton, *line):
+            word_placements[word].append(placement)
 
-    soup = color_soup(soup, word_placements)
-    display_soup(soup, word_placements)
     return word_placements
 
 
+# iter_line_matches: automaton memoryview int int int int
+#                    -> iter(tuple(str, placement))
+# Recibe un autómata, los códigos de las letras de una línea, la celda donde
+# comienza y cuánto avanzan la fila y la columna de una letra a la siguiente.
+# Devuelve un iterador con cada palabra del autómata que aparece en la línea
+# junto con su placement.
+def iter_line_matches(automaton, line, row, col, drow, dcol):
+    goto = automaton["goto"]
+    fail = automaton["fail"]
+    output = automaton["output"]
+    orientations = {is_reversed: get_orientation(drow, dcol, is_reversed)
+                    for is_reversed in [False, True]}
+
+    state = 0
+    for i, letter in enumerate(line):
+        while state and letter not in goto[state]:
+            state = fail[state]
+        state = goto[state].get(letter, 0)
+
+        for word, is_reversed in output[state]:
+            orientation = orientations[is_reversed]
+            if orientation is None:
+                continue
+
+            start = i - len(word) + 1
+            yield word, Placement(row + start*drow, col + start*dcol,
+                                  orientation)
+
+
+# find_word_placements: sopa_de_letras list(str) -> dict<str>(placement / None)
+# Recibe una sopa_de_letras y una lista de palabras, y devuelve un diccionario
+# con un placement de cada palabra en la sopa, o None si no aparece.
+def find_word_placements(soup, wordlist):
+    return {word: placements[0] if placements else None
+            for word, placements
+            in find_all_word_placements(soup, wordlist).items()}
+
+
 # find_word_placement: str sopa_de_letras -> placement / None
 # Recibe una palabra y una sopa_de_letras, busca la palabra y devuelve su
 # placement en la sopa. Si no la encuentra, devuelve None.
+# Busca la palabra, y la palabra al revés, en las soup_lines de cada
+# dirección, mirando solo las posiciones donde aparecen sus dos primeras
+# letras. Si la sopa es un Grid, las soup_lines y los índices quedan en su
+# cache y se reusan al buscar las siguientes palabras.
 def find_word_placement(word, soup):
-    size = len(soup)
-
-    candidates = find_first_letter_candidates(word, soup)
-    for position in candidates:
-        row = position[0]
-        col = position[1]
-
-        if col + len(word) <= size:
-            match = "".join([soup[row][col+i] for i in range(len(word))])
-            if word == match:
-                return {
-                    "row": row,
-                    "col": col,
-                    "orientation": Orientation.HORIZONTAL
-                }
-
-        if col - len(word) + 1 >= 0:
-            match = "".join([soup[row][col-i] for i in range(len(word))])
-            if word == match:
-                return {
-                    "row": row,
-                    "col": col - len(word) + 1,
-                    "orientation": Orientation.HORIZONTAL_REVERSED
-                }
-
-        if row + len(word) <= size:
-            match = "".join([soup[row+i][col] for i in range(len(word))])
-            if word == match:
-                return {
-                    "row": row,
-                    "col": col,
-                    "orientation": Orientation.VERTICAL
-                }
-
-        if row - len(word) + 1 >= 0:
-            match = "".join([soup[row-i][col] for i in range(len(word))])
-            if word == match:
-                return {
-                    "row": row - len(word) + 1,
-                    "col": col,
-                    "orientation": Orientation.VERTICAL_REVERSED
-                }
-
-        if row + len(word) <= size and col + len(word) <= size:
-            match = "".join([soup[row+i][col+i] for i in range(len(word))])
-            if word == match:
-                return {
-                    "row": row,
-                    "col": col,
-                    "orientation": Orientation.DIAGONAL
-                }
+    if not word:
+        return None
+
+    grid = as_grid(soup)
+    for drow, dcol in get_line_directions():
+        soup_lines = get_soup_lines(grid, drow, dcol)
+        for pattern, is_reversed in [(word, False), (word[::-1], True)]:
+            orientation = get_orientation(drow, dcol, is_reversed)
+            if orientation is None:
+                continue
+
+            index = find_in_soup_lines(pattern, grid, drow, dcol)
+            if index != -1:
+                return get_line_placement(soup_lines, index, drow, dcol,
+                                          orientation)
+    return None
+
+
+# find_in_soup_lines: str Grid int int -> int
+# Recibe un texto, un Grid y una dirección, y devuelve la primera posición
+# del texto en las soup_lines de esa dirección, o -1 si no aparece. Solo
+# compara en las posiciones donde aparecen las dos primeras letras del texto.
+def find_in_soup_lines(pattern, grid, drow, dcol):
+    text = get_soup_lines(grid, drow, dcol)[0]
+    if len(pattern) < 2:
+        return text.find(pattern)
+
+    for index in get_bigram_index(grid, drow, dcol).get(pattern[:2], []):
+        if text.startswith(pattern, index):
+            return index
+    return -1
+
+
+# get_letter_index: sopa_de_letras -> dict<str>(list(tuple(int, int)))
+# Recibe una sopa_de_letras y devuelve un diccionario con las posiciones de
+# cada letra, recorriendo la sopa columna por columna. Si la sopa es un Grid,
+# lo calcula la primera vez que se pide y lo guarda en su cache.
+def get_letter_index(soup):
+    grid = as_grid(soup)
+    if "letter_index" not in grid.cache:
+        letter_index = {}
+        columns = [decode_letters(grid.column(col))
+                   for col in range(grid.size)]
+        for col, column in enumerate(columns):
+            for row, letter in enumerate(column):
+                letter_index.setdefault(letter, []).append((row, col))
+        grid.cache["letter_index"] = letter_index
+    return grid.cache["letter_index"]
+
+
+# get_bigram_index: sopa_de_letras int int -> dict<str>(list(int))
+# Recibe una sopa_de_letras y una dirección, y devuelve un diccionario con
+# las posiciones en el texto de las soup_lines de esa dirección donde aparece
+# cada par de letras consecutivas. Si la sopa es un Grid, lo calcula la
+# primera vez que se pide y lo guarda en su cache.
+def get_bigram_index(soup, drow, dcol):
+    grid = as_grid(soup)
+    key = ("bigram_index", drow, dcol)
+    if key not in grid.cache:
+        text = get_soup_lines(grid, drow, dcol)[0]
+        bigram_index = {}
+        for index in range(len(text) - 1):
+            bigram = text[index:index+2]
+            if "\n" not in bigram:
+                bigram_index.setdefault(bigram, []).append(index)
+        grid.cache[key] = bigram_index
+    return grid.cache[key]
 
 
 # find_first_letter_candidates: str sopa_de_letras -> list(tuple(int, int))
 # Recibe una palabra y una sopa_de_letras, devuelve una lista de las posiciones
-# que contienen la primera letra de la palabra.
+# que contienen la primera letra de la palabra, recorriendo la sopa columna
+# por columna.
 def find_first_letter_candidates(word, soup):
-    return [(row, col)
-            for col in range(len(soup)) for row in range(len(soup))
-            if word[0] == soup[row][col]]
-
-
-# parse_soups: file -> list(tuple(sopa_de_letras, list(str)))
-# Recibe un archivo, devuelve una lista con tuplas de sopa_de_letras y lista
-# de palabras.
-def parse_soups(f):
-    soups = []
-    wordlists = []
-
+    return list(get_letter_index(soup).get(word[0], []))
+
+
+# Representamos las letras de una sopa de letras de size x size como:
+# bitboards: dict<str>(int)
+# Cada letra de la sopa tiene un int con un bit por celda, prendido en las
+# celdas que contienen esa letra. La celda (row, col) es el bit
+# row*(size+1) + col: cada fila tiene una columna de guarda más, siempre en 0,
+# para que al correr un bitboard una celda a la izquierda o a la derecha las
+# letras de una fila no pasen a la fila vecina.
+# Por ejemplo, la sopa
+# [["A", "B"],
+#  ["B", "A"]]
+# tiene los bitboards {"A": 0b10001, "B": 0b01010}.
+
+
+# get_bitboards: sopa_de_letras -> bitboards
+# Recibe una sopa_de_letras y devuelve los bitboards de sus letras. Si la sopa
+# es un Grid, los calcula la primera vez que se piden y los guarda en su
+# cache.
+def get_bitboards(soup):
+    grid = as_grid(soup)
+    if "bitboards" not in grid.cache:
+        size = grid.size
+        # Filas con la columna de guarda, de la última celda a la primera,
+        # así cada celda queda en la posición de su bit al leerlo en base 2
+        padded = b"".join(bytes(grid.data[row*size:(row+1)*size]) + b"\0"
+                          for row in range(size))[::-1]
+        bitboards = {}
+        for code in set(grid.data):
+            table = bytes(0x31 if i == code else 0x30 for i in range(256))
+            bitboards[decode_letters([code])] = int(padded.translate(table), 2)
+        grid.cache["bitboards"] = bitboards
+    return grid.cache["bitboards"]
+
+
+# find_word_starts: str bitboards int int int -> int
+# Recibe una palabra, los bitboards de una sopa de letras de size x size y
+# una dirección. Devuelve un int con los bits prendidos en las celdas donde
+# comienza la palabra leída en esa dirección: las celdas con la primera
+# letra, tales que i celdas más allá en esa dirección está la letra i.
+def find_word_starts(word, bitboards, size, drow, dcol):
+    shift = drow*(size + 1) + dcol
+    starts = bitboards.get(word[0], 0)
+    for i, letter in enumerate(word[1:], 1):
+        if not starts:
+            break
+        bitboard = bitboards.get(letter, 0)
+        if shift >= 0:
+            starts &= bitboard >> i*shift
+        else:
+            starts &= bitboard << -i*shift
+    return starts
+
+
+# find_every_word_placement: str sopa_de_letras -> list(placement)
+# Recibe una palabra y una sopa_de_letras, y devuelve todos los placements de
+# la palabra en la sopa, en todas las orientaciones (una lista vacía si no
+# aparece). A diferencia de find_word_placement, el costo depende del largo de
+# la palabra y no de la cantidad de celdas candidatas: cada letra es un AND
+# entre bitboards de toda la sopa. Conviene para sopas muy grandes.
+def find_every_word_placement(word, soup):
+    grid = as_grid(soup)
+    if not word:
+        return []
+
+    bitboards = get_bitboards(grid)
+    width = grid.size + 1
+    placements = []
+    for orientation, (drow, dcol, is_reversed) in ORIENTATION_STEPS.items():
+        pattern = word[::-1] if is_reversed else word
+        starts = find_word_starts(pattern, bitboards, grid.size, drow, dcol)
+        while starts:
+            start = starts & -starts
+            starts ^= start
+            row, col = divmod(start.bit_length() - 1, width)
+            placements.append(Placement(row, col, orientation))
+    return placements
+
+
+# get_soup_array: sopa_de_letras -> numpy.ndarray
+# Recibe una sopa_de_letras y devuelve un array de NumPy de size x size con
+# los códigos de sus letras. Si la sopa es un Grid, el array comparte la
+# memoria del Grid, así que refleja los cambios que se le hagan.
+# Requiere NumPy.
+def get_soup_array(soup):
+    grid = as_grid(soup)
+    return np.frombuffer(grid.data, dtype=np.uint8).reshape(grid.size,
+                                                            grid.size)
+
+
+# get_padded_soup_array: Grid int -> numpy.ndarray
+# Recibe un Grid y una cantidad de celdas, y devuelve su array de NumPy
+# rodeado por un borde de al menos esa cantidad de celdas con el código 0, que
+# no es ninguna letra. Así, una palabra de ese largo leída desde cualquier
+# celda del Grid nunca se sale del array. Lo guarda en la cache del Grid.
+# Requiere NumPy.
+def get_padded_soup_array(grid, pad):
+    cached = grid.cache.get("padded_array")
+    if cached is None or cached[0] < pad:
+        cached = pad, np.pad(get_soup_array(grid), pad)
+        grid.cache["padded_array"] = cached
+    return cached
+
+
+# get_letter_positions_numpy: Grid int -> tuple(numpy.ndarray, numpy.ndarray)
+# Recibe un Grid y el código de una letra, y devuelve las filas y las columnas
+# de las celdas que contienen esa letra, fila por fila. Las guarda en la cache
+# del Grid.
+# Requiere NumPy.
+def get_letter_positions_numpy(grid, code):
+    positions = grid.cache.setdefault("letter_positions_numpy", {})
+    if code not in positions:
+        positions[code] = np.nonzero(get_soup_array(grid) == code)
+    return positions[code]
+
+
+# find_word_placement_numpy: str sopa_de_letras -> placement / None
+# Igual que find_word_placement, pero con NumPy: parte de todas las celdas
+# que contienen la primera letra de la palabra y arma una máscara booleana
+# con una fila por orientación y una columna por celda, que en cada paso
+# compara de una vez la letra siguiente en todas las celdas y orientaciones.
+# Las orientaciones al revés se leen desde la primera letra de la palabra
+# hacia atrás.
+# Requiere NumPy.
+def find_word_placement_numpy(word, soup):
+    if not word:
+        return None
+    try:
+        codes = encode_letters(word)
+    except ValueError:
+        return None
+
+    grid = as_grid(soup)
+    rows, cols = get_letter_positions_numpy(grid, codes[0])
+    if not len(rows):
+        return None
+
+    pad, padded = get_padded_soup_array(grid, len(codes))
+    steps = np.array([(-drow, -dcol) if is_reversed else (drow, dcol)
+                      for drow, dcol, is_reversed
+                      in ORIENTATION_STEPS.values()])
+    drows, dcols = steps[:, :1], steps[:, 1:]
+
+    rows = rows + pad
+    cols = cols + pad
+    matches = np.ones((len(steps), len(rows)), dtype=bool)
+    for i, letter in enumerate(codes[1:], 1):
+        matches &= padded[rows + i*drows, cols + i*dcols] == letter
+        # Nos quedamos solo con las celdas que siguen coincidiendo en alguna
+        # orientación
+        candidates = matches.any(axis=0)
+        if not candidates.all():
+            rows, cols = rows[candidates], cols[candidates]
+            matches = matches[:, candidates]
+            if not len(rows):
+                return None
+
+    index, candidate = np.argwhere(matches)[0]
+    orientation = list(ORIENTATION_STEPS)[index]
+    drow, dcol, is_reversed = ORIENTATION_STEPS[orientation]
+    row, col = int(rows[candidate]) - pad, int(cols[candidate]) - pad
+    if is_reversed:
+        # El placement es la celda donde se escribe la última letra
+        row -= (len(codes) - 1) * drow
+        col -= (len(codes) - 1) * dcol
+    return Placement(row, col, orientation)
+
+
+# find_word_placements_numpy: sopa_de_letras list(str)
+#                             -> dict<str>(placement / None)
+# Igual que find_word_placements, pero buscando cada palabra con
+# find_word_placement_numpy.
+# Requiere NumPy.
+def find_word_placements_numpy(soup, wordlist):
+    grid = as_grid(soup)
+    return {word: find_word_placement_numpy(word, grid) for word in wordlist}
+
+
+# SoupFormatError: error en el formato de un archivo de sopas de letras.
+# Indica la línea (empezando en 1) y la posición en bytes donde comienza la
+# línea con el error.
+class SoupFormatError(ValueError):
+    def __init__(self, message, line, offset):
+        super().__init__(f"Línea {line} (byte {offset}): {message}")
+        self.line = line
+        self.offset = offset
+
+
+# iter_file_lines: file (bool) -> iter(tuple(int, str))
+# Recibe un archivo y devuelve un iterador con la posición en bytes donde
+# comienza cada línea y la línea, sin el salto de línea. Lee una línea por
+# vez, así que no carga el archivo entero en memoria. Si use_mmap es True,
+# lee el archivo a través de un mmap (el archivo tiene que ser un archivo
+# real, con fileno).
+# Si el archivo de texto tiene un buffer binario, lee las líneas de ahí, así
+# las posiciones cuentan los bytes del archivo aunque el modo texto traduzca
+# los saltos de línea (un "\r\n" son 2 bytes, no 1).
+def iter_file_lines(f, use_mmap=False):
+    encoding = getattr(f, "encoding", None) or "utf-8"
+    errors = getattr(f, "errors", None) or "strict"
+    buffer = getattr(f, "buffer", None)
+
+    if use_mmap:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            offset = 0
+            for line in iter(data.readline, b""):
+                yield offset, line.decode(encoding, errors).rstrip("\r\n")
+                offset += len(line)
+    elif buffer is not None:
+        offset = 0
+        for line in buffer:
+            yield offset, line.decode(encoding, errors).rstrip("\r\n")
+            offset += len(line)
+    else:
+        offset = 0
+        for line in f:
+            yield offset, line.rstrip("\r\n")
+            if line.isascii():
+                offset += len(line)
+            else:
+                offset += len(line.encode(encoding))
+
+
+# iter_soups: file (bool) -> iter(tuple(sopa_de_letras, list(str)))
+# Recibe un archivo y devuelve un iterador con tuplas de sopa_de_letras y
+# lista de palabras, en el formato descripto al comienzo del archivo. Cada
+# sopa se devuelve apenas se lee su "# FIN", y solo se guarda en memoria la
+# sopa que se está leyendo, así que sirve para archivos de cualquier tamaño.
+# Si use_mmap es True, lee el archivo a través de un mmap.
+# Si el archivo no respeta el formato, lanza SoupFormatError con la línea
+# del error.
+def iter_soups(f, use_mmap=False):
     reading_soup = False
-    current_soup = []
-    current_wordlist = []
-    for line in f.readlines():
-        line = line.strip("\n")
+    size = 0
+    rows = 0
+    data = bytearray()
+    wordlist = []
+    line_number = 0
+    offset = 0
+    for line_number, (offset, line) in enumerate(iter_file_lines(f, use_mmap),
+                                                 1):
         if line == "# INICIO":
+            if reading_soup:
+                raise SoupFormatError("Falta el # FIN de la sopa anterior",
+                                      line_number, offset)
             reading_soup = True
+            size = 0
+            rows = 0
+            data = bytearray()
+            wordlist = []
+
         elif line == "# FIN":
+            if not reading_soup:
+                raise SoupFormatError("# FIN sin # INICIO", line_number,
+                                      offset)
+            if rows < size:
+                raise SoupFormatError(f"La sopa tiene {rows} filas y se "
+                                      f"esperaban {size}", line_number, offset)
             reading_soup = False
-            soups.append(current_soup)
-            wordlists.append(current_wordlist)
-            current_soup = []
-            current_wordlist = []
+            yield Grid(size, data), wordlist
 
         elif reading_soup:
-            if (len(current_soup) == 0 or
-                    len(current_soup) < len(current_soup[0])):
-                current_soup.append(line.split(" "))
+            if rows == 0 or rows < size:
+                # Una fila válida son letras sueltas separadas por espacios
+                letters = line[::2]
+                if rows == 0:
+                    size = len(letters)
+                elif len(letters) != size:
+                    raise SoupFormatError(f"La fila tiene {len(letters)} "
+                                          f"letras y se esperaban {size}",
+                                          line_number, offset)
+                try:
+                    if line[1::2] != " " * (size - 1) or " " in letters:
+                        raise ValueError
+                    data += encode_letters(letters)
+                except ValueError:
+                    raise SoupFormatError("La fila tiene letras inválidas",
+                                          line_number, offset) from None
+                rows += 1
             else:
-                current_wordlist = line.split(" ")
+                wordlist = line.split(" ")
 
-    return list(zip(soups, wordlists))
+    if reading_soup:
+        raise SoupFormatError("Falta el # FIN de la última sopa", line_number,
+                              offset)
+
+
+# parse_soups: file -> list(tuple(sopa_de_letras, list(str)))
+# Recibe un archivo, devuelve una lista con tuplas de sopa_de_letras y lista
+# de palabras. Para archivos grandes, conviene recorrer iter_soups.
+def parse_soups(f):
+    return list(iter_soups(f))
+
+
+# format_soup: sopa_de_letras list(str) -> str
+# Recibe una sopa de letras y su lista de palabras, y devuelve el texto que
+# las representa en el formato que lee parse_soups.
+def format_soup(soup, wordlist):
+    lines = ["# INICIO"]
+    lines += [" ".join(row) for row in as_grid(soup).rows()]
+    lines.append(" ".join(wordlist))
+    lines.append("# FIN")
+    return "\n".join(lines) + "\n"
+
+
+# run_menu: -> None
+# Muestra el menú interactivo hasta que el usuario elige salir.
+def run_menu():
+    global DEBUG
 
-if __name__ == "__main__":
     print("Trabajo Práctico: sopa-de-letras")
     print("Integrantes: Bautista Marelli y Juan Cruz de La Torre")
 
+    solve_cache = create_solve_cache()
+
     done = False
     while not done:
         print("")
@@ -497,17 +2322,28 @@ if __name__ == "__main__":
         print("3) Resolver sopas de letras")
         print(f"4) Activar/Desactivar modo depuración (DEBUG={DEBUG})")
         print("5) Salir")
+        print("6) Resolver sopas de letras en paralelo (resultados en JSON)")
 
         option = input(">>> ")
         if option == "1":
             wordlist = get_wordlist_input()
-            generate_soup(wordlist)
+            try:
+                generate_soup(wordlist)
+            except SoupGenerationError as error:
+                print(colored(f"No se pudo generar la sopa: {error}",
+                              color="red"))
         elif option == "2":
             try:
                 N = int(input("N: "))
                 wordlist = get_wordlist_input()
-                for _ in range(N):
-                    generate_soup(wordlist)
+                for _, soup, word_placements in generate_soups(wordlist, N):
+                    if DEBUG:
+                        display_soup(soup, word_placements)
+                    else:
+                        display_soup(soup)
+            except SoupGenerationError as error:
+                print(colored(f"No se pudo generar la sopa: {error}",
+                              color="red"))
             except ValueError:
                 print(colored("El valor no es un número", color="red"))
         elif option == "3":
@@ -516,11 +2352,31 @@ if __name__ == "__main__":
             filename = input("Ingresa el nombre del archivo: ")
             try:
                 with open(filename, "r") as f:
-                    soups = parse_soups(f)
-                    for soup, wordlist in soups:
-                        solve_soup(soup, wordlist)
+                    for soup, wordlist in iter_soups(f):
+                        solve_soup(soup, wordlist, solve_cache)
+            except FileNotFoundError:
+                print(colored("El archivo no existe", color="red"))
+            except SoupFormatError as error:
+                print(colored(f"Error en el archivo: {error}", color="red"))
+        elif option == "6":
+            filename = input("Ingresa el nombre del archivo: ")
+            output = input("Ingresa el nombre del archivo de resultados: ")
+            try:
+                count = 0
+                not_found = 0
+                start = perf_counter()
+                with open(filename, "r") as f, open(output, "w") as out:
+                    for result in solve_soups(iter_soups(f)):
+                        out.write(format_solve_result(result) + "\n")
+                        count += 1
+                        not_found += len(result["not_found"])
+                print(f"Se resolvieron {count} sopas en "
+                      f"{perf_counter() - start:.2f} segundos "
+                      f"({not_found} palabras no encontradas)")
             except FileNotFoundError:
                 print(colored("El archivo no existe", color="red"))
+            except SoupFormatError as error:
+                print(colored(f"Error en el archivo: {error}", color="red"))
         elif option == "4":
             DEBUG = not DEBUG
             print(f"Modo depuración: {'Activado' if DEBUG else 'Desactivado'}")
@@ -528,3 +2384,227 @@ if __name__ == "__main__":
             done = True
         else:
             print(colored("Opción inválida", color="red"))
+
+
+# Desde la línea de comandos, sin argumentos se muestra el menú interactivo.
+# Con un subcomando, el programa no pregunta nada: lee de un archivo o de la
+# entrada estándar y escribe un resultado por línea en la salida estándar a
+# medida que los tiene, así se puede usar dentro de pipelines:
+#   python main.py generate [archivo] [--count N] [--seed S] [--format F]
+#       Lee una lista de palabras por línea, separadas por espacios o como
+#       JSON ({"words": [...]} o [...]), y genera count sopas para cada una.
+#       Escribe cada sopa como JSON o, con --format sopas, en el formato de
+#       sopas.txt.
+#   python main.py solve [archivo] [--format sopas/jsonl]
+#       Lee sopas en el formato de sopas.txt o como JSON
+#       ({"soup": [...], "words": [...]}) y escribe un solve_result en JSON
+#       por sopa, en el mismo orden.
+#   python main.py bench [argumentos de bench.py]
+#       Corre los benchmarks de bench.py.
+# Los resultados se generan en paralelo, pero solo se leen más datos de
+# entrada a medida que se escriben los resultados: si quien lee la salida va
+# más lento, el programa espera en lugar de acumular resultados en memoria.
+
+
+# write_record: file str -> None
+# Recibe un archivo y una línea, y escribe la línea y vacía el buffer, así
+# quien lee la salida recibe cada resultado apenas está listo.
+def write_record(file, line):
+    file.write(line + "\n")
+    file.flush()
+
+
+# normalize_wordlist: iter(str) -> list(str)
+# Recibe palabras y las devuelve en mayúsculas, sin repetir y en el mismo
+# orden.
+def normalize_wordlist(words):
+    return list(dict.fromkeys(word.upper() for word in words))
+
+
+# iter_wordlists: file -> iter(list(str))
+# Recibe un archivo con una lista de palabras por línea, separadas por
+# espacios o como JSON ({"words": [...]} o [...]), y devuelve un iterador con
+# cada lista normalizada. Ignora las líneas vacías. Si una línea no es válida
+# lanza SoupFormatError.
+def iter_wordlists(f):
+    for line_number, (offset, line) in enumerate(iter_file_lines(f), 1):
+        line = line.strip()
+        if not line:
+            continue
+
+        try:
+            if line[0] in "[{":
+                words = json.loads(line)
+                if isinstance(words, dict):
+                    words = words["words"]
+            else:
+                words = line.split()
+            wordlist = normalize_wordlist(words)
+        except (ValueError, KeyError, TypeError, AttributeError):
+            raise SoupFormatError("Lista de palabras inválida", line_number,
+                                  offset) from None
+
+        if not is_wordlist_valid(wordlist):
+            raise SoupFormatError("Lista de palabras inválida", line_number,
+                                  offset)
+        yield wordlist
+
+
+# iter_json_soups: file -> iter(tuple(sopa_de_letras, list(str)))
+# Recibe un archivo con una sopa por línea como JSON, con sus filas como
+# strings o como listas de letras:
+#   {"soup": ["ABC", "DEF", "GHI"], "words": ["ABC", "BEH"]}
+# y devuelve un iterador de tuplas de sopa_de_letras y lista de palabras,
+# como iter_soups. Ignora las líneas vacías. Si una línea no es válida lanza
+# SoupFormatError.
+def iter_json_soups(f):
+    for line_number, (offset, line) in enumerate(iter_file_lines(f), 1):
+        if not line.strip():
+            continue
+
+        try:
+            record = json.loads(line)
+            soup = Grid.from_rows(record["soup"])
+            wordlist = list(record["words"])
+        except (ValueError, KeyError, TypeError):
+            raise SoupFormatError("Sopa inválida", line_number,
+                                  offset) from None
+        yield soup, wordlist
+
+
+# format_generated_soup: int sopa_de_letras word_placements -> str
+# Recibe el número de una sopa generada, la sopa y sus word_placements, y
+# devuelve una línea de JSON que los representa, con las filas de la sopa
+# como strings y cada placement como en format_solve_result.
+def format_generated_soup(index, soup, word_placements):
+    return json.dumps({
+        "index": index,
+        "size": len(soup),
+        "soup": as_grid(soup).rows(),
+        "words": list(word_placements),
+        "word_placements": {
+            word: {**placement.to_dict(),
+                   "orientation": placement.orientation.name}
+            for word, placement in word_placements.items()
+        }
+    }, ensure_ascii=False)
+
+
+# format_generation_error: int str -> str
+# Recibe el número de una sopa que no se pudo generar y el motivo, y devuelve
+# una línea de JSON que los representa.
+def format_generation_error(index, message):
+    return json.dumps({"index": index, "error": message}, ensure_ascii=False)
+
+
+# run_generate: Namespace file -> int
+# Recibe los argumentos del subcomando generate y el archivo de salida,
+# genera las sopas y devuelve el código de salida. Si no se puede generar
+# alguna sopa escribe el error en su lugar (en el formato jsonl) o en stderr
+# (en el formato de sopas.txt), sigue con las demás y al final devuelve 1.
+def run_generate(args, out):
+    rng = Random(args.seed)
+    arguments = ((index, wordlist, rng.getrandbits(64))
+                 for index, wordlist
+                 in enumerate(wordlist
+                              for wordlist in iter_wordlists(args.input)
+                              for _ in range(args.count)))
+
+    failed = 0
+    for index, soup, word_placements in map_in_pool(try_create_soup_with_seed,
+                                                    arguments,
+                                                    args.processes):
+        if soup is None:
+            failed += 1
+            if args.format == "sopas":
+                print(f"No se pudo generar la sopa {index}: "
+                      f"{word_placements}", file=sys.stderr)
+            else:
+                write_record(out, format_generation_error(index,
+                                                          word_placements))
+        elif args.format == "sopas":
+            out.write(format_soup(soup, list(word_placements)))
+            out.flush()
+        else:
+            write_record(out, format_generated_soup(index, soup,
+                                                    word_placements))
+
+    if failed:
+        print(f"Sopas que no se pudieron generar: {failed}",
+              file=sys.stderr)
+        return 1
+    return 0
+
+
+# run_solve: Namespace file -> int
+# Recibe los argumentos del subcomando solve y el archivo de salida,
+# resuelve las sopas y devuelve el código de salida.
+def run_solve(args, out):
+    if args.format == "jsonl":
+        soups = iter_json_soups(args.input)
+    else:
+        soups = iter_soups(args.input)
+
+    for result in solve_soups(soups, args.processes, args.chunk_size):
+        write_record(out, format_solve_result(result))
+    return 0
+
+
+# main: (list(str)) (file) -> int
+# Recibe los argumentos de la línea de comandos y el archivo de salida (por
+# defecto, la salida estándar). Sin argumentos muestra el menú; con un
+# subcomando lo corre. Devuelve el código de salida.
+def main(argv=None, out=None):
+    argv = sys.argv[1:] if argv is None else argv
+    out = out or sys.stdout
+    if not argv:
+        run_menu()
+        return 0
+
+    if argv[0] == "bench":
+        from bench import main as bench_main
+        return bench_main(argv[1:])
+
+    parser = argparse.ArgumentParser(prog="main.py")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    generate = subparsers.add_parser("generate")
+    generate.add_argument("input", nargs="?", type=argparse.FileType("r"),
+                          default=sys.stdin)
+    generate.add_argument("--count", type=int, default=1)
+    generate.add_argument("--seed", type=int, default=None)
+    generate.add_argument("--processes", type=int, default=None)
+    generate.add_argument("--format", choices=["jsonl", "sopas"],
+                          default="jsonl")
+
+    solve = subparsers.add_parser("solve")
+    solve.add_argument("input", nargs="?", type=argparse.FileType("r"),
+                       default=sys.stdin)
+    solve.add_argument("--format", choices=["sopas", "jsonl"],
+                       default="sopas")
+    solve.add_argument("--processes", type=int, default=None)
+    solve.add_argument("--chunk-size", type=int, default=16)
+
+    subparsers.add_parser("bench", add_help=False)
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "generate":
+            return run_generate(args, out)
+        return run_solve(args, out)
+    except SoupFormatError as error:
+        print(f"Error en la entrada: {error}", file=sys.stderr)
+        return 1
+    except BrokenPipeError:
+        # Quien leía la salida la cerró (por ejemplo, head): terminamos sin
+        # mostrar el error, y evitamos que falle otra vez al cerrar stdout
+        if out is sys.stdout:
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 0
+    finally:
+        if args.input is not sys.stdin:
+            args.input.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,478 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+# Servicio HTTP que genera y resuelve sopas de letras.
+#
+# Atiende pedidos por TCP o por un socket Unix con asyncio, y los resuelve en
+# un pool de procesos que se crea una sola vez, así cada pedido no paga el
+# costo de iniciar Python. Los pedidos que llegan al mismo tiempo se juntan en
+# lotes de hasta --batch-size pedidos (esperando a lo sumo --batch-delay
+# segundos a que se llene el lote). Cada lote se manda al pool en partes: de
+# a --solve-chunk-size pedidos de /solve, y de a uno los de /generate, que
+# pueden tardar mucho más que otros. Cada pedido se responde apenas termina
+# su parte, sin esperar al resto del lote.
+#
+# Endpoints:
+#   POST /generate  {"words": ["PERRO", "GATO"], "seed": 1}
+#                   -> sopa generada, como la escribe "main.py generate"
+#   POST /solve     {"soup": ["ABC", "DEF", "GHI"], "words": ["ABC"]}
+#                   -> solve_result, como lo escribe "main.py solve"
+#   GET /stats      -> pedidos en cola, latencias (p50, p90, p99), etc.
+#
+# Cada pedido tiene un tiempo máximo de --timeout segundos (si se pasa,
+# responde 504) y nunca hay más de --max-concurrency pedidos en proceso: los
+# demás esperan su turno. El pool también recibe el tiempo máximo de cada
+# pedido de /generate y deja de generar la sopa cuando se pasa; si el pedido
+# todavía no empezó a procesarse, se saca del pool.
+#
+# Uso:
+#   python service.py --port 8080
+#   python service.py --unix /tmp/sopas.sock
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from math import ceil
+from random import getrandbits
+from time import perf_counter, time
+
+from main import (Grid, SoupGenerationError, create_soup_with_seed,
+                  format_generated_soup, format_solve_result,
+                  is_wordlist_valid, normalize_wordlist, solve_soup_chunk)
+
+
+HOST = "127.0.0.1"
+PORT = 8080
+BATCH_SIZE = 16
+BATCH_DELAY = 0.005  # Segundos que se espera a que se llene un lote
+SOLVE_CHUNK_SIZE = 4  # Pedidos de /solve que se mandan juntos al pool
+TIMEOUT = 10.0
+MAX_CONCURRENCY = 64
+LATENCY_WINDOW = 1000  # Cantidad de latencias guardadas por endpoint
+MAX_BODY_SIZE = 16 * 1024 * 1024
+
+STATUS_TEXTS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    422: "Unprocessable Entity",
+    500: "Internal Server Error",
+    504: "Gateway Timeout"
+}
+
+
+# RequestError: un pedido que no se puede atender, con el código HTTP de la
+# respuesta.
+class RequestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# generate_batch: list(tuple(tuple(int, list(str), int), float)) -> list(str)
+# Recibe una lista de tuplas con los argumentos de create_soup_with_seed
+# (número de pedido, lista de palabras, semilla) y el momento límite del
+# pedido (un valor de time.time), y devuelve cada sopa generada como una
+# línea de JSON. Si se pasa el momento límite de un pedido lanza
+# TimeoutError. Corre en el pool.
+def generate_batch(batch):
+    return [format_generated_soup(*create_soup_with_seed(
+                arguments, max(deadline - time(), 0)))
+            for arguments, deadline in batch]
+
+
+# solve_batch: list(tuple(tuple(int, tuple(Grid, list(str))), float))
+#              -> list(str)
+# Recibe una lista de tuplas con una sopa numerada con su lista de palabras y
+# el momento límite del pedido, y devuelve cada solve_result como una línea
+# de JSON. Resolver una sopa no se puede cortar a la mitad, así que no usa el
+# momento límite. Corre en el pool.
+def solve_batch(batch):
+    return [format_solve_result(result)
+            for result in solve_soup_chunk([argument
+                                            for argument, _ in batch])]
+
+
+BATCH_FUNCTIONS = {
+    "generate": generate_batch,
+    "solve": solve_batch
+}
+
+
+# percentile: list(float) float -> float / None
+# Recibe una lista de valores y una fracción entre 0 y 1, y devuelve el
+# percentil correspondiente (el menor valor tal que esa fracción de los
+# valores es menor o igual), o None si la lista está vacía.
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[max(ceil(fraction * len(values)) - 1, 0)]
+
+
+# PuzzleService: junta los pedidos en lotes, los resuelve en un pool de
+# procesos y lleva las estadísticas del servicio.
+class PuzzleService:
+    def __init__(self, processes=None, batch_size=BATCH_SIZE,
+                 batch_delay=BATCH_DELAY, timeout=TIMEOUT,
+                 max_concurrency=MAX_CONCURRENCY,
+                 solve_chunk_size=SOLVE_CHUNK_SIZE):
+        # Los procesos se crean con "spawn" y no con "fork": un proceso
+        # creado con fork hereda los sockets de las conexiones abiertas, y
+        # entonces cerrar una conexión no le avisa al cliente.
+        self.executor = ProcessPoolExecutor(
+            processes, mp_context=multiprocessing.get_context("spawn"))
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.timeout = timeout
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.chunk_sizes = {"generate": 1, "solve": solve_chunk_size}
+
+        # Pedidos de cada tipo esperando a que se mande su lote, como
+        # tuplas (argumento, momento límite, future)
+        self.queues = {kind: [] for kind in BATCH_FUNCTIONS}
+        self.flush_handles = {}
+
+        self.waiting = 0  # Pedidos esperando su turno (max_concurrency)
+        self.in_flight = 0  # Pedidos en proceso
+        self.counters = {"requests": 0, "batches": 0, "timeouts": 0,
+                         "errors": 0}
+        self.latencies = {kind: deque(maxlen=LATENCY_WINDOW)
+                          for kind in BATCH_FUNCTIONS}
+
+    # close: -> None
+    # Cierra el pool de procesos.
+    def close(self):
+        for handle in self.flush_handles.values():
+            handle.cancel()
+        self.executor.shutdown(cancel_futures=True)
+
+    # handle: str dict -> str
+    # Recibe el tipo de pedido ("generate" o "solve") y su contenido, y
+    # devuelve la respuesta como JSON. Si el pedido no es válido lanza
+    # RequestError.
+    async def handle(self, kind, payload):
+        self.counters["requests"] += 1
+        argument = self.parse_request(kind, payload,
+                                      self.counters["requests"])
+
+        start = perf_counter()
+        deadline = time() + self.timeout
+        try:
+            result = await asyncio.wait_for(self.run(kind, argument, deadline),
+                                            self.timeout)
+        except asyncio.TimeoutError:
+            self.counters["timeouts"] += 1
+            raise RequestError(504, "Se superó el tiempo máximo") from None
+        self.latencies[kind].append(perf_counter() - start)
+        return result
+
+    # parse_request: str dict int -> tuple
+    # Recibe el tipo de pedido, su contenido y su número, y devuelve el
+    # argumento que recibe la función del lote. Si el pedido no es válido
+    # lanza RequestError.
+    def parse_request(self, kind, payload, index):
+        try:
+            wordlist = payload["words"]
+            # Un string también se puede recorrer, pero como lista de letras
+            if not (isinstance(wordlist, list) and
+                    all(isinstance(word, str) for word in wordlist)):
+                raise ValueError
+            if kind == "generate":
+                wordlist = normalize_wordlist(wordlist)
+                if not wordlist or not is_wordlist_valid(wordlist):
+                    raise ValueError
+                seed = payload.get("seed")
+                if seed is None:
+                    seed = getrandbits(64)
+                return index, wordlist, int(seed)
+
+            soup = payload["soup"]
+            if not (isinstance(soup, list) and
+                    all(isinstance(row, (str, list)) for row in soup)):
+                raise ValueError
+            return index, (Grid.from_rows(soup), wordlist)
+        except (ValueError, KeyError, TypeError, AttributeError):
+            raise RequestError(400, "Pedido inválido") from None
+
+    # run: str tuple float -> str
+    # Recibe el tipo de pedido, su argumento y su momento límite (un valor de
+    # time.time), espera su turno, lo agrega al próximo lote y devuelve su
+    # resultado.
+    async def run(self, kind, argument, deadline):
+        self.waiting += 1
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        try:
+            future = asyncio.get_running_loop().create_future()
+            queue = self.queues[kind]
+            queue.append((argument, deadline, future))
+            if len(queue) >= self.batch_size:
+                self.flush(kind)
+            elif kind not in self.flush_handles:
+                self.flush_handles[kind] = asyncio.get_running_loop() \
+                    .call_later(self.batch_delay, self.flush, kind)
+            return await future
+        finally:
+            self.in_flight -= 1
+            self.semaphore.release()
+
+    # flush: str -> None
+    # Recibe un tipo de pedido y manda al pool el lote con los pedidos de ese
+    # tipo que están en cola, en partes de a lo sumo chunk_sizes[kind]
+    # pedidos.
+    def flush(self, kind):
+        handle = self.flush_handles.pop(kind, None)
+        if handle is not None:
+            handle.cancel()
+
+        # Los pedidos que ya terminaron (por timeout) no se mandan
+        batch = [(argument, deadline, future)
+                 for argument, deadline, future in self.queues[kind]
+                 if not future.done()]
+        self.queues[kind] = []
+        if not batch:
+            return
+
+        self.counters["batches"] += 1
+        chunk_size = self.chunk_sizes[kind]
+        for start in range(0, len(batch), chunk_size):
+            chunk = batch[start:start + chunk_size]
+            try:
+                task = asyncio.wrap_future(self.executor.submit(
+                    BATCH_FUNCTIONS[kind],
+                    [(argument, deadline) for argument, deadline, _ in chunk]))
+            except Exception:
+                # Por ejemplo, si se rompió el pool: los pedidos no pueden
+                # quedar esperando hasta el timeout
+                self.counters["errors"] += 1
+                for _, _, future in chunk:
+                    if not future.done():
+                        future.set_exception(RequestError(
+                            500, "Error al procesar el pedido"))
+                continue
+            task.add_done_callback(
+                lambda task, chunk=chunk: self.finish(chunk, task))
+            for _, _, future in chunk:
+                future.add_done_callback(
+                    lambda _, chunk=chunk, task=task: self.abandon(chunk,
+                                                                   task))
+
+    # abandon: list(tuple(tuple, float, Future)) Future -> None
+    # Recibe una parte de un lote y el future de su resultado en el pool. Si
+    # ya no queda ningún pedido de la parte esperando (por timeout), la
+    # cancela: si todavía no empezó, el pool no la procesa.
+    def abandon(self, chunk, task):
+        if not task.done() and all(future.done() for _, _, future in chunk):
+            task.cancel()
+
+    # finish: list(tuple(tuple, float, Future)) Future -> None
+    # Recibe una parte de un lote y el future de su resultado en el pool, y
+    # entrega a cada pedido su resultado. Si el pool lanzó TimeoutError
+    # responde 504, si no se pudo generar la sopa 422, y si hubo otro error
+    # 500.
+    def finish(self, chunk, task):
+        if task.cancelled():
+            return
+
+        exception = task.exception()
+        if exception is not None:
+            if isinstance(exception, TimeoutError):
+                error = RequestError(504, "Se superó el tiempo máximo")
+            elif isinstance(exception, SoupGenerationError):
+                error = RequestError(422, str(exception))
+            else:
+                self.counters["errors"] += 1
+                error = RequestError(500, "Error al procesar el pedido")
+            for _, _, future in chunk:
+                if not future.done():
+                    if error.status == 504:
+                        self.counters["timeouts"] += 1
+                    future.set_exception(error)
+            return
+
+        for (_, _, future), result in zip(chunk, task.result()):
+            if not future.done():
+                future.set_result(result)
+
+    # stats: -> dict
+    # Devuelve las estadísticas del servicio: pedidos en cola (esperando su
+    # turno o su lote), pedidos en proceso, contadores y latencias en
+    # segundos de los últimos LATENCY_WINDOW pedidos de cada tipo.
+    def stats(self):
+        batch_queue = sum(len(queue) for queue in self.queues.values())
+        return {
+            "queue_depth": self.waiting + batch_queue,
+            "waiting": self.waiting,
+            "batch_queue": batch_queue,
+            "in_flight": self.in_flight,
+            **self.counters,
+            "latency": {
+                kind: {
+                    "count": len(latencies),
+                    "p50": percentile(latencies, 0.5),
+                    "p90": percentile(latencies, 0.9),
+                    "p99": percentile(latencies, 0.99)
+                }
+                for kind, latencies in self.latencies.items()
+            }
+        }
+
+    # handle_connection: StreamReader StreamWriter -> None
+    # Atiende una conexión HTTP, con uno o más pedidos.
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+
+                status, response = await self.respond(method, path, body)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                await write_response(writer, status, response, keep_alive)
+                if not keep_alive:
+                    break
+        except RequestError as error:
+            await write_response(writer, error.status,
+                                 json.dumps({"error": str(error)}), False)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    # respond: str str bytes -> tuple(int, str)
+    # Recibe el método, la ruta y el cuerpo de un pedido, y devuelve el
+    # código HTTP y el cuerpo de la respuesta.
+    async def respond(self, method, path, body):
+        try:
+            if path == "/stats":
+                if method != "GET":
+                    raise RequestError(405, "Método no permitido")
+                return 200, json.dumps(self.stats())
+
+            kind = path.lstrip("/")
+            if kind not in BATCH_FUNCTIONS:
+                raise RequestError(404, "No existe")
+            if method != "POST":
+                raise RequestError(405, "Método no permitido")
+
+            try:
+                payload = json.loads(body)
+            except ValueError:
+                raise RequestError(400, "El cuerpo no es JSON") from None
+            if not isinstance(payload, dict):
+                raise RequestError(400, "Pedido inválido")
+            return 200, await self.handle(kind, payload)
+        except RequestError as error:
+            return error.status, json.dumps({"error": str(error)},
+                                            ensure_ascii=False)
+
+
+# read_request: StreamReader -> tuple(str, str, dict<str>(str), bytes) / None
+# Lee un pedido HTTP y devuelve su método, ruta, headers (en minúsculas) y
+# cuerpo, o None si se cerró la conexión.
+async def read_request(reader):
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, path, _ = line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise RequestError(400, "Pedido inválido") from None
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        raise RequestError(400, "Content-Length inválido") from None
+    if length > MAX_BODY_SIZE:
+        raise RequestError(413, "El pedido es demasiado grande")
+    body = await reader.readexactly(length) if length else b""
+    return method, path, headers, body
+
+
+# write_response: StreamWriter int str bool -> None
+# Escribe una respuesta HTTP con un cuerpo JSON.
+async def write_response(writer, status, body, keep_alive=True):
+    body = body.encode("utf-8")
+    head = (f"HTTP/1.1 {status} {STATUS_TEXTS[status]}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+            f"\r\n")
+    writer.write(head.encode("latin-1") + body)
+    await writer.drain()
+
+
+# start_service: PuzzleService (str) (int) (str) -> Server
+# Recibe un PuzzleService y empieza a atender pedidos en host y port, o en el
+# socket Unix unix_path si se indica. Devuelve el servidor de asyncio.
+async def start_service(service, host=HOST, port=PORT, unix_path=None):
+    if unix_path is not None:
+        return await asyncio.start_unix_server(service.handle_connection,
+                                               unix_path)
+    return await asyncio.start_server(service.handle_connection, host, port)
+
+
+# serve: Namespace -> None
+# Recibe los argumentos de la línea de comandos y atiende pedidos hasta que
+# se interrumpe el programa.
+async def serve(args):
+    service = PuzzleService(args.processes, args.batch_size, args.batch_delay,
+                            args.timeout, args.max_concurrency,
+                            args.solve_chunk_size)
+    server = await start_service(service, args.host, args.port, args.unix)
+    for socket in server.sockets:
+        print(f"Escuchando en {socket.getsockname()}", flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+# main: list(str) -> int
+# Recibe los argumentos de la línea de comandos, corre el servicio y devuelve
+# el código de salida.
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--unix", default=None)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--batch-delay", type=float, default=BATCH_DELAY)
+    parser.add_argument("--timeout", type=float, default=TIMEOUT)
+    parser.add_argument("--max-concurrency", type=int,
+                        default=MAX_CONCURRENCY)
+    parser.add_argument("--solve-chunk-size", type=int,
+                        default=SOLVE_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
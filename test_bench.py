@@ -0,0 +1,109 @@
+#!usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import json
+
+# Importamos las funciones que vamos a testear
+from bench import load_words, sample_wordlist, time_function, summarize_times
+from bench import run_benchmarks, compare_results, main
+from main import get_word_conflicts, get_word_containers
+
+
+def test_load_words():
+    words = load_words()
+
+    assert(len(words) == len(set(words)))
+    assert("" not in words)
+    assert("AD HOC" not in words)
+
+
+def test_sample_wordlist():
+    words = load_words()
+
+    assert(sample_wordlist(words, 10, 1) == sample_wordlist(words, 10, 1))
+    assert(sample_wordlist(words, 10, 1) != sample_wordlist(words, 10, 2))
+    assert(len(sample_wordlist(words[:5], 10, 1)) == 5)
+
+    wordlist = sample_wordlist(words, 300, 1)
+    assert(len(set(wordlist)) == 300)
+    assert(get_word_conflicts(get_word_containers(wordlist)) == {})
+
+
+def test_time_function():
+    calls = []
+    times = time_function(lambda: calls.append(1), 5, warmup=2)
+    # Una llamada tan rápida se junta con otras en cada medición
+    assert(len(times) == 5 and len(calls) > 2 + 5)
+    assert(all(seconds >= 0 for seconds in times))
+
+    calls = []
+    assert(len(time_function(lambda: calls.append(1), 3, warmup=0)) == 3)
+    assert(len(calls) == 3)
+
+
+def test_summarize_times():
+    assert(summarize_times([1.0, 1.5, 9.0, 1.25, 0.75]) ==
+           {"median": 1.25, "mad": 0.25})
+    assert(summarize_times([2.0]) == {"median": 2.0, "mad": 0})
+
+
+def test_run_benchmarks():
+    bench_results = run_benchmarks([10], [1.0, 2.0], seed=1, repeat=1,
+                                   warmup=0)
+    names = [name.split("/")[0] for name in bench_results["results"]]
+
+    assert(bench_results["seed"] == 1)
+    assert(bench_results["repeat"] == 1)
+    assert(bench_results["warmup"] == 0)
+    assert(names == ["generate_word_placements", "generate_word_placements",
+                     "create_soup", "find_word_placement",
+                     "find_every_word_placement", "find_word_placements",
+                     "parse_soups"])
+    assert(bench_results["processes"] == 1)
+    assert(all(result["median"] >= 0 and result["mad"] == 0
+               for result in bench_results["results"].values()))
+
+    # Las mediciones se reparten entre los procesos
+    bench_results = run_benchmarks([10], [1.0], seed=1, repeat=3, warmup=0,
+                                   processes=2)
+    assert(bench_results["processes"] == 2)
+    assert(len(bench_results["results"]) == 6)
+    assert(all(result["median"] > 0
+               for result in bench_results["results"].values()))
+
+
+def test_compare_results():
+    def results(**medians):
+        return {"results": {name: {"median": median, "mad": mad}
+                            for name, (median, mad) in medians.items()}}
+
+    baseline = results(a=(1.0, 0.01), b=(1.0, 0.01), c=(0.001, 0.0005))
+    # c es 50% más lento, pero la diferencia está dentro del ruido medido
+    current = results(a=(1.2, 0.01), b=(1.3, 0.01), c=(0.0015, 0.0005),
+                      d=(5.0, 0))
+
+    assert(compare_results(current, baseline, 0.25) == [("b", 1.0, 1.3)])
+    assert(compare_results(current, baseline, 0.1) == [("a", 1.0, 1.2),
+                                                       ("b", 1.0, 1.3)])
+    assert(compare_results(current, baseline, 0.1, noise=0) ==
+           [("a", 1.0, 1.2), ("b", 1.0, 1.3), ("c", 0.001, 0.0015)])
+    assert(compare_results(current, baseline, 0.1, noise=20) == [])
+
+
+def test_main(tmp_path):
+    baseline_path = tmp_path / "baseline.json"
+    output_path = tmp_path / "output.json"
+    arguments = ["--word-counts", "10", "--size-factors", "1", "--repeat",
+                 "1", "--warmup", "0", "--baseline", str(baseline_path),
+                 "--output", str(output_path)]
+
+    assert(main(arguments + ["--update-baseline"]) == 0)
+    assert(baseline_path.exists())
+    assert(not output_path.exists())
+
+    assert(main(arguments + ["--threshold", "1000"]) == 0)
+    with open(output_path, "r") as f:
+        bench_results = json.load(f)
+    with open(baseline_path, "r") as f:
+        baseline = json.load(f)
+    assert(set(bench_results["results"]) == set(baseline["results"]))
@@ -0,0 +1,86 @@
+#!usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import io
+import pytest
+
+# Importamos las funciones que vamos a testear
+from corpus import write_corpus, Corpus, CorpusFormatError
+from corpus import text_to_corpus, corpus_to_text, main
+from main import Grid, parse_soups, generate_soups
+
+
+def test_write_corpus(tmp_path):
+    wordlist = ["PERRO", "GATO", "ÑANDU"]
+    soups = list(generate_soups(wordlist, 5, seed=1, processes=1))
+    word_placements = dict(soups[0][2])
+    del word_placements["GATO"]
+
+    path = tmp_path / "sopas.corpus"
+    with open(path, "wb") as f:
+        assert(write_corpus(f, [(soup, wordlist, placements)
+                                for _, soup, placements in soups] +
+                           [(soups[0][1], wordlist, word_placements),
+                            (soups[1][1].to_rows(), wordlist)]) == 7)
+
+    with open(path, "rb") as f, Corpus(f) as corpus:
+        assert(len(corpus) == 7)
+        for index, (_, soup, placements) in enumerate(soups):
+            assert(corpus[index] == (soup, wordlist, placements))
+        assert(corpus[5] == (soups[0][1], wordlist, word_placements))
+        assert(corpus[-1] == (soups[1][1], wordlist, None))
+        assert(type(corpus[6][0]) == Grid)
+        assert(len(list(corpus)) == 7)
+        with pytest.raises(IndexError):
+            corpus[7]
+
+
+def test_corpus_format_error(tmp_path):
+    path = tmp_path / "sopas.corpus"
+
+    for data in [b"", b"SOPA", b"NOPE" + bytes(20)]:
+        path.write_bytes(data)
+        with open(path, "rb") as f:
+            with pytest.raises(CorpusFormatError):
+                Corpus(f)
+
+    with open(path, "wb") as f:
+        write_corpus(f, [(Grid.from_rows([["A"]]), ["A"])])
+    path.write_bytes(path.read_bytes()[:-1])
+    with open(path, "rb") as f:
+        with pytest.raises(CorpusFormatError):
+            Corpus(f)
+
+
+def test_text_to_corpus(tmp_path):
+    path = tmp_path / "sopas.corpus"
+    with open("sopas.txt", "r") as f:
+        soups = parse_soups(f)
+    with open("sopas.txt", "r") as text_file, open(path, "wb") as f:
+        assert(text_to_corpus(text_file, f) == len(soups))
+
+    with open(path, "rb") as f, Corpus(f) as corpus:
+        assert([(soup, wordlist) for soup, wordlist, _ in corpus] == soups)
+        assert(corpus[3][2] is None)
+
+    text = io.StringIO()
+    with open(path, "rb") as f:
+        assert(corpus_to_text(f, text) == len(soups))
+    text.seek(0)
+    assert(parse_soups(text) == soups)
+
+
+def test_main(tmp_path):
+    corpus_path = tmp_path / "sopas.corpus"
+    text_path = tmp_path / "sopas.txt"
+
+    assert(main(["pack", "test_sopas.txt", str(corpus_path)]) == 0)
+    assert(main(["unpack", str(corpus_path), str(text_path)]) == 0)
+    with open("test_sopas.txt", "r") as f:
+        assert(text_path.read_text() == f.read())
+
+    with open(corpus_path, "rb") as f, Corpus(f) as corpus:
+        soup, wordlist, word_placements = corpus[0]
+    assert(wordlist[0] == "ESTO")
+    assert(soup[0, 1] == "Ñ")
+    assert(word_placements is None)
@@ -0,0 +1,146 @@
+#!usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import io
+import pytest
+from collections import Counter
+from random import Random
+
+# Importamos las funciones que vamos a testear
+from dictionary import Dictionary, find_closest_length, sample_wordlists, main
+from main import calculate_soup_size, iter_wordlists, create_soup
+from main import get_word_conflicts, get_word_containers
+
+
+# has_conflicts: list(str) -> bool
+# Devuelve si alguna palabra de la lista es imposible que aparezca una sola
+# vez en una sopa.
+def has_conflicts(wordlist):
+    return bool(get_word_conflicts(get_word_containers(wordlist)))
+
+
+with open("dictionary.txt", "r") as f:
+    dictionary = Dictionary.from_file(f)
+
+
+def test_dictionary():
+    words = Dictionary(["gato", "PERRO", "Gato", "ÑANDU", "A", "G4TO", "OSO",
+                        "TOGA"])
+    assert(list(words) == ["OSO", "GATO", "TOGA", "PERRO", "ÑANDU"])
+    assert(len(words) == 5)
+    assert(words.length_offsets == [0, 0, 0, 0, 1, 3, 5])
+    assert("GATO" in words)
+    assert("GATOS" not in words)
+    assert("A" not in words)
+
+    assert(words.get_range(4, 4) == (1, 3))
+    assert(words.get_range(2) == (0, 5))
+    assert(words.get_range(6, 10) == (5, 5))
+    assert(list(words.get_candidates(4)) == ["GATO", "TOGA", "PERRO",
+                                             "ÑANDU"])
+    assert(list(words.get_candidates(2, 4, "t")) == ["TOGA"])
+    assert(list(words.get_candidates(2, None, "Ñ")) == ["ÑANDU"])
+    assert(len(words.get_candidates(2, None, "Z")) == 0)
+
+    assert(words.get_anagrams("toga") == ["GATO", "TOGA"])
+    assert(words.get_anagrams("PERO") == [])
+
+
+def test_sample():
+    rng = Random(1)
+    wordlist = dictionary.sample(20, 4, 6, rng=rng)
+    assert(len(set(wordlist)) == 20)
+    assert(all(4 <= len(word) <= 6 and word in dictionary
+               for word in wordlist))
+    assert(dictionary.sample(20, 4, 6, rng=Random(1)) == wordlist)
+
+    assert(all(word[0] == "C"
+               for word in dictionary.sample(5, first_letter="c", rng=rng)))
+    assert(dictionary.sample(1, 14, rng=rng) == [dictionary.words[-1]])
+    with pytest.raises(ValueError):
+        dictionary.sample(2, 14)
+
+    # Las palabras de cada lista pueden estar juntas en una sopa
+    for _ in range(50):
+        assert(not has_conflicts(dictionary.sample(100, rng=rng)))
+
+
+def test_replace_conflicting_words():
+    words = Dictionary(["ANA", "BANANA", "OSO", "GATO", "PERRO", "ASA"])
+    rng = Random(1)
+    wordlist = words.replace_conflicting_words(["ANA", "BANANA", "GATO"],
+                                               rng)
+    assert(len(wordlist) == 3 and not has_conflicts(wordlist))
+    assert({"BANANA", "GATO"} < set(wordlist))
+    # Reemplaza a ANA por otra palabra del mismo largo
+    assert(len(set(wordlist) - {"BANANA", "GATO"} - {"OSO", "ASA"}) == 0)
+
+    wordlist = words.replace_conflicting_words(
+        ["ANA", "BANANA", "GATO"], rng, words.get_candidates(5))
+    assert("PERRO" in wordlist and "ANA" not in wordlist)
+
+    with pytest.raises(ValueError):
+        Dictionary(["ANA", "BANANA"]).replace_conflicting_words(
+            ["ANA", "BANANA"], rng)
+
+
+def test_sample_total_letters():
+    rng = Random(1)
+    for count, total in [(10, 50), (30, 95), (5, 60)]:
+        wordlist = dictionary.sample_total_letters(count, total, rng=rng)
+        assert(len(set(wordlist)) == count)
+        assert(sum(len(word) for word in wordlist) == total)
+        assert(not has_conflicts(wordlist))
+
+    assert(dictionary.get_total_letters_range(2, 13) == (26, 27))
+    with pytest.raises(ValueError):
+        dictionary.sample_total_letters(2, 28, 13)
+
+
+def test_sample_for_size():
+    rng = Random(1)
+    for count, size in [(5, 10), (8, 11), (10, 13), (30, 20), (100, 40)]:
+        for _ in range(20):
+            wordlist = dictionary.sample_for_size(count, size, rng)
+            assert(len(set(wordlist)) == count)
+            assert(calculate_soup_size(wordlist) == size)
+            assert(not has_conflicts(wordlist))
+
+    with pytest.raises(ValueError):
+        dictionary.sample_for_size(20, 8)
+    with pytest.raises(ValueError):
+        dictionary.sample_for_size(21, 15)
+
+
+def test_find_closest_length():
+    available = {3: 1, 4: 2, 6: 1}
+    used = Counter({4: 2})
+    assert(find_closest_length(3, 5, available, used) is None)
+    assert(find_closest_length(3, 7, available, used) == 6)
+    assert(find_closest_length(6, 2, available, used) == 3)
+    assert(find_closest_length(6, 4, available, used) is None)
+
+
+def test_sample_wordlists():
+    wordlists = list(sample_wordlists(dictionary, 5, 30, size=20, seed=1))
+    assert(len(wordlists) == 5)
+    assert(all(calculate_soup_size(wordlist) == 20 for wordlist in wordlists))
+    # Se puede generar una sopa con cada lista
+    for wordlist in sample_wordlists(dictionary, 20, 40, seed=3):
+        assert(len(create_soup(wordlist)[1]) == 40)
+    assert(list(sample_wordlists(dictionary, 5, 30, size=20, seed=1))
+           == wordlists)
+
+
+def test_main():
+    out = io.StringIO()
+    assert(main(["dictionary.txt", "--lists", "3", "--count", "4", "--size",
+                 "12", "--seed", "1"], out) == 0)
+    out.seek(0)
+    wordlists = list(iter_wordlists(out))
+    assert(len(wordlists) == 3)
+    assert(all(len(wordlist) == 4 and calculate_soup_size(wordlist) == 12
+               for wordlist in wordlists))
+
+    assert(main(["dictionary.txt", "--count", "20", "--size", "8"],
+                io.StringIO()) == 1)
@@ -1,22 +1,92 @@
 #!usr/bin/python3
 # -*- coding: utf-8 -*-
 
+import io
+import json
 import pytest
-from random import shuffle, seed
+from random import Random, shuffle, seed
+from time import monotonic
 
 
 # Importamos las funciones que vamos a testear
 from main import Orientation, get_wordlist_input, is_wordlist_valid
+from main import Grid, as_grid, Placement
 from main import generate_soup, calculate_soup_size, generate_word_placements
+from main import create_soup, generate_soups
+from main import solve_soups, iter_chunks, format_solve_result, find_solution
+from main import create_solve_cache, close_solve_cache, get_solve_key
+from main import generate_word_placements_growing
 from main import try_to_place, is_placement_valid, get_letter_positions
+from main import random_placements, get_placement_ranges
+from main import ORIENTATION_STEPS, get_orientation
+from main import create_occupancy, place_word, unplace_word
 from main import create_soup_matrix, random_letter, display_soup, color_soup
+from main import render_soup, get_highlighted_cells
+from main import random_letters, make_word_occurrences_unique
+from main import get_contained_words, remove_conflicting_words
+from main import get_contained_placements, get_placement_from_cells
+from main import remove_fixed_duplicates, get_line_window, SoupGenerationError
 from main import solve_soup, find_word_placement, find_first_letter_candidates
-from main import parse_soups
+from main import parse_soups, format_soup, iter_soups, SoupFormatError
+from main import iter_wordlists, iter_json_soups, normalize_wordlist
+from main import format_generated_soup, main
+from main import find_all_word_placements, find_word_placements
+from main import get_soup_lines, get_line_starts, get_line_start
+from main import iter_grid_lines, get_line_directions
+from main import get_letter_index, get_bigram_index
+from main import get_bitboards, find_word_starts, find_every_word_placement
+from main import get_soup_array, find_word_placement_numpy
+from main import find_word_placements_numpy, use_numpy_backend
+from main import NUMPY_MIN_SIZE, NUMPY_MAX_WORDS
 
 with open("dictionary.txt", "r") as f:
     dictionary = f.read().split("\n")
 
 
+def test_grid():
+    rows = [["A", "B", "C"],
+            ["D", "Ñ", "F"],
+            ["G", "H", "I"]]
+    grid = Grid.from_rows(rows)
+
+    assert(grid.size == 3)
+    assert(grid.data == bytearray(b"ABCD\xd1FGHI"))
+    assert(grid.to_rows() == rows)
+    assert(grid == rows)
+    assert(grid == Grid(3, b"ABCD\xd1FGHI"))
+    assert(as_grid(grid) is grid)
+    assert(as_grid(rows) == grid)
+
+    assert(grid[1, 1] == "Ñ")
+    assert(grid[1] == "DÑF")
+    assert(grid.rows() == ["ABC", "DÑF", "GHI"])
+    assert(bytes(grid.row(2)) == b"GHI")
+    assert(bytes(grid.column(1)) == b"B\xd1H")
+    assert(bytes(grid.diagonal(0)) == b"A\xd1I")
+    assert(bytes(grid.diagonal(1)) == b"BF")
+    assert(bytes(grid.diagonal(-2)) == b"G")
+
+    assert(bytes(grid.line(0, 2, 1, -1)) == b"C\xd1G")
+    assert(bytes(grid.line(2, 2, -1, -1)) == b"I\xd1A")
+    assert(bytes(grid.line(1, 2, 0, -1)) == b"F\xd1D")
+    assert(bytes(grid.line(3, 0, 0, 1)) == b"")
+    assert(bytes(grid.line(0, 0, 1, -1)) == b"A")
+
+    # En una sopa de 1x1 todas las líneas tienen la única letra
+    single = Grid.from_rows([["A"]])
+    assert([bytes(line) for line, *_ in iter_grid_lines(single)]
+           == [b"A"] * len(get_line_directions()))
+
+    grid[2, 0] = "Ñ"
+    assert(grid[2] == "ÑHI")
+    assert(bytes(grid.column(0)) == b"AD\xd1")
+
+    with pytest.raises(ValueError):
+        Grid.from_rows([["A", "B"], ["C"]])
+    with pytest.raises(ValueError):
+        Grid(2, b"ABC")
+
+
 def test_is_wordlist_valid():
     valid_wordlist = ["PERRO", "GATO", "AUSTRALIA"]
     invalid_wordlist_not_uppercase = ["perro", "gato", "australia"]
@@ -34,14 +104,216 @@ def test_generate_soup():
 
     for _ in range(100):
         shuffle(dictionary)
-        wordlist = dictionary[:n_words]
+        wordlist = remove_conflicting_words(dictionary[:n_words])
         soup = generate_soup(wordlist)
 
-        assert(type(soup) == list)
+        assert(type(soup) == Grid)
         assert(all([type(row) == list for row in soup]))
         assert(all([type(letter) == str for row in soup for letter in row]))
 
 
+def test_create_soup():
+    wordlist = ["PERRO", "GATO", "AUSTRALIA"]
+    soup, word_placements = create_soup(wordlist)
+
+    assert(len(soup) == calculate_soup_size(wordlist))
+    assert(all(find_word_placement(word, soup) for word in wordlist))
+    assert(set(word_placements) == set(wordlist))
+
+    # Cada palabra aparece una sola vez, aunque esté dentro de otra
+    wordlist = ["GIRASOL", "SOL", "LOS", "ROMA", "AMOR", "OSO", "RAS"]
+    for _ in range(20):
+        soup, word_placements = create_soup(wordlist)
+        assert(list(word_placements) == wordlist)
+        assert_unique_occurrences(soup, word_placements)
+
+    with pytest.raises(SoupGenerationError):
+        create_soup(["ANA", "BANANA"])
+    with pytest.raises(SoupGenerationError):
+        create_soup(["ONE", "STONE", "PHONE"])
+
+    with pytest.raises(TimeoutError):
+        create_soup(["PERRO", "GATO"], timeout=0)
+    assert(len(create_soup(["PERRO", "GATO"], timeout=10)[1]) == 2)
+
+
+# assert_unique_occurrences: sopa_de_letras word_placements -> None
+# Verifica que cada palabra aparece en la sopa solo en su placement (leerla
+# al revés en las mismas celdas no cuenta como otra aparición).
+def assert_unique_occurrences(soup, word_placements):
+    found = find_all_word_placements(soup, list(word_placements))
+    for word, placement in word_placements.items():
+        cells = {frozenset(other.positions(len(word)))
+                 for other in found[word]}
+        assert(cells == {frozenset(placement.positions(len(word)))})
+
+
+def test_get_contained_words():
+    wordlist = ["GIRASOL", "SOL", "LOS", "ROMA", "AMOR", "OSO"]
+    assert(get_contained_words(wordlist) == {
+        "SOL": ("GIRASOL", 4, False),
+        "LOS": ("GIRASOL", 4, True),
+        "AMOR": ("ROMA", 0, True)
+    })
+    assert(get_contained_words(["PERRO", "GATO"]) == {})
+
+    # Un palíndromo dentro de otra palabra es una sola aparición
+    assert(get_contained_words(["OSO", "OSOS"]) == {"OSO": ("OSOS", 0, False)})
+
+    with pytest.raises(SoupGenerationError):
+        get_contained_words(["ANA", "BANANA"])
+    with pytest.raises(SoupGenerationError):
+        get_contained_words(["ONE", "STONE", "PHONE"])
+
+    assert(remove_conflicting_words(["BANANA", "ANA", "ONE", "STONE",
+                                     "PHONE", "SOL", "GIRASOL", "SOL"])
+           == ["BANANA", "STONE", "PHONE", "SOL", "GIRASOL"])
+
+
+def test_get_contained_placements():
+    word_placements = {
+        "GIRASOL": Placement(0, 0, Orientation.HORIZONTAL_REVERSED),
+        "ROMA": Placement(1, 0, Orientation.DIAGONAL)
+    }
+    contained_words = get_contained_words(["GIRASOL", "SOL", "LOS", "ROMA",
+                                           "AMOR"])
+    contained_placements = get_contained_placements(contained_words,
+                                                    word_placements)
+    assert(contained_placements == {
+        "SOL": Placement(0, 0, Orientation.HORIZONTAL_REVERSED),
+        "LOS": Placement(0, 0, Orientation.HORIZONTAL),
+        "AMOR": Placement(1, 0, Orientation.DIAGONAL_REVERSED)
+    })
+
+    soup = create_soup_matrix(7, {**word_placements, **contained_placements},
+                              unique=False)
+    for word, placement in contained_placements.items():
+        assert(find_word_placement(word, soup) in
+               [placement, get_placement_from_cells(
+                   placement.positions(len(word))[::-1])])
+
+
+def test_get_placement_from_cells():
+    assert(get_placement_from_cells(((0, 0), (0, 1), (0, 2)))
+           == Placement(0, 0, Orientation.HORIZONTAL))
+    assert(get_placement_from_cells(((0, 2), (0, 1), (0, 0)))
+           == Placement(0, 0, Orientation.HORIZONTAL_REVERSED))
+    assert(get_placement_from_cells(((2, 0), (1, 1)))
+           == Placement(1, 1, Orientation.ANTIDIAGONAL_REVERSED))
+    assert(get_placement_from_cells(((3, 3), (2, 2), (1, 1)))
+           == Placement(1, 1, Orientation.DIAGONAL_REVERSED))
+
+
+def test_remove_fixed_duplicates():
+    # AB y CD, una debajo de la otra, forman AC en la primera columna
+    word_placements = {
+        "AB": Placement(0, 0, Orientation.HORIZONTAL),
+        "CD": Placement(1, 0, Orientation.HORIZONTAL),
+        "AC": Placement(3, 0, Orientation.HORIZONTAL)
+    }
+    assert(remove_fixed_duplicates(dict(word_placements), {}, 4,
+                                   max_rounds=1) is False)
+    assert(remove_fixed_duplicates(word_placements, {}, 4))
+    soup = create_soup_matrix(4, word_placements, {"Ñ": 1}, unique=False)
+    assert_unique_occurrences(soup, word_placements)
+
+    # Las palabras contenidas en otras se mueven junto con ellas
+    # (GIRASOL y OX forman GO en la primera columna)
+    word_placements = {"GIRASOL": Placement(0, 0, Orientation.HORIZONTAL),
+                       "OX": Placement(1, 0, Orientation.HORIZONTAL),
+                       "GO": Placement(3, 0, Orientation.HORIZONTAL)}
+    contained_words = {"SOL": ("GIRASOL", 4, False)}
+    assert(remove_fixed_duplicates(word_placements, contained_words, 7))
+    word_placements.update(get_contained_placements(contained_words,
+                                                    word_placements))
+    soup = create_soup_matrix(7, word_placements, {"Ñ": 1}, unique=False)
+    assert_unique_occurrences(soup, word_placements)
+
+    # Si ya pasó el deadline no sigue buscando
+    word_placements = {"AB": Placement(0, 0, Orientation.HORIZONTAL)}
+    with pytest.raises(TimeoutError):
+        remove_fixed_duplicates(word_placements, {}, 4,
+                                deadline=monotonic() - 1)
+    assert(remove_fixed_duplicates(word_placements, {}, 4,
+                                   deadline=monotonic() + 10))
+
+
+def test_get_line_window():
+    grid = Grid.from_rows(["ABCDE", "FGHIJ", "KLMNO", "PQRST", "UVWXY"])
+    line, row, col, drow, dcol = get_line_window(grid, 2, 2, 0, 1, 2)
+    assert(bytes(line) == b"LMN" and (row, col) == (2, 1))
+    line, row, col, drow, dcol = get_line_window(grid, 0, 1, 1, 1, 3)
+    assert(bytes(line) == b"BHN" and (row, col, drow, dcol) == (0, 1, 1, 1))
+    line, row, col, _, _ = get_line_window(grid, 3, 1, -1, 1, 9)
+    assert(bytes(line) == b"UQMIE" and (row, col) == (4, 0))
+
+
+def test_generate_soups():
+    wordlist = ["PERRO", "GATO", "AUSTRALIA", "ELECTRON"]
+
+    serial = list(generate_soups(wordlist, 6, seed=1, processes=1))
+    parallel = list(generate_soups(wordlist, 6, seed=1, processes=2,
+                                   max_in_flight=2))
+    unordered = list(generate_soups(wordlist, 6, seed=1, processes=2,
+                                    ordered=False))
+
+    assert([index for index, _, _ in serial] == list(range(6)))
+    assert(serial == parallel)
+    assert(sorted(unordered, key=lambda result: result[0]) == serial)
+    assert(serial != list(generate_soups(wordlist, 6, seed=2, processes=1)))
+
+
+def test_iter_chunks():
+    assert(list(iter_chunks(range(7), 3)) == [[0, 1, 2], [3, 4, 5], [6]])
+    assert(list(iter_chunks([], 3)) == [])
+
+
+def test_solve_soups():
+    with open("sopas.txt", "r") as f:
+        soups = parse_soups(f)
+    soups[1] = (soups[1][0], soups[1][1] + ["PERRO"])
+    soups = soups * 3
+
+    serial = list(solve_soups(soups, processes=1, chunk_size=2))
+    parallel = list(solve_soups(iter(soups), processes=2, chunk_size=2,
+                                max_in_flight=2))
+
+    assert([result["index"] for result in serial] == list(range(15)))
+    assert([result["index"] for result in parallel] == list(range(15)))
+    for result, (soup, wordlist) in zip(serial, soups):
+        assert(result["size"] == len(soup))
+        assert(result["seconds"] >= 0)
+        found = {word: placement
+                 for word, placement in find_solution(soup, wordlist).items()
+                 if placement is not None}
+        assert(result["word_placements"] == found)
+        assert(set(found) | set(result["not_found"]) == set(wordlist))
+        assert(not set(found) & set(result["not_found"]))
+    assert("PERRO" in serial[1]["not_found"])
+    assert([{**result, "seconds": 0} for result in serial]
+           == [{**result, "seconds": 0} for result in parallel])
+
+
+def test_format_solve_result():
+    result = {
+        "index": 3,
+        "size": 4,
+        "seconds": 0.5,
+        "word_placements": {"ÑU": Placement(1, 2, Orientation.VERTICAL)},
+        "not_found": ["SOL"]
+    }
+
+    assert(json.loads(format_solve_result(result)) == {
+        "index": 3,
+        "size": 4,
+        "seconds": 0.5,
+        "word_placements": {"ÑU": {"row": 1, "col": 2,
+                                   "orientation": "VERTICAL"}},
+        "not_found": ["SOL"]
+    })
+    assert("\n" not in format_solve_result(result))
+
+
 def test_calculate_soup_size():
     wordlist_1 = ["PERRO", "ELECTRON", "COMIDA", "RELOJ", "TERMO"]
     wordlist_2 = ["GUINNESS", "QUILMES", "STELLA", "SANTAFE"]
@@ -71,7 +343,111 @@ def test_generate_word_placements():
 
         assert(type(word_placements) == dict)
         assert(all([type(key) == str for key in word_placements]))
-        assert(all([type(val) == dict for val in word_placements.values()]))
+        assert(all([type(val) == Placement
+                    for val in word_placements.values()]))
+
+
+def test_generate_word_placements_backtracking():
+    # Las palabras llenan toda la sopa, por lo que casi siempre hay que volver
+    # atrás para ubicarlas.
+    wordlist = ["ABC", "DEF", "GHI", "ADG"]
+    word_placements = generate_word_placements(wordlist, 3)
+    soup = create_soup_matrix(3, word_placements)
+
+    assert(len(word_placements) == 4)
+    assert(all(find_word_placement(word, soup) for word in wordlist))
+
+    # No existe forma de ubicar las palabras
+    assert(generate_word_placements(["ABC", "DEF", "GHI", "XYZ"], 3) is None)
+    assert(generate_word_placements(["ABCD"], 3) is None)
+    assert(generate_word_placements([], 3) == {})
+
+
+def test_generate_word_placements_forward_checking():
+    for _ in range(20):
+        shuffle(dictionary)
+        wordlist = [word for word in dictionary[:20] if len(word) > 1]
+        soup_size = calculate_soup_size(wordlist)
+
+        word_placements = generate_word_placements(wordlist, soup_size,
+                                                   forward_checking=True)
+        occupancy = {}
+        for word, placement in word_placements.items():
+            assert(is_placement_valid(word, placement, {}, soup_size,
+                                      occupancy))
+            place_word(word, placement, occupancy)
+        assert(set(word_placements) == set(wordlist))
+
+    wordlist = ["ABC", "DEF", "GHI", "ADG"]
+    word_placements = generate_word_placements(wordlist, 3,
+                                               forward_checking=True)
+    assert(len(word_placements) == 4)
+
+    assert(generate_word_placements(["ABC", "DEF", "GHI", "XYZ"], 3,
+                                    forward_checking=True) is None)
+    assert(generate_word_placements(["ABCD"], 3,
+                                    forward_checking=True) is None)
+
+    # Encuentra una solución exactamente cuando la búsqueda común la encuentra
+    rng = Random(5)
+    for _ in range(300):
+        size = rng.choice([3, 4])
+        wordlist = list({"".join(rng.choice("AB")
+                                 for _ in range(rng.randint(2, size)))
+                         for _ in range(rng.randint(1, 6))})
+        word_placements = generate_word_placements(wordlist, size,
+                                                   forward_checking=True)
+        assert((word_placements is None) ==
+               (generate_word_placements(wordlist, size) is None))
+        if word_placements is not None:
+            occupancy = {}
+            for word, placement in word_placements.items():
+                assert(is_placement_valid(word, placement, {}, size,
+                                          occupancy))
+                place_word(word, placement, occupancy)
+
+    # Con listas comunes y largas no se queda manteniendo los dominios
+    wordlist = remove_conflicting_words(
+        [word for word in dictionary if len(word) > 1][:200])
+    assert(generate_word_placements(wordlist,
+                                    calculate_soup_size(wordlist),
+                                    forward_checking=True, timeout=5))
+
+
+def test_generate_word_placements_budget():
+    wordlist = ["ABC", "DEF", "GHI", "XYZ"]
+
+    assert(generate_word_placements(wordlist, 6, max_nodes=2) is None)
+    assert(generate_word_placements(wordlist, 6, max_nodes=4))
+    assert(generate_word_placements(wordlist, 6, forward_checking=True,
+                                    max_nodes=2) is None)
+    assert(generate_word_placements(wordlist, 6, timeout=-1) is None)
+
+
+def test_generate_word_placements_growing():
+    wordlist = ["ABC", "DEF", "GHI", "XYZ"]
+
+    word_placements, size, attempts = generate_word_placements_growing(
+        wordlist, 3)
+    assert(size == 4)
+    assert(attempts == 2)
+    assert(set(word_placements) == set(wordlist))
+
+    word_placements, size, attempts = generate_word_placements_growing(
+        wordlist, 2, grow=lambda size: size + 2)
+    assert((size, attempts) == (4, 2))
+
+    word_placements, size, attempts = generate_word_placements_growing(
+        wordlist, 6, max_nodes=2, max_attempts=3)
+    assert((word_placements, size, attempts) == (None, 8, 3))
+
+    # Ningún intento empieza después de deadline
+    word_placements, size, attempts = generate_word_placements_growing(
+        wordlist, 3, deadline=monotonic())
+    assert((word_placements, size, attempts) == (None, 3, 0))
+    word_placements, size, attempts = generate_word_placements_growing(
+        wordlist, 3, timeout=None, deadline=monotonic() + 10)
+    assert((size, attempts) == (4, 2))
 
 
 def test_try_to_place():
@@ -79,77 +455,27 @@ def test_try_to_place():
     case_1 = [
         "WORD",
         {},
-        0,
-        []
+        0
     ]
 
     # Debería devolver un placement, porque existen placements posibles
     case_2 = [
         "WORD",
         {
-            "PERRO": {
-                "row": 2,
-                "col": 3,
-                "orientation": Orientation.HORIZONTAL
-            }
+            "PERRO": Placement(2, 3, Orientation.HORIZONTAL)
         },
-        10,
-        []
+        10
     ]
 
-    # Debería devolver False, porque las únicas posiciones disponibles están
-    # prohibidas por el último argumento.
+    # Debería devolver False, porque todas las posiciones están ocupadas por
+    # letras distintas a las de "CD".
     case_3 = [
-        "CCC",
+        "CD",
         {
-            "AAA": {
-                "row": 0,
-                "col": 0,
-                "orientation": Orientation.HORIZONTAL
-            },
-            "BBB": {
-                "row": 1,
-                "col": 0,
-                "orientation": Orientation.HORIZONTAL
-            }
+            "AB": Placement(0, 0, Orientation.HORIZONTAL),
+            "EF": Placement(1, 0, Orientation.HORIZONTAL)
         },
-        3,
-        [
-            {
-                "AAA": {
-                    "row": 0,
-                    "col": 0,
-                    "orientation": Orientation.HORIZONTAL
-                },
-                "BBB": {
-                    "row": 1,
-                    "col": 0,
-                    "orientation": Orientation.HORIZONTAL
-                },
-                "CCC": {
-                    "row": 2,
-                    "col": 0,
-                    "orientation": Orientation.HORIZONTAL
-                }
-            },
-            {
-                "AAA": {
-                    "row": 0,
-                    "col": 0,
-                    "orientation": Orientation.HORIZONTAL
-                },
-                "BBB": {
-                    "row": 1,
-                    "col": 0,
-                    "orientation": Orientation.HORIZONTAL
-                },
-                "CCC": {
-                    "row": 2,
-                    "col": 0,
-                    "orientation": Orientation.HORIZONTAL_REVERSED
-                }
-            }
-        ]
+        2
     ]
 
     assert(try_to_place(*case_1) is False)
@@ -157,59 +483,114 @@ def test_try_to_place():
     assert(try_to_place(*case_3) is False)
 
 
+def test_placement():
+    placement = Placement(2, 5, Orientation.VERTICAL_REVERSED)
+    old_placement = {
+        "row": 2,
+        "col": 5,
+        "orientation": Orientation.VERTICAL_REVERSED
+    }
+
+    assert(placement.to_dict() == old_placement)
+    assert(Placement.from_dict(old_placement) == placement)
+    assert(placement.step == (1, 0, True))
+    assert(placement.positions(3) == ((2, 5), (3, 5), (4, 5)))
+    assert(len({placement, Placement(2, 5, Orientation.VERTICAL_REVERSED),
+                Placement(2, 5, Orientation.VERTICAL)}) == 2)
+
+
+def test_random_placements():
+    size = 6
+
+    for word_length in [1, 3, 6, 7]:
+        placements = list(random_placements(word_length, size))
+        expected = {Placement(row, col, orientation)
+                    for row in range(size)
+                    for col in range(size)
+                    for orientation in Orientation
+                    if is_placement_valid("A" * word_length,
+                                          Placement(row, col, orientation),
+                                          {}, size)}
+
+        assert(len(placements) == len(set(placements)))
+        assert(set(placements) == expected)
+
+
+def test_get_placement_ranges():
+    assert(get_placement_ranges(4, 10, Orientation.HORIZONTAL)
+           == (range(0, 10), range(0, 7)))
+    assert(get_placement_ranges(4, 10, Orientation.DIAGONAL_REVERSED)
+           == (range(0, 7), range(0, 7)))
+    assert(get_placement_ranges(4, 10, Orientation.ANTIDIAGONAL)
+           == (range(0, 7), range(3, 10)))
+    assert(len(get_placement_ranges(12, 10, Orientation.ANTIDIAGONAL)[0])
+           == 0)
+
+
+def test_orientation_steps():
+    assert(len(ORIENTATION_STEPS) == len(Orientation) == 8)
+    for orientation, (drow, dcol, is_reversed) in ORIENTATION_STEPS.items():
+        assert(get_orientation(drow, dcol, is_reversed) == orientation)
+    assert(get_orientation(0, -1, False) is None)
+
+
 def test_is_placement_valid():
     word = "PERRO"
     word_placements = {
-        "GATO": {
-            "row": 2,
-            "col": 2,
-            "orientation": Orientation.DIAGONAL
-        },
-        "AUTO": {
-            "row": 6,
-            "col": 0,
-            "orientation": Orientation.HORIZONTAL_REVERSED
-        }
+        "GATO": Placement(2, 2, Orientation.DIAGONAL),
+        "AUTO": Placement(6, 0, Orientation.HORIZONTAL_REVERSED)
     }
     size = 8
 
-    placement_1 = {
-        "row": 0,
-        "col": 0,
-        "orientation": Orientation.HORIZONTAL
-    }
+    placement_1 = Placement(0, 0, Orientation.HORIZONTAL)
 
-    placement_2 = {
-        "row": 6,
-        "col": 6,
-        "orientation": Orientation.DIAGONAL
-    }
+    placement_2 = Placement(6, 6, Orientation.DIAGONAL)
 
-    placement_3 = {
-        "row": 1,
-        "col": 5,
-        "orientation": Orientation.VERTICAL
-    }
+    placement_3 = Placement(1, 5, Orientation.VERTICAL)
 
-    placement_4 = {
-        "row": 1,
-        "col": 2,
-        "orientation": Orientation.VERTICAL_REVERSED
-    }
+    placement_4 = Placement(1, 2, Orientation.VERTICAL_REVERSED)
+
+    placement_5 = Placement(0, 3, Orientation.ANTIDIAGONAL)
+
+    placement_6 = Placement(0, 7, Orientation.ANTIDIAGONAL_REVERSED)
 
     assert(is_placement_valid(word, placement_1, word_placements, size))
     assert(not is_placement_valid(word, placement_2, word_placements, size))
     assert(is_placement_valid(word, placement_3, word_placements, size))
     assert(not is_placement_valid(word, placement_4, word_placements, size))
+    assert(not is_placement_valid(word, placement_5, word_placements, size))
+    assert(is_placement_valid(word, placement_6, word_placements, size))
+
+
+def test_occupancy():
+    word_placements = {
+        "GATO": Placement(0, 0, Orientation.HORIZONTAL),
+        "TOMATE": Placement(0, 2, Orientation.VERTICAL)
+    }
+    occupancy = create_occupancy(word_placements)
+
+    assert(occupancy[(0, 0)] == ["G", 1])
+    assert(occupancy[(0, 2)] == ["T", 2])
+    assert(occupancy[(5, 2)] == ["E", 1])
+    assert(len(occupancy) == 9)
+
+    placement = Placement(2, 1, Orientation.HORIZONTAL)
+    assert(is_placement_valid("AMA", placement, {}, 8, occupancy))
+    assert(not is_placement_valid("ASA", placement, {}, 8, occupancy))
+
+    place_word("AMA", placement, occupancy)
+    assert(occupancy[(2, 2)] == ["M", 2])
+
+    unplace_word("AMA", placement, occupancy)
+    unplace_word("GATO", word_placements["GATO"], occupancy)
+    assert(occupancy[(0, 2)] == ["T", 1])
+    assert((0, 0) not in occupancy)
+    assert(len(occupancy) == 6)
 
 
 def test_get_letter_positions():
     word_1 = "PERRO"
-    placement_1 = {
-        "row": 4,
-        "col": 6,
-        "orientation": Orientation.HORIZONTAL
-    }
+    placement_1 = Placement(4, 6, Orientation.HORIZONTAL)
 
     letter_postions_1 = {
         (4, 6): "P",
@@ -220,11 +601,7 @@ def test_get_letter_positions():
     }
 
     word_2 = "GATO"
-    placement_2 = {
-        "row": 0,
-        "col": 0,
-        "orientation": Orientation.DIAGONAL
-    }
+    placement_2 = Placement(0, 0, Orientation.DIAGONAL)
 
     letter_postions_2 = {
         (0, 0): "G",
@@ -234,11 +611,7 @@ def test_get_letter_positions():
     }
 
     word_3 = "ELECTRON"
-    placement_3 = {
-        "row": 9,
-        "col": 5,
-        "orientation": Orientation.VERTICAL_REVERSED
-    }
+    placement_3 = Placement(9, 5, Orientation.VERTICAL_REVERSED)
 
     letter_postions_3 = {
         (9, 5): "N",
@@ -255,39 +628,145 @@ def test_get_letter_positions():
     assert(get_letter_positions(word_2, placement_2) == letter_postions_2)
     assert(get_letter_positions(word_3, placement_3) == letter_postions_3)
 
+    word_4 = "SOL"
+    placement_4 = Placement(0, 2, Orientation.ANTIDIAGONAL)
+
+    letter_postions_4 = {
+        (0, 2): "S",
+        (1, 1): "O",
+        (2, 0): "L"
+    }
+
+    placement_5 = Placement(0, 2, Orientation.ANTIDIAGONAL_REVERSED)
+
+    letter_postions_5 = {
+        (0, 2): "L",
+        (1, 1): "O",
+        (2, 0): "S"
+    }
+
+    placement_6 = Placement(1, 1, Orientation.DIAGONAL_REVERSED)
+
+    letter_postions_6 = {
+        (1, 1): "L",
+        (2, 2): "O",
+        (3, 3): "S"
+    }
+
+    assert(get_letter_positions(word_4, placement_4) == letter_postions_4)
+    assert(get_letter_positions(word_4, placement_5) == letter_postions_5)
+    assert(get_letter_positions(word_4, placement_6) == letter_postions_6)
+
 
 def test_create_soup_matrix():
     size = 8
     word_placements = {
-        "PERRO": {
-            "row": 1,
-            "col": 5,
-            "orientation": Orientation.VERTICAL
-        },
-        "GATO": {
-            "row": 2,
-            "col": 2,
-            "orientation": Orientation.DIAGONAL
-        },
-        "AUTO": {
-            "row": 6,
-            "col": 0,
-            "orientation": Orientation.HORIZONTAL_REVERSED
-        }
+        "PERRO": Placement(1, 5, Orientation.VERTICAL),
+        "GATO": Placement(2, 2, Orientation.DIAGONAL),
+        "AUTO": Placement(6, 0, Orientation.HORIZONTAL_REVERSED)
     }
     soup = create_soup_matrix(size, word_placements)
 
-    assert(type(soup) == list)
-    assert(all([type(row) == list for row in soup]))
+    assert(type(soup) == Grid)
+    assert(len(soup.data) == size * size)
+    assert(all([type(row) == list for row in soup.to_rows()]))
     assert(all([type(letter) == str for row in soup for letter in row]))
 
+    soup = create_soup_matrix(size, word_placements, {"Ñ": 1})
+    letters = [letter for row in soup for letter in row]
+    assert(letters.count("Ñ") == size * size - 12)
+    assert(find_word_placement("PERRO", soup) == word_placements["PERRO"])
+
+
+def test_make_word_occurrences_unique():
+    wordlist = ["SOL", "SOLO", "OSO", "ASA", "SALSA"]
+    letter_weights = {"S": 1, "O": 1, "L": 1, "A": 1}
+
+    for _ in range(20):
+        _, word_placements = create_soup(wordlist)
+        size = calculate_soup_size(wordlist)
+        soup = create_soup_matrix(size, word_placements, letter_weights,
+                                  unique=False)
+        assert(make_word_occurrences_unique(soup, word_placements,
+                                            letter_weights))
+        assert_unique_occurrences(soup, word_placements)
+
+    # Las letras de otras palabras forman otra aparición: no se puede arreglar
+    word_placements = {
+        "ANA": Placement(0, 0, Orientation.HORIZONTAL),
+        "BANANA": Placement(1, 0, Orientation.HORIZONTAL)
+    }
+    soup = create_soup_matrix(6, word_placements, unique=False)
+    assert(not make_word_occurrences_unique(soup, word_placements))
+    with pytest.raises(SoupGenerationError):
+        create_soup_matrix(6, word_placements)
+
+    # Con una sola letra posible no hay forma de evitar otras apariciones
+    word_placements = {"AA": Placement(0, 0, Orientation.HORIZONTAL)}
+    soup = create_soup_matrix(3, word_placements, {"A": 1}, unique=False)
+    assert(not make_word_occurrences_unique(soup, word_placements, {"A": 1},
+                                            max_rounds=3))
+
+    # Si ya pasó el deadline no sigue buscando
+    word_placements = {"AB": Placement(0, 0, Orientation.HORIZONTAL)}
+    soup = create_soup_matrix(3, word_placements, unique=False)
+    with pytest.raises(TimeoutError):
+        make_word_occurrences_unique(soup, word_placements,
+                                     deadline=monotonic() - 1)
+    with pytest.raises(TimeoutError):
+        create_soup_matrix(3, word_placements, deadline=monotonic() - 1)
+    assert(make_word_occurrences_unique(soup, word_placements,
+                                        deadline=monotonic() + 10))
+
 
 def test_random_letter():
     pass
 
 
+def test_random_letters():
+    letters = random_letters(1000)
+    assert(len(letters) == 1000)
+    assert(all(len(letter) == 1 and letter.isupper() for letter in letters))
+
+    letters = random_letters(1000, {"A": 3, "B": 1})
+    assert(set(letters) == {"A", "B"})
+    assert(letters.count("A") > letters.count("B"))
+
+
 def test_display_soup():
-    pass
+    soup = Grid.from_rows([["A", "B"],
+                           ["Ñ", "D"]])
+    word_placements = {"AB": Placement(0, 0, Orientation.HORIZONTAL)}
+
+    output = io.StringIO()
+    display_soup(soup, file=output)
+    assert(output.getvalue() == "\nA B\nÑ D\n\n")
+
+    output = io.StringIO()
+    display_soup(soup, word_placements, file=output)
+    assert(output.getvalue() == render_soup(soup, word_placements))
+    assert(soup == [["A", "B"], ["Ñ", "D"]])
+
+
+def test_render_soup():
+    soup = [["A", "B"],
+            ["Ñ", "D"]]
+    word_placements = {"AB": Placement(0, 0, Orientation.HORIZONTAL),
+                       "BD": Placement(0, 1, Orientation.VERTICAL)}
+
+    assert(render_soup(soup) == "\nA B\nÑ D\n\n")
+    assert(render_soup(Grid.from_rows(soup)) == "\nA B\nÑ D\n\n")
+    assert(render_soup(soup, word_placements)
+           == "\n\x1b[32mA\x1b[0m \x1b[32mB\x1b[0m\nÑ \x1b[32mD\x1b[0m\n\n")
+    assert(soup == [["A", "B"], ["Ñ", "D"]])
+
+
+def test_get_highlighted_cells():
+    word_placements = {"AB": Placement(0, 0, Orientation.HORIZONTAL),
+                       "BD": Placement(0, 1, Orientation.VERTICAL)}
+
+    assert(get_highlighted_cells(word_placements) == {(0, 0), (0, 1), (1, 1)})
+    assert(get_highlighted_cells({}) == set())
 
 
 def test_color_soup():
@@ -329,44 +808,19 @@ def test_color_soup():
             '\x1b[32mE\x1b[0m', 'E', 'S']]
 
     word_placements = {
-        "PIANO": {
-            "row": 6,
-            "col": 7,
-            "orientation": Orientation.VERTICAL_REVERSED
-        },
-        "MATERA": {
-            "row": 4,
-            "col": 5,
-            "orientation": Orientation.VERTICAL
-        },
-        "FUTBOL": {
-            "row": 2,
-            "col": 10,
-            "orientation": Orientation.VERTICAL
-        },
-        "CORRIENTE": {
-            "row": 2,
-            "col": 8,
-            "orientation": Orientation.VERTICAL
-        },
-        "CINTA": {
-            "row": 9,
-            "col": 0,
-            "orientation": Orientation.HORIZONTAL
-        },
-        "ESTORNUDO": {
-            "row": 3,
-            "col": 0,
-            "orientation": Orientation.HORIZONTAL
-        },
-        "SAMSUNG": {
-            "row": 2,
-            "col": 9,
-            "orientation": Orientation.VERTICAL_REVERSED
-        }
+        "PIANO": Placement(6, 7, Orientation.VERTICAL_REVERSED),
+        "MATERA": Placement(4, 5, Orientation.VERTICAL),
+        "FUTBOL": Placement(2, 10, Orientation.VERTICAL),
+        "CORRIENTE": Placement(2, 8, Orientation.VERTICAL),
+        "CINTA": Placement(9, 0, Orientation.HORIZONTAL),
+        "ESTORNUDO": Placement(3, 0, Orientation.HORIZONTAL),
+        "SAMSUNG": Placement(2, 9, Orientation.VERTICAL_REVERSED)
     }
 
     assert(color_soup(soup_matrix, word_placements) == color_soup_matrix)
+    assert(color_soup(Grid.from_rows(soup_matrix), word_placements)
+           == color_soup_matrix)
+    assert(all(len(letter) == 1 for row in soup_matrix for letter in row))
 
 
 def test_solve_soup():
@@ -386,45 +840,90 @@ def test_solve_soup():
                 "CINTA", "ESTORNUDO", "SAMSUNG"}
 
     word_placements = {
-        "PIANO": {
-            "row": 6,
-            "col": 7,
-            "orientation": Orientation.VERTICAL_REVERSED
-        },
-        "MATERA": {
-            "row": 4,
-            "col": 5,
-            "orientation": Orientation.VERTICAL
-        },
-        "FUTBOL": {
-            "row": 2,
-            "col": 10,
-            "orientation": Orientation.VERTICAL
-        },
-        "CORRIENTE": {
-            "row": 2,
-            "col": 8,
-            "orientation": Orientation.VERTICAL
-        },
-        "CINTA": {
-            "row": 9,
-            "col": 0,
-            "orientation": Orientation.HORIZONTAL
-        },
-        "ESTORNUDO": {
-            "row": 3,
-            "col": 0,
-            "orientation": Orientation.HORIZONTAL
-        },
-        "SAMSUNG": {
-            "row": 2,
-            "col": 9,
-            "orientation": Orientation.VERTICAL_REVERSED
-        }
+        "PIANO": Placement(6, 7, Orientation.VERTICAL_REVERSED),
+        "MATERA": Placement(4, 5, Orientation.VERTICAL),
+        "FUTBOL": Placement(2, 10, Orientation.VERTICAL),
+        "CORRIENTE": Placement(2, 8, Orientation.VERTICAL),
+        "CINTA": Placement(9, 0, Orientation.HORIZONTAL),
+        "ESTORNUDO": Placement(3, 0, Orientation.HORIZONTAL),
+        "SAMSUNG": Placement(2, 9, Orientation.VERTICAL_REVERSED)
     }
 
     assert(solve_soup(soup, wordlist) == word_placements)
 
+    output = io.StringIO()
+    assert(solve_soup(soup, wordlist | {"PERRO"}, file=output)
+           == word_placements)
+    assert(output.getvalue().count("No se encontró la palabra: PERRO") == 1)
+    assert(output.getvalue().endswith(render_soup(soup, word_placements)))
+
+    assert(solve_soup([["A"]], ["A"])
+           == {"A": Placement(0, 0, Orientation.HORIZONTAL)})
+    assert(solve_soup([["A"]], ["AB"], file=io.StringIO()) == {})
+
+
+def test_get_solve_key():
+    soup = Grid.from_rows([["A", "B"],
+                           ["C", "D"]])
+
+    key = get_solve_key(soup, ["AB", "CD"])
+    assert(key == get_solve_key(soup.to_rows(), ["CD", "AB", "CD"]))
+    assert(key != get_solve_key(soup, ["AB"]))
+    assert(key != get_solve_key(soup, ["ABCD"]))
+    assert(key != get_solve_key(Grid.from_rows([["A", "B"],
+                                                ["D", "C"]]), ["AB", "CD"]))
+    assert(get_solve_key(Grid.from_rows([["A"]]), []) !=
+           get_solve_key(Grid(0), ["A"]))
+
+
+def test_solve_cache(tmp_path):
+    with open("sopas.txt", "r") as f:
+        soups = parse_soups(f)
+    cache = create_solve_cache(max_entries=2)
+
+    for soup, wordlist in soups[:3] + soups[2:3]:
+        assert(find_solution(soup, wordlist, cache)
+               == find_solution(soup, wordlist))
+    assert((cache["hits"], cache["misses"]) == (1, 3))
+    assert(len(cache["entries"]) == 2)
+
+    # La misma sopa con las palabras en otro orden usa la misma solución
+    soup, wordlist = soups[1]
+    assert(find_solution(soup, wordlist[::-1], cache)
+           == find_solution(soup, wordlist))
+    assert((cache["hits"], cache["misses"]) == (2, 3))
+    word_placements = find_solution(soup, wordlist[::-1] + ["PERRO"], cache)
+    assert(list(word_placements) == wordlist[::-1] + ["PERRO"])
+    assert(word_placements["PERRO"] is None)
+    assert((cache["hits"], cache["misses"]) == (2, 4))
+
+    # La primera sopa ya no está en memoria
+    find_solution(*soups[0], cache)
+    assert((cache["hits"], cache["misses"]) == (2, 5))
+
+    # Con un archivo, las soluciones se conservan al volver a abrir la cache
+    path = str(tmp_path / "cache")
+    cache = create_solve_cache(path=path)
+    find_solution(*soups[0], cache)
+    close_solve_cache(cache)
+
+    cache = create_solve_cache(path=path)
+    assert(find_solution(*soups[0], cache) == find_solution(*soups[0]))
+    assert(find_solution(*soups[0], cache) == find_solution(*soups[0]))
+    assert((cache["hits"], cache["disk_hits"], cache["misses"]) == (1, 1, 0))
+    close_solve_cache(cache)
+
+    assert(solve_soup(*soups[0], cache=create_solve_cache())
+           == find_solution(*soups[0]))
+
+
+def test_use_numpy_backend():
+    pytest.importorskip("numpy")
+
+    assert(use_numpy_backend(NUMPY_MIN_SIZE, NUMPY_MAX_WORDS))
+    assert(not use_numpy_backend(NUMPY_MIN_SIZE - 1, 1))
+    assert(not use_numpy_backend(NUMPY_MIN_SIZE, NUMPY_MAX_WORDS + 1))
+
 
 def test_find_word_placement():
     soup = [["P", "A", "E", "N", "J", "Y", "U", "K", "I", "F", "C"],
@@ -443,26 +942,180 @@ def test_find_word_placement():
     word_2 = "MATERA"
     word_3 = "PIANO"
 
-    placement_1 = {
-        "row": 3,
-        "col": 0,
-        "orientation": Orientation.HORIZONTAL
-    }
-    placement_2 = {
-        "row": 4,
-        "col": 5,
-        "orientation": Orientation.VERTICAL
-    }
-    placement_3 = {
-        "row": 6,
-        "col": 7,
-        "orientation": Orientation.VERTICAL_REVERSED
-    }
+    placement_1 = Placement(3, 0, Orientation.HORIZONTAL)
+    placement_2 = Placement(4, 5, Orientation.VERTICAL)
+    placement_3 = Placement(6, 7, Orientation.VERTICAL_REVERSED)
 
     assert(find_word_placement(word_1, soup) == placement_1)
     assert(find_word_placement(word_2, soup) == placement_2)
     assert(find_word_placement(word_3, soup) == placement_3)
 
+    # Todas las orientaciones: escribimos una palabra en cada una y la
+    # buscamos en la sopa resultante
+    word = "MURCIELAGO"
+    for orientation in Orientation:
+        drow, dcol, _ = ORIENTATION_STEPS[orientation]
+        if dcol < 0:
+            placement = Placement(0, 9, orientation)
+        elif drow > 0:
+            placement = Placement(0, 0, orientation)
+        else:
+            placement = Placement(3, 0, orientation)
+        word_placements = {word: placement}
+        soup = create_soup_matrix(10, word_placements, {"X": 1})
+        assert(find_word_placement(word, soup) == placement)
+
+
+def test_get_soup_array():
+    pytest.importorskip("numpy")
+
+    soup = Grid.from_rows([["A", "B"],
+                           ["Ñ", "D"]])
+    array = get_soup_array(soup)
+
+    assert(array.shape == (2, 2))
+    assert(array.tolist() == [[0x41, 0x42], [0xD1, 0x44]])
+    soup[0, 0] = "Z"
+    assert(array[0, 0] == 0x5A)
+
+
+def test_find_word_placement_numpy():
+    pytest.importorskip("numpy")
+
+    soup = [["A", "N", "A", "X"],
+            ["N", "O", "S", "O"],
+            ["A", "S", "O", "L"],
+            ["X", "O", "L", "A"]]
+
+    assert(find_word_placement_numpy("SOL", soup)
+           in [Placement(1, 2, Orientation.VERTICAL),
+               Placement(2, 1, Orientation.HORIZONTAL)])
+    assert(find_word_placement_numpy("LOS", soup)
+           in [Placement(1, 2, Orientation.VERTICAL_REVERSED),
+               Placement(2, 1, Orientation.HORIZONTAL_REVERSED)])
+    assert(find_word_placement_numpy("PERRO", soup) is None)
+    assert(find_word_placement_numpy("", soup) is None)
+    assert(find_word_placement_numpy("ŁÓDŹ", soup) is None)
+
+    # Comparamos con todos los placements de cada palabra
+    for _ in range(20):
+        shuffle(dictionary)
+        wordlist = [word for word in dictionary[:10] if len(word) > 1]
+        soup, _ = create_soup(wordlist)
+        wordlist += [word[:2] for word in wordlist]
+        wordlist += [word[::-1] for word in wordlist]
+
+        word_placements = find_word_placements_numpy(soup, wordlist)
+        for word in wordlist:
+            placements = find_every_word_placement(word, soup)
+            if placements:
+                assert(word_placements[word] in placements)
+            else:
+                assert(word_placements[word] is None)
+
+
+def test_find_all_word_placements():
+    soup = [["A", "N", "A", "X"],
+            ["N", "O", "S", "O"],
+            ["A", "S", "O", "L"],
+            ["X", "O", "L", "A"]]
+
+    word_placements = find_all_word_placements(soup, ["ANA", "SOL", "OSO",
+                                                      "LOS", "PERRO"])
+
+    assert(sorted(word_placements["ANA"]) == [
+        Placement(0, 0, Orientation.HORIZONTAL),
+        Placement(0, 0, Orientation.HORIZONTAL_REVERSED),
+        Placement(0, 0, Orientation.VERTICAL),
+        Placement(0, 0, Orientation.VERTICAL_REVERSED)])
+    assert(sorted(word_placements["SOL"]) == [
+        Placement(1, 2, Orientation.VERTICAL),
+        Placement(2, 1, Orientation.HORIZONTAL)])
+    assert(word_placements["PERRO"] == [])
+    assert(find_word_placements(soup, ["PERRO", "LOS"]) == {
+        "PERRO": None,
+        "LOS": Placement(2, 1, Orientation.HORIZONTAL_REVERSED)})
+
+    # Comparamos con todos los placements posibles de cada palabra
+    for _ in range(20):
+        shuffle(dictionary)
+        wordlist = [word for word in dictionary[:10] if len(word) > 1]
+        soup, _ = create_soup(wordlist)
+        wordlist += [word[:2] for word in wordlist]
+
+        word_placements = find_all_word_placements(soup, wordlist)
+        for word in wordlist:
+            expected = [placement
+                        for placement in random_placements(len(word),
+                                                           len(soup))
+                        if all(soup[position] == letter
+                               for position, letter
+                               in get_letter_positions(word,
+                                                       placement).items())]
+            assert(sorted(word_placements[word]) == sorted(expected))
+
+
+def test_get_line_starts():
+    assert(get_line_starts(3, 0, 1) == [(0, 0), (1, 0), (2, 0)])
+    assert(get_line_starts(3, 1, 0) == [(0, 0), (0, 1), (0, 2)])
+    assert(get_line_starts(3, 1, 1) == [(0, 0), (0, 1), (0, 2),
+                                        (1, 0), (2, 0)])
+
+
+def test_get_line_start():
+    assert(get_line_start(5, 3, 2, 0, 1) == (3, 0))
+    assert(get_line_start(5, 3, 2, 1, 0) == (0, 2))
+    assert(get_line_start(5, 3, 2, 1, 1) == (1, 0))
+    assert(get_line_start(5, 3, 2, 1, -1) == (1, 4))
+    assert(get_line_start(5, 0, 0, 1, 1) == (0, 0))
+
+
+def test_get_soup_lines():
+    grid = Grid.from_rows([["A", "B", "C"],
+                           ["D", "E", "F"],
+                           ["G", "H", "I"]])
+
+    assert(get_soup_lines(grid, 0, 1) == ("ABC\nDEF\nGHI", [0, 4, 8],
+                                          [(0, 0), (1, 0), (2, 0)]))
+    assert(get_soup_lines(grid, 1, 1)[0] == "AEI\nBF\nC\nDH\nG")
+    assert(get_soup_lines(grid, 1, 0) is get_soup_lines(grid, 1, 0))
+
+    grid[1, 1] = "X"
+    assert(get_soup_lines(grid, 1, 0)[0] == "ADG\nBXH\nCFI")
+    assert(find_word_placement("XB", grid) ==
+           Placement(0, 1, Orientation.VERTICAL_REVERSED))
+
+
+def test_get_letter_index():
+    grid = Grid.from_rows([["A", "B", "A"],
+                           ["B", "A", "B"],
+                           ["A", "B", "C"]])
+
+    assert(get_letter_index(grid) == {
+        "A": [(0, 0), (2, 0), (1, 1), (0, 2)],
+        "B": [(1, 0), (0, 1), (2, 1), (1, 2)],
+        "C": [(2, 2)]})
+
+    grid[2, 2] = "A"
+    assert(get_letter_index(grid)["A"][-1] == (2, 2))
+    assert("C" not in get_letter_index(grid))
+
+
+def test_get_bigram_index():
+    grid = Grid.from_rows([["A", "B", "A"],
+                           ["B", "A", "B"],
+                           ["A", "B", "C"]])
+
+    assert(get_bigram_index(grid, 0, 1) == {"AB": [0, 5, 8], "BA": [1, 4],
+                                            "BC": [9]})
+    assert(get_bigram_index(grid, 1, 1) == {"AA": [0], "AC": [1],
+                                            "BB": [4, 9]})
+    assert(find_word_placement("ABC", grid) ==
+           Placement(2, 0, Orientation.HORIZONTAL))
+    assert(find_word_placement("CBA", grid) ==
+           Placement(2, 0, Orientation.HORIZONTAL_REVERSED))
+    assert(find_word_placement("CC", grid) is None)
+
 
 def test_find_first_letter_candidates():
     soup = [["P", "A", "E", "N", "J", "Y", "U", "K", "I", "F", "C"],
@@ -491,6 +1144,58 @@ def test_find_first_letter_candidates():
     assert(find_first_letter_candidates(word_3, soup) == candidates_3)
 
 
+def test_get_bitboards():
+    soup = Grid.from_rows([["A", "B"],
+                           ["B", "Ñ"]])
+    assert(get_bitboards(soup) == {"A": 0b00001, "B": 0b01010, "Ñ": 0b10000})
+
+    soup[1, 1] = "A"
+    assert(get_bitboards(soup) == {"A": 0b10001, "B": 0b01010})
+
+
+def test_find_word_starts():
+    soup = [["A", "N", "A", "X"],
+            ["N", "O", "S", "O"],
+            ["A", "S", "O", "L"],
+            ["X", "O", "L", "A"]]
+    bitboards = get_bitboards(soup)
+
+    # Cada fila ocupa 5 bits: 4 celdas y la columna de guarda
+    assert(find_word_starts("AN", bitboards, 4, 0, 1) == 1 << 0)
+    assert(find_word_starts("NA", bitboards, 4, 0, 1) == 1 << 1)
+    assert(find_word_starts("AN", bitboards, 4, 1, 0) == 1 << 0)
+    assert(find_word_starts("SOL", bitboards, 4, 1, 0) == 1 << 7)
+    assert(find_word_starts("OO", bitboards, 4, 1, -1) == 1 << 8 | 1 << 12)
+    # Las letras de una fila no continúan en la fila siguiente
+    assert(find_word_starts("XN", bitboards, 4, 0, 1) == 0)
+    assert(find_word_starts("PERRO", bitboards, 4, 0, 1) == 0)
+
+
+def test_find_every_word_placement():
+    soup = [["A", "N", "A", "X"],
+            ["N", "O", "S", "O"],
+            ["A", "S", "O", "L"],
+            ["X", "O", "L", "A"]]
+
+    assert(sorted(find_every_word_placement("SOL", soup)) == [
+        Placement(1, 2, Orientation.VERTICAL),
+        Placement(2, 1, Orientation.HORIZONTAL)])
+    assert(find_every_word_placement("PERRO", soup) == [])
+    assert(find_every_word_placement("", soup) == [])
+
+    # Comparamos con el autómata de find_all_word_placements
+    for _ in range(20):
+        shuffle(dictionary)
+        wordlist = [word for word in dictionary[:10] if len(word) > 1]
+        soup, _ = create_soup(wordlist)
+        wordlist += [word[:2] for word in wordlist]
+
+        word_placements = find_all_word_placements(soup, wordlist)
+        for word in wordlist:
+            assert(sorted(find_every_word_placement(word, soup))
+                   == sorted(word_placements[word]))
+
+
 def test_parse_soups():
     wordlist = ["ESTO", "ES", "UN", "EJEMPLO",
                 "PARA", "PROBAR", "LA", "FUNCION"]
@@ -508,3 +1213,178 @@ def test_parse_soups():
 
     with open("test_sopas.txt", "r") as f:
         assert(parse_soups(f) == [(soup, wordlist)])
+
+
+def test_iter_soups(tmp_path):
+    with open("sopas.txt", "r") as f:
+        soups = parse_soups(f)
+    with open("sopas.txt", "r") as f:
+        assert(list(iter_soups(f)) == soups)
+    with open("sopas.txt", "r") as f:
+        assert(list(iter_soups(f, use_mmap=True)) == soups)
+
+    # Devuelve cada sopa apenas la lee, antes de llegar a un error posterior
+    text = format_soup(*soups[0]) + "# FIN\n"
+    soup_iterator = iter_soups(io.StringIO(text))
+    assert(next(soup_iterator) == soups[0])
+    with pytest.raises(SoupFormatError):
+        next(soup_iterator)
+
+    path = tmp_path / "vacio.txt"
+    path.write_text("")
+    with open(path, "r") as f:
+        assert(list(iter_soups(f, use_mmap=True)) == [])
+
+
+def test_soup_format_error(tmp_path):
+    texts = [
+        ("# FIN\n", 1, 0),
+        ("# INICIO\nA B\nC D\nAB\n# INICIO\n", 5, 20),
+        ("# INICIO\nA B\nC\n# FIN\n", 3, 13),
+        ("# INICIO\nÑ B\nC 1Z\n# FIN\n", 3, 14),
+        ("# INICIO\nA B\nC D\n", 3, 13),
+        ("# INICIO\nA B C\nD E F\n# FIN\n", 4, 21),
+    ]
+    for text, line, offset in texts:
+        with pytest.raises(SoupFormatError) as error:
+            list(iter_soups(io.StringIO(text)))
+        assert((error.value.line, error.value.offset) == (line, offset))
+        assert(isinstance(error.value, ValueError))
+
+        path = tmp_path / "sopas.txt"
+        path.write_text(text, encoding="utf-8")
+        for use_mmap in [False, True]:
+            with open(path, "r", encoding="utf-8") as f:
+                with pytest.raises(SoupFormatError) as error:
+                    list(iter_soups(f, use_mmap))
+            assert((error.value.line, error.value.offset) == (line, offset))
+
+    # Con saltos de línea "\r\n" cada salto ocupa 2 bytes
+    path.write_bytes(b"# INICIO\r\nA B\r\nC D\r\nAB\r\n# INICIO\r\n")
+    for use_mmap in [False, True]:
+        with open(path, "r", encoding="utf-8") as f:
+            with pytest.raises(SoupFormatError) as error:
+                list(iter_soups(f, use_mmap))
+        assert((error.value.line, error.value.offset) == (5, 24))
+
+
+def test_format_soup():
+    with open("test_sopas.txt", "r") as f:
+        text = f.read()
+    with open("test_sopas.txt", "r") as f:
+        soup, wordlist = parse_soups(f)[0]
+
+    assert(format_soup(soup, wordlist) == text)
+
+
+def test_normalize_wordlist():
+    assert(normalize_wordlist(["perro", "GATO", "Perro", "ñandu"])
+           == ["PERRO", "GATO", "ÑANDU"])
+
+
+def test_iter_wordlists():
+    text = ('perro  gato\n'
+            '\n'
+            '["CASA", "mesa"]\n'
+            '{"words": ["SOL", "LUNA"], "extra": 1}\n')
+    assert(list(iter_wordlists(io.StringIO(text)))
+           == [["PERRO", "GATO"], ["CASA", "MESA"], ["SOL", "LUNA"]])
+
+    for text, line in [("PERRO G4TO\n", 1), ("SOL\n{\"palabras\": []}\n", 2),
+                       ("SOL\n[1, 2]\n", 2), ("SOL\n[SOL\n", 2)]:
+        with pytest.raises(SoupFormatError) as error:
+            list(iter_wordlists(io.StringIO(text)))
+        assert(error.value.line == line)
+
+
+def test_iter_json_soups():
+    text = ('{"soup": ["AB", "ÑD"], "words": ["AB"]}\n'
+            '\n'
+            '{"soup": [["A", "B"], ["C", "D"]], "words": []}\n')
+    assert(list(iter_json_soups(io.StringIO(text)))
+           == [([["A", "B"], ["Ñ", "D"]], ["AB"]),
+               ([["A", "B"], ["C", "D"]], [])])
+
+    for text in ['{"soup": ["AB", "C"], "words": []}\n', '{"soup": []}\n',
+                 '["AB", "CD"]\n', 'AB CD\n']:
+        with pytest.raises(SoupFormatError):
+            list(iter_json_soups(io.StringIO(text)))
+
+
+def test_format_generated_soup():
+    soup = Grid.from_rows([["A", "B"],
+                           ["Ñ", "D"]])
+    word_placements = {"AB": Placement(0, 0, Orientation.HORIZONTAL)}
+
+    assert(json.loads(format_generated_soup(2, soup, word_placements)) == {
+        "index": 2,
+        "size": 2,
+        "soup": ["AB", "ÑD"],
+        "words": ["AB"],
+        "word_placements": {"AB": {"row": 0, "col": 0,
+                                   "orientation": "HORIZONTAL"}}
+    })
+
+
+def test_main(tmp_path):
+    wordlists_path = tmp_path / "palabras.txt"
+    wordlists_path.write_text('perro gato\n["CASA", "MESA"]\n')
+    arguments = ["generate", str(wordlists_path), "--count", "2", "--seed",
+                 "1", "--processes", "1"]
+
+    out = io.StringIO()
+    assert(main(arguments, out) == 0)
+    records = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert([record["index"] for record in records] == [0, 1, 2, 3])
+    assert([record["words"] for record in records]
+           == [["PERRO", "GATO"]] * 2 + [["CASA", "MESA"]] * 2)
+
+    # Con la misma semilla se generan las mismas sopas
+    same = io.StringIO()
+    assert(main(arguments, same) == 0)
+    assert(same.getvalue() == out.getvalue())
+
+    # Las sopas generadas se resuelven con solve
+    soups_path = tmp_path / "sopas.jsonl"
+    soups_path.write_text(out.getvalue())
+    out = io.StringIO()
+    assert(main(["solve", str(soups_path), "--format", "jsonl",
+                 "--processes", "1"], out) == 0)
+    results = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert([result["word_placements"] for result in results]
+           == [record["word_placements"] for record in records])
+    assert(all(result["not_found"] == [] for result in results))
+
+    # También en el formato de sopas.txt
+    soups_path = tmp_path / "sopas.txt"
+    with open(soups_path, "w") as f:
+        assert(main(arguments + ["--format", "sopas"], f) == 0)
+    with open(soups_path, "r") as f:
+        soups = parse_soups(f)
+    assert([soup.rows() for soup, _ in soups]
+           == [record["soup"] for record in records])
+    out = io.StringIO()
+    assert(main(["solve", str(soups_path), "--processes", "1"], out) == 0)
+    assert(len(out.getvalue().splitlines()) == 4)
+
+    wordlists_path.write_text("perro g4to\n")
+    assert(main(["generate", str(wordlists_path)], io.StringIO()) == 1)
+
+    # Una lista que no permite generar una sopa no corta las demás
+    wordlists_path.write_text("perro gato\nana banana\ncasa mesa\n")
+    out = io.StringIO()
+    assert(main(["generate", str(wordlists_path), "--processes", "1"],
+                out) == 1)
+    records = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert([record["index"] for record in records] == [0, 1, 2])
+    assert(records[1] == {"index": 1,
+                          "error": "ANA aparece más de una vez "
+                                   "dentro de BANANA"})
+    assert(records[0]["words"] == ["PERRO", "GATO"])
+    assert(records[2]["words"] == ["CASA", "MESA"])
+
+    out = io.StringIO()
+    assert(main(["generate", str(wordlists_path), "--processes", "2",
+                 "--format", "sopas"], out) == 1)
+    assert([wordlist for _, wordlist in parse_soups(io.StringIO(
+        out.getvalue()))] == [["PERRO", "GATO"], ["CASA", "MESA"]])
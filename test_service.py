@@ -0,0 +1,213 @@
+#!usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import json
+from time import perf_counter
+
+# Importamos las funciones que vamos a testear
+from service import PuzzleService, start_service, percentile
+from main import Grid, find_solution, parse_soups, remove_conflicting_words
+from main import create_soup
+from dictionary import Dictionary
+
+
+# request: str str (dict) (int) (str) -> tuple(int, dict)
+# Manda un pedido HTTP al servicio y devuelve el código y el JSON de la
+# respuesta.
+async def request(method, path, payload=None, port=None, unix_path=None):
+    if unix_path is not None:
+        reader, writer = await asyncio.open_unix_connection(unix_path)
+    else:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+
+    body = b"" if payload is None else json.dumps(payload).encode("utf-8")
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: test\r\n"
+                 f"Content-Length: {len(body)}\r\nConnection: close\r\n"
+                 f"\r\n".encode("latin-1") + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+
+    head, _, body = response.partition(b"\r\n\r\n")
+    status = int(head.split(b" ")[1])
+    return status, json.loads(body)
+
+
+def test_percentile():
+    assert(percentile([], 0.5) is None)
+    assert(percentile([3, 1, 2], 0.5) == 2)
+    assert(percentile(list(range(1, 101)), 0.99) == 99)
+    assert(percentile([5], 0.99) == 5)
+
+
+def test_service(tmp_path):
+    with open("sopas.txt", "r") as f:
+        soups = parse_soups(f)
+
+    async def run():
+        service = PuzzleService(processes=1, batch_size=4, batch_delay=0.05)
+        server = await start_service(service, port=0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            # Pedidos simultáneos: se juntan en lotes
+            responses = await asyncio.gather(*[
+                request("POST", "/solve",
+                        {"soup": soup.rows(), "words": wordlist}, port)
+                for soup, wordlist in soups])
+            for (status, result), (soup, wordlist) in zip(responses, soups):
+                assert(status == 200)
+                assert(result["not_found"] == [])
+                assert(set(result["word_placements"])
+                       == set(find_solution(soup, wordlist)))
+
+            status, generated = await request(
+                "POST", "/generate", {"words": ["perro", "gato"], "seed": 1},
+                port)
+            assert(status == 200)
+            assert(generated["words"] == ["PERRO", "GATO"])
+            soup = Grid.from_rows(generated["soup"])
+            assert(all(find_solution(soup, ["PERRO", "GATO"]).values()))
+            assert((await request("POST", "/generate",
+                                  {"words": ["PERRO", "GATO"], "seed": 1},
+                                  port))[1]["soup"] == generated["soup"])
+
+            status, stats = await request("GET", "/stats", port=port)
+            assert(status == 200)
+            assert(stats["requests"] == len(soups) + 2)
+            assert(stats["batches"] < stats["requests"])
+            assert(stats["queue_depth"] == 0)
+            assert(stats["latency"]["solve"]["count"] == len(soups))
+            assert(stats["latency"]["solve"]["p99"] > 0)
+
+            assert((await request("POST", "/generate", {"words": ["G4TO"]},
+                                  port))[0] == 400)
+            assert((await request("POST", "/solve", {"soup": ["AB", "C"],
+                                                     "words": []},
+                                  port))[0] == 400)
+            # words tiene que ser una lista de strings, y soup una lista
+            for payload in [{"soup": ["AB", "CD"], "words": "AB"},
+                            {"soup": ["AB", "CD"], "words": ["AB", 1]},
+                            {"soup": "A", "words": ["A"]}]:
+                assert((await request("POST", "/solve", payload,
+                                      port))[0] == 400)
+            assert((await request("POST", "/generate", {"words": "PERRO"},
+                                  port))[0] == 400)
+            # Es imposible que ANA aparezca una sola vez
+            status, result = await request("POST", "/generate",
+                                           {"words": ["ANA", "BANANA"]}, port)
+            assert(status == 422)
+            assert("BANANA" in result["error"])
+            assert((await request("GET", "/solve", port=port))[0] == 405)
+            assert((await request("GET", "/nada", port=port))[0] == 404)
+        finally:
+            server.close()
+            await server.wait_closed()
+            service.close()
+
+    asyncio.run(run())
+
+
+def test_service_timeout(tmp_path):
+    async def run():
+        unix_path = str(tmp_path / "sopas.sock")
+        service = PuzzleService(processes=1, batch_delay=1, timeout=0.01)
+        server = await start_service(service, unix_path=unix_path)
+        try:
+            status, _ = await request("POST", "/generate",
+                                      {"words": ["PERRO"]},
+                                      unix_path=unix_path)
+            assert(status == 504)
+
+            _, stats = await request("GET", "/stats", unix_path=unix_path)
+            assert(stats["timeouts"] == 1)
+            assert(stats["in_flight"] == 0)
+        finally:
+            server.close()
+            await server.wait_closed()
+            service.close()
+
+    asyncio.run(run())
+
+
+# load_large_wordlist: -> list(str)
+# Devuelve las palabras de dictionary.txt que pueden estar juntas en una
+# sopa, para pedidos de /generate que tardan bastante.
+def load_large_wordlist():
+    with open("dictionary.txt", "r") as f:
+        return remove_conflicting_words(list(Dictionary.from_file(f)))
+
+
+def test_service_chunks():
+    large_wordlist = load_large_wordlist()
+
+    async def run():
+        service = PuzzleService(processes=2, batch_size=2, batch_delay=1)
+        server = await start_service(service, port=0)
+        port = server.sockets[0].getsockname()[1]
+
+        async def generate(words):
+            status, _ = await request("POST", "/generate",
+                                      {"words": words, "seed": 1}, port)
+            assert(status == 200)
+            return perf_counter() - start
+
+        try:
+            # Que los dos procesos del pool ya estén andando
+            start = perf_counter()
+            await asyncio.gather(generate(["PERRO"]), generate(["GATO"]))
+
+            # Los dos pedidos van en el mismo lote, pero el rápido no espera
+            # al lento
+            start = perf_counter()
+            slow, fast = await asyncio.gather(
+                generate(large_wordlist), generate(["PERRO", "GATO"]))
+            assert(fast < slow / 2)
+        finally:
+            server.close()
+            await server.wait_closed()
+            service.close()
+
+    asyncio.run(run())
+
+
+def test_service_generate_timeout(tmp_path):
+    large_wordlist = load_large_wordlist()
+    start = perf_counter()
+    create_soup(large_wordlist)
+    generate_seconds = perf_counter() - start
+
+    async def run():
+        unix_path = str(tmp_path / "sopas.sock")
+        service = PuzzleService(processes=1, batch_delay=0, timeout=1)
+        server = await start_service(service, unix_path=unix_path)
+        try:
+            # Que el pool ya esté andando
+            assert((await request("POST", "/generate", {"words": ["PERRO"]},
+                                  unix_path=unix_path))[0] == 200)
+
+            service.timeout = 0.05
+            start = perf_counter()
+            status, _ = await request("POST", "/generate",
+                                      {"words": large_wordlist},
+                                      unix_path=unix_path)
+            assert(status == 504)
+
+            # El pool dejó de generar la sopa al pasarse el tiempo, así que
+            # atiende el siguiente pedido enseguida
+            service.timeout = 10
+            status, _ = await request("POST", "/generate",
+                                      {"words": ["GATO"]},
+                                      unix_path=unix_path)
+            assert(status == 200)
+            assert(perf_counter() - start < generate_seconds / 2)
+
+            _, stats = await request("GET", "/stats", unix_path=unix_path)
+            assert(stats["timeouts"] == 1)
+            assert(stats["in_flight"] == 0)
+        finally:
+            server.close()
+            await server.wait_closed()
+            service.close()
+
+    asyncio.run(run())